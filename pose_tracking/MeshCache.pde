@@ -0,0 +1,42 @@
+import java.io.File;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+
+// Carga de mallas preprocesadas (.pmesh, ver scripts/mesh_cache.py): vértices con
+// normales e índices de triángulos en binario, sin parsear el .obj en cada inicio.
+// Si la malla no fue preprocesada se usa loadShape con el .obj original.
+PShape loadMesh(String name, int lod) {
+  String cached = "meshes/cache/" + name + ".lod" + lod + ".pmesh";
+  if (!new File(sketchPath(cached)).exists()) {
+    println("No se encontró", cached, "; se carga el .obj (ejecutar scripts/mesh_cache.py)");
+    return loadShape("meshes/" + name + ".obj");
+  }
+
+  ByteBuffer data = ByteBuffer.wrap(loadBytes(cached)).order(ByteOrder.LITTLE_ENDIAN);
+  if (data.get(0) != 'P' || data.get(1) != 'M' || data.get(2) != 'S' || data.get(3) != 'H' || data.getInt(4) != 1) {
+    println(cached, "no es un archivo .pmesh válido; se carga el .obj");
+    return loadShape("meshes/" + name + ".obj");
+  }
+  int vertexCount = data.getInt(8);
+  int indexCount = data.getInt(12);
+  int vertexBase = 64;
+  int indexBase = vertexBase + 24 * vertexCount;
+
+  PShape mesh = createShape();
+  mesh.beginShape(TRIANGLES);
+  // Mismo estilo que loadShape da a un .obj sin .mtl (el material por defecto de
+  // PShapeOBJ: kd = ka = ks = 0.5, ns = 0, sin borde). Las partes que el sketch
+  // dibuja con disableStyle() lo ignoran como antes.
+  mesh.noStroke();
+  mesh.fill(127);
+  mesh.ambient(127);
+  mesh.specular(127);
+  mesh.shininess(0);
+  for (int k = 0; k < indexCount; k++) {
+    int v = vertexBase + 24 * data.getInt(indexBase + 4 * k);
+    mesh.normal(data.getFloat(v + 12), data.getFloat(v + 16), data.getFloat(v + 20));
+    mesh.vertex(data.getFloat(v), data.getFloat(v + 4), data.getFloat(v + 8));
+  }
+  mesh.endShape();
+  return mesh;
+}
@@ -0,0 +1,92 @@
+// Estela de la trayectoria del efector. Los puntos se agrupan en tramos de
+// 'chunkSize' segmentos; cada tramo completo se guarda como un PShape retenido (se
+// arma una sola vez) en un buffer circular, y solo el tramo en construcción se dibuja
+// segmento a segmento. Así el costo por cuadro casi no depende del largo de la estela.
+class Trail {
+  int maxPoints;
+  int chunkSize;
+  float minSpacing;  // distancia mínima entre puntos guardados (0 = todos)
+  int strokeColor;
+
+  PShape[] chunks;   // buffer circular de tramos ya armados
+  int firstChunk = 0;
+  int chunkCount = 0;
+
+  float[] open;      // puntos (x, y, z intercalados) del tramo en construcción
+  int openCount = 0;
+  boolean hasLast = false;
+  float lastX, lastY, lastZ;
+
+  Trail(int maxPoints, int chunkSize, float minSpacing, int strokeColor) {
+    this.chunkSize = max(2, chunkSize);
+    this.maxPoints = max(maxPoints, this.chunkSize);
+    this.minSpacing = minSpacing;
+    this.strokeColor = strokeColor;
+    chunks = new PShape[ceil(this.maxPoints / float(this.chunkSize))];
+    open = new float[3 * (this.chunkSize + 1)];
+  }
+
+  // Agrega un punto (en coordenadas de dibujo); se descarta si está más cerca que
+  // minSpacing del último guardado
+  void add(float x, float y, float z) {
+    if (hasLast && dist(x, y, z, lastX, lastY, lastZ) < minSpacing) return;
+    lastX = x;
+    lastY = y;
+    lastZ = z;
+    hasLast = true;
+
+    open[3 * openCount] = x;
+    open[3 * openCount + 1] = y;
+    open[3 * openCount + 2] = z;
+    openCount++;
+    if (openCount == chunkSize + 1) {
+      bake();
+    }
+  }
+
+  // Convierte el tramo en construcción en un PShape y empieza el siguiente desde su último punto
+  void bake() {
+    PShape chunk = createShape();
+    chunk.beginShape();
+    chunk.noFill();
+    chunk.stroke(strokeColor);
+    chunk.strokeWeight(1);
+    for (int i = 0; i < openCount; i++) {
+      chunk.vertex(open[3 * i], open[3 * i + 1], open[3 * i + 2]);
+    }
+    chunk.endShape();
+
+    // Si el buffer está lleno se descarta el tramo más viejo
+    if (chunkCount == chunks.length) {
+      firstChunk = (firstChunk + 1) % chunks.length;
+      chunkCount--;
+    }
+    chunks[(firstChunk + chunkCount) % chunks.length] = chunk;
+    chunkCount++;
+
+    open[0] = open[3 * (openCount - 1)];
+    open[1] = open[3 * (openCount - 1) + 1];
+    open[2] = open[3 * (openCount - 1) + 2];
+    openCount = 1;
+  }
+
+  void clear() {
+    firstChunk = 0;
+    chunkCount = 0;
+    openCount = 0;
+    hasLast = false;
+  }
+
+  void draw() {
+    for (int k = 0; k < chunkCount; k++) {
+      shape(chunks[(firstChunk + k) % chunks.length]);
+    }
+    stroke(strokeColor);
+    strokeWeight(1);
+    for (int i = 0; i < openCount - 1; i++) {
+      line(open[3 * i], open[3 * i + 1], open[3 * i + 2],
+           open[3 * i + 3], open[3 * i + 4], open[3 * i + 5]);
+    }
+    noStroke();
+  }
+}
@@ -0,0 +1,93 @@
+import java.io.File;
+import java.io.RandomAccessFile;
+import java.nio.ByteOrder;
+import java.nio.MappedByteBuffer;
+import java.nio.channels.FileChannel;
+
+// Lector de trayectorias .ptrj (ver scripts/trajectory_store.py): el archivo se mapea
+// en memoria y cada muestra se lee directamente de sus columnas, sin parsear texto.
+class Trajectory {
+  final int HEADER_SIZE = 64;
+
+  int count;
+  int capacity;
+  double rate;
+  int kind;  // 0 = posiciones (x, y, z), 1 = ángulos articulares (alpha, beta, gamma)
+  MappedByteBuffer data;
+  int tOffset, pointOffset, xOffset, yOffset, zOffset, validOffset;
+
+  Trajectory(String path) throws Exception {
+    RandomAccessFile file = new RandomAccessFile(path, "r");
+    try {
+      data = file.getChannel().map(FileChannel.MapMode.READ_ONLY, 0, file.length());
+    } finally {
+      file.close();  // el mapeo sigue siendo válido después de cerrar el archivo
+    }
+    data.order(ByteOrder.LITTLE_ENDIAN);
+    if (data.get(0) != 'P' || data.get(1) != 'T' || data.get(2) != 'R' || data.get(3) != 'J') {
+      throw new Exception("no es un archivo .ptrj");
+    }
+    if (data.getInt(4) != 1) {
+      throw new Exception("versión no soportada " + data.getInt(4));
+    }
+    count = (int) data.getLong(8);
+    capacity = (int) data.getLong(16);
+    rate = data.getDouble(24);
+    kind = data.getInt(32);
+
+    tOffset = HEADER_SIZE;
+    pointOffset = tOffset + 8 * capacity;
+    xOffset = pointOffset + 4 * capacity;
+    yOffset = xOffset + 4 * capacity;
+    zOffset = yOffset + 4 * capacity;
+    validOffset = zOffset + 4 * capacity;
+  }
+
+  int size() {
+    return count;
+  }
+
+  boolean valid(int i) {
+    return data.get(validOffset + i) != 0;
+  }
+
+  int point(int i) {
+    return data.getInt(pointOffset + 4 * i);
+  }
+
+  double time(int i) {
+    return data.getDouble(tOffset + 8 * i);
+  }
+
+  // Posición (o ángulos) de la muestra i, o null si esa muestra no es válida
+  PVector position(int i) {
+    if (!valid(i)) return null;
+    return new PVector(data.getFloat(xOffset + 4 * i), data.getFloat(yOffset + 4 * i), data.getFloat(zOffset + 4 * i));
+  }
+
+  // Índice de la última muestra con tiempo <= t (búsqueda binaria sobre la columna de tiempos)
+  int indexAt(double t) {
+    int lo = 0, hi = count - 1;
+    if (count == 0 || t < time(0)) return 0;
+    while (lo < hi) {
+      int mid = (lo + hi + 1) / 2;
+      if (time(mid) <= t) lo = mid;
+      else hi = mid - 1;
+    }
+    return lo;
+  }
+}
+
+// Carga un .ptrj relativo a la carpeta del sketch; devuelve null si no existe o no es válido
+Trajectory loadTrajectory(String path) {
+  File file = new File(sketchPath(path));
+  if (!file.exists()) return null;
+  try {
+    Trajectory trajectory = new Trajectory(file.getAbsolutePath());
+    println("Trayectoria cargada:", path, "(" + trajectory.size() + " muestras)");
+    return trajectory;
+  } catch (Exception e) {
+    println("No se pudo cargar", path, ":", e.getMessage());
+    return null;
+  }
+}
@@ -1,3 +1,7 @@
+import java.net.DatagramSocket;
+import java.net.DatagramPacket;
+import java.nio.ByteBuffer;
+
 PShape base, shoulder, upArm, loArm, end;
 float rotX, rotY;
 float posX = 0, posY = 60, posZ = 0; // Posición inicial del extremo del brazo
@@ -8,22 +12,48 @@ float start_square_z = 0;
 
 float F = 50;
 float T = 70;
+
+// Nivel de detalle de las mallas (0 = original, 1-3 = decimadas; ver scripts/mesh_cache.py)
+int meshLod = 1;
 float millisOld, gTime, gSpeed = 2;
 
-float[] Xsphere = new float[20];
-float[] Ysphere = new float[20];
-float[] Zsphere = new float[20];
+// Estela de la trayectoria (ver Trail.pde)
+int trailLength = 5000;    // cantidad máxima de puntos
+int trailChunkSize = 256;  // segmentos por tramo retenido
+float trailSpacing = 0.2;  // distancia mínima entre puntos (0 = guardar todos)
+Trail trail;
 
-// Variables para la rutina basada en CSV
+// Variables para la rutina basada en CSV (o en el archivo binario .ptrj)
 Table physicalTable;
+Trajectory physicalTrajectory;
 int currentStep = 0;
 int stepDelay = 500;  // milisegundos entre cada paso
+int currentStepDelay = 500;  // duración del tramo actual (ver routineStepDelay)
 int lastUpdateTime = 0;
 
+// Pista de ángulos precalculada (scripts/inverse_kinematics.py): si existe, la rutina
+// se reproduce directamente sin resolver la IK en cada cuadro
+Trajectory jointTrack;
+int jointTrackStart = 0;
+
 // Variables para interpolar
 PVector prevTarget;
 PVector nextTarget;
 
+// Flujo de poses en vivo (scripts/pose_stream.py): mensajes UDP de 28 bytes en orden de red
+//   "PT" | versión | flags (bit 0 = válida) | secuencia u32 | timestamp f64 | x, y, z f32
+// Mientras no llegue ninguna pose válida se sigue usando el CSV.
+boolean liveEnabled = true;
+int livePort = 5005;
+float liveSmoothing = 15;  // constante (1/s) con la que la posición se acerca a la última pose
+final int POSE_MESSAGE_SIZE = 28;
+DatagramSocket liveSocket;
+PVector liveTarget = null;
+long liveSeq = -1;
+double liveStamp = 0;          // instante de captura de la última pose aceptada
+String liveSender = null;      // dirección del publicador de la sesión actual
+int lastLiveUpdate = 0;
+
 void setup() {
   size(1200, 800, OPENGL);
   
@@ -36,38 +66,116 @@ void setup() {
   }
 
 
-  base = loadShape("meshes/r5.obj");
-  shoulder = loadShape("meshes/r1.obj");
-  upArm = loadShape("meshes/r2.obj");
-  loArm = loadShape("meshes/r3.obj");
-  end = loadShape("meshes/r4.obj");
+  base = loadMesh("r5", meshLod);
+  shoulder = loadMesh("r1", meshLod);
+  upArm = loadMesh("r2", meshLod);
+  loArm = loadMesh("r3", meshLod);
+  end = loadMesh("r4", meshLod);
   
   shoulder.disableStyle();
   upArm.disableStyle();
   loArm.disableStyle(); 
   
+  trail = new Trail(trailLength, trailChunkSize, trailSpacing, color(#D003FF, 150));
+
   millisOld = millis() / 1000.0;  // Inicializar tiempo
     
-  // Cargar el CSV con los resultados físicos del punto rojo
-  physicalTable = loadTable("utils/physical_red_results.csv", "header");
-  if (physicalTable == null) {
-    println("No se pudo cargar physical_red_results.csv");
+  // Cargar los resultados físicos del punto rojo: la versión binaria (.ptrj) si
+  // existe, si no el CSV
+  physicalTrajectory = loadTrajectory("utils/physical_red_results.ptrj");
+  if (physicalTrajectory != null && physicalTrajectory.rate > 0) {
+    // Un paso de la grilla de tiempos por muestra; los tramos entre keyframes
+    // (scripts/trajectory_filter.py) duran lo que indican sus tiempos
+    stepDelay = max(1, round(1000 / (float) physicalTrajectory.rate));
+    currentStepDelay = stepDelay;
+  }
+  if (physicalTrajectory == null) {
+    physicalTable = loadTable("utils/physical_red_results.csv", "header");
+    if (physicalTable == null) {
+      println("No se pudo cargar physical_red_results.csv");
+    }
   }
   lastUpdateTime = millis();
 
-  // Inicializar prevTarget y nextTarget a partir del primer registro (si existe)
-  if (physicalTable != null && physicalTable.getRowCount() > 0) {
-    TableRow row0 = physicalTable.getRow(0);
-    float x0 = row0.getFloat("x");
-    float y0 = row0.getFloat("y");
-    float z0 = row0.getFloat("z");
-    prevTarget = new PVector(x0, y0, z0);
-    nextTarget = new PVector(x0, y0, z0);
-    posX = x0;
-    posY = y0;
-    posZ = z0;
+  jointTrack = loadTrajectory("utils/joint_angles.ptrj");
+  if (jointTrack != null && (jointTrack.kind != 1 || jointTrack.size() == 0)) {
+    println("utils/joint_angles.ptrj no es una pista de ángulos; se usa la IK en cada cuadro");
+    jointTrack = null;
   }
+  jointTrackStart = millis();
 
+  // Inicializar prevTarget y nextTarget a partir del primer registro válido (si existe)
+  currentStep = nextValidStep(-1);
+  if (currentStep >= 0) {
+    PVector p0 = routinePoint(currentStep);
+    prevTarget = p0.copy();
+    nextTarget = p0.copy();
+    posX = p0.x;
+    posY = p0.y;
+    posZ = p0.z;
+  } else {
+    currentStep = 0;
+  }
+
+  if (liveEnabled) {
+    startPoseReceiver();
+  }
+}
+
+// Abre el puerto UDP y recibe las poses en un hilo aparte para no bloquear draw()
+void startPoseReceiver() {
+  try {
+    liveSocket = new DatagramSocket(livePort);
+    thread("receivePoses");
+    println("Escuchando poses en el puerto", livePort);
+  } catch (Exception e) {
+    println("No se pudo abrir el puerto de poses", livePort, ":", e.getMessage());
+    liveSocket = null;
+  }
+}
+
+void receivePoses() {
+  byte[] buffer = new byte[64];
+  DatagramPacket packet = new DatagramPacket(buffer, buffer.length);
+  while (liveSocket != null && !liveSocket.isClosed()) {
+    try {
+      liveSocket.receive(packet);
+    } catch (Exception e) {
+      break;  // socket cerrado al salir
+    }
+    if (packet.getLength() < POSE_MESSAGE_SIZE) continue;
+    ByteBuffer msg = ByteBuffer.wrap(buffer, 0, packet.getLength());  // big-endian por defecto
+    if (msg.get() != 'P' || msg.get() != 'T' || msg.get() != 1) continue;
+    int flags = msg.get();
+    long seq = msg.getInt() & 0xFFFFFFFFL;
+    double stamp = msg.getDouble();  // instante de captura (para ordenar, no para dibujar)
+    float x = msg.getFloat();
+    float y = msg.getFloat();
+    float z = msg.getFloat();
+    if ((flags & 1) == 0) continue;  // detección fallida: se mantiene la última pose
+    String sender = String.valueOf(packet.getSocketAddress());
+    synchronized (this) {
+      // Un publicador nuevo (otro puerto de origen) empieza otra sesión con su propia
+      // secuencia. Dentro de la sesión se descartan los mensajes atrasados: una
+      // secuencia menor con una captura más reciente es un reinicio, no un atraso.
+      if (!sender.equals(liveSender)) {
+        liveSender = sender;
+        liveSeq = -1;
+      } else if (seq <= liveSeq && stamp <= liveStamp) {
+        continue;
+      }
+      liveSeq = seq;
+      liveStamp = stamp;
+      liveTarget = new PVector(x, y, z);
+    }
+  }
+}
+
+void exit() {
+  if (liveSocket != null) {
+    liveSocket.close();
+  }
+  super.exit();
 }
 
 // Save actual point of view configuration in a text file
@@ -81,11 +189,23 @@ void keyPressed() {
 
 void draw() { 
 
-  // Actualiza la posición del efector final (punto rojo) interpolando entre datos del CSV
-  updateArmPositionFromCSV();
-
-  // Calcula la cinemática inversa usando la posición actual
-  IK();
+  // Actualiza la posición del efector final (punto rojo): desde el flujo en vivo si
+  // ya llegó alguna pose, si no interpolando entre datos del CSV
+  PVector target;
+  synchronized (this) {
+    target = liveTarget;
+  }
+  // Calcula la cinemática inversa usando la posición actual, salvo que se reproduzca
+  // la pista de ángulos precalculada
+  if (target != null) {
+    updateArmPositionFromStream(target);
+    IK();
+  } else if (jointTrack != null) {
+    updateArmFromJointTrack();
+  } else {
+    updateArmPositionFromCSV();
+    IK();
+  }
 
   //  writePos();
    background(32);
@@ -93,16 +213,8 @@ void draw() {
    lights();
    directionalLight(100, 102, 400, -1, 0, 0);
    
-   // Actualización del historial de posiciones
-   for (int i = 0; i < Xsphere.length - 1; i++) {
-       Xsphere[i] = Xsphere[i + 1];
-       Ysphere[i] = Ysphere[i + 1];
-       Zsphere[i] = Zsphere[i + 1];
-   }
-   
-   Xsphere[Xsphere.length - 1] = posX;
-   Ysphere[Xsphere.length - 1] = posY;
-   Zsphere[Zsphere.length - 1] = posZ;
+   // Actualización del historial de posiciones (en coordenadas de dibujo)
+   trail.add(-posY, -posZ - 11, -posX);
    
    noStroke();
    translate(width / 2, height / 2);
@@ -111,13 +223,7 @@ void draw() {
    scale(-4);
    
    // Dibujar trayectoria como línea continua
-   stroke(#D003FF, 150);
-   strokeWeight(1);  // Grosor de la línea
-   for (int i = 0; i < Xsphere.length - 1; i++) {
-       line(-Ysphere[i], -Zsphere[i] - 11, -Xsphere[i],
-            -Ysphere[i + 1], -Zsphere[i + 1] - 11, -Xsphere[i + 1]);
-   }
-   noStroke();
+   trail.draw();
     
    fill(#FFE308);  
    translate(0, -40, 0);   
@@ -142,13 +248,45 @@ void draw() {
    shape(end);
 }
 
+// Cantidad de muestras de la rutina cargada
+int routineLength() {
+  if (physicalTrajectory != null) return physicalTrajectory.size();
+  if (physicalTable != null) return physicalTable.getRowCount();
+  return 0;
+}
+
+// Posición de la muestra i de la rutina, o null si esa muestra no es válida
+PVector routinePoint(int i) {
+  if (physicalTrajectory != null) return physicalTrajectory.position(i);
+  TableRow row = physicalTable.getRow(i);
+  return new PVector(row.getFloat("x"), row.getFloat("y"), row.getFloat("z"));
+}
+
+// Siguiente muestra válida después de 'step' (dando la vuelta), o -1 si no hay ninguna
+int nextValidStep(int step) {
+  int rowCount = routineLength();
+  for (int k = 1; k <= rowCount; k++) {
+    int i = (step + k) % rowCount;
+    if (routinePoint(i) != null) return i;
+  }
+  return -1;
+}
+
+// Duración en milisegundos del tramo de la muestra 'from' a la 'to': en un .ptrj
+// la indican sus tiempos; al dar la vuelta a la rutina, o con el CSV, es stepDelay
+int routineStepDelay(int from, int to) {
+  if (physicalTrajectory != null && to > from) {
+    return max(1, (int) Math.round(1000 * (physicalTrajectory.time(to) - physicalTrajectory.time(from))));
+  }
+  return stepDelay;
+}
+
 void updateArmPositionFromCSV() {
-  if (physicalTable == null) return;
-  int rowCount = physicalTable.getRowCount();
-  if (rowCount == 0) return;
+  int rowCount = routineLength();
+  if (rowCount == 0 || prevTarget == null) return;
   
   // Calcula el factor de interpolación (t entre 0 y 1)
-  float t = (millis() - lastUpdateTime) / float(stepDelay);
+  float t = (millis() - lastUpdateTime) / float(currentStepDelay);
   t = constrain(t, 0, 1);
   
   // Interpolación lineal entre prevTarget y nextTarget
@@ -160,15 +298,40 @@ void updateArmPositionFromCSV() {
   if (t >= 1.0) {
     // Actualiza prevTarget al actual nextTarget
     prevTarget = nextTarget.copy();
-    currentStep = (currentStep + 1) % rowCount;
-    TableRow row = physicalTable.getRow(currentStep);
-    nextTarget = new PVector(row.getFloat("x"), row.getFloat("y"), row.getFloat("z"));
+    int previousStep = currentStep;
+    currentStep = nextValidStep(currentStep);
+    currentStepDelay = routineStepDelay(previousStep, currentStep);
+    nextTarget = routinePoint(currentStep);
     lastUpdateTime = millis();
   }
   
   println("Interpolated PhysicalRed: ", posX, posY, posZ);
 }
 
+// Acerca la posición actual a la última pose recibida con un suavizado exponencial
+// independiente de la tasa de frames
+void updateArmPositionFromStream(PVector target) {
+  int now = millis();
+  float dt = (now - lastLiveUpdate) / 1000.0;
+  lastLiveUpdate = now;
+  float t = 1 - exp(-liveSmoothing * constrain(dt, 0, 1));
+  
+  posX = lerp(posX, target.x, t);
+  posY = lerp(posY, target.y, t);
+  posZ = lerp(posZ, target.z, t);
+}
+
+// Toma los ángulos del cuadro actual de la pista y recalcula la posición del efector
+// (para la trayectoria dibujada) con la cinemática directa
+void updateArmFromJointTrack() {
+  int frame = int((millis() - jointTrackStart) / 1000.0 * (float) jointTrack.rate) % jointTrack.size();
+  PVector angles = jointTrack.position(frame);
+  if (angles == null) return;  // cuadro inalcanzable: se mantiene la última postura
+  alpha = angles.x;
+  beta = angles.y;
+  gamma = angles.z;
+  FK();
+}
 
 void mouseDragged() {
     rotY -= (mouseX - pmouseX) * 0.01;
@@ -183,11 +346,24 @@ void IK() {
   float L = sqrt(Y * Y + X * X);
   float dia = sqrt(Z * Z + L * L);
 
+  // Fuera del espacio de trabajo acos daría NaN: se mantiene la última postura
+  if (dia > F + T || dia < abs(T - F)) return;
+
   alpha = PI / 2 - (atan2(L, Z) + acos((T * T - F * F - dia * dia) / (-2 * F * dia)));
   beta = -PI + acos((dia * dia - T * T - F * F) / (-2 * F * T));
   gamma = atan2(Y, X);
 }
 
+// Cinemática directa: posición del efector a partir de alpha, beta y gamma
+void FK() {
+  float theta1 = PI / 2 - alpha;  // primer eslabón, medido desde el eje Z
+  float theta2 = theta1 + beta;
+  float L = F * sin(theta1) + T * sin(theta2);
+  posX = L * cos(gamma);
+  posY = L * sin(gamma);
+  posZ = F * cos(theta1) + T * cos(theta2);
+}
+
 void setTime() {
   float currentTime = millis() / 1000.0;
   gTime += (currentTime - millisOld) * (gSpeed / 4);
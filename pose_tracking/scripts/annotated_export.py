@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+
+import cv2
+
+from instrumentation import stage, count
+from marker_render import draw_overlay
+
+# Políticas cuando la cola de exportación está llena: 'block' (por defecto) deja el
+# video completo; 'drop' es para fuentes en vivo, donde la detección no puede esperar
+POLICIES = ("block", "drop")
+
+# Prioridad (nice) del hilo de escritura con la política 'drop': con pocos núcleos la
+# codificación cede la CPU a la detección y lo que no alcanza a escribirse se descarta.
+# Con 'block' no se cambia, porque la detección esperaría a un hilo relegado.
+WRITER_NICE = 10
+
+# Marca de fin de la cola
+_FIN = object()
+
+# Códec según la extensión del archivo de salida
+FOURCC_BY_EXT = {
+    ".avi": "MJPG",
+    ".mp4": "mp4v",
+    ".mkv": "mp4v",
+}
+
+class AnnotatedVideoWriter:
+    """
+    Exportación de video anotado en un hilo propio. El productor (la detección) solo
+    encola el frame con sus detecciones; el dibujo de las anotaciones (draw_overlay)
+    y la codificación se hacen en el hilo de escritura. La cola tiene 'queue_size'
+    lugares y, cuando se llena, la política 'block' espera a que haya lugar (el video
+    queda completo) y 'drop' descarta el frame (la detección nunca espera; pensada
+    para fuentes en vivo). Los descartes se informan en stats()["descartados"].
+    El frame encolado no se copia: quien llama no debe modificarlo después.
+    Con 'drop', en Linux el hilo de escritura corre con prioridad 'nice' (ver WRITER_NICE).
+    """
+
+    def __init__(self, path, fps=30.0, policy="block", queue_size=32, fourcc=None, nice=WRITER_NICE):
+        if policy not in POLICIES:
+            raise ValueError(f"Política de exportación desconocida: {policy}")
+        self.path = path
+        self.fps = fps
+        self.policy = policy
+        if fourcc is None:
+            ext = path[path.rfind("."):].lower() if "." in path else ""
+            fourcc = FOURCC_BY_EXT.get(ext, "mp4v")
+        self.fourcc = fourcc
+        self.nice = nice if policy == "drop" else 0
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.writer = None
+        self.error = None
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="exportacion", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, detected_points, physical=None, label=None):
+        """
+        Encola un frame con sus detecciones ({color: (x, y) o lista}) y la posición
+        física del rojo. Devuelve False si se descartó (política 'drop' con la cola
+        llena, o la exportación falló).
+        """
+        if self.closed or self.error is not None:
+            self.dropped += 1
+            return False
+        item = (frame, detected_points, physical, label)
+        if self.policy == "block":
+            with stage("export.wait"):
+                self.queue.put(item)
+        else:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                count("export.dropped")
+                return False
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def _open(self, frame):
+        height, width = frame.shape[:2]
+        writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+        if not writer.isOpened():
+            raise IOError(f"No se pudo crear el video '{self.path}' con el códec {self.fourcc}.")
+        return writer
+
+    def _run(self):
+        if self.nice and hasattr(os, "setpriority"):
+            try:
+                # En Linux la prioridad de un hilo se ajusta con su id nativo
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(),
+                               os.getpriority(os.PRIO_PROCESS, 0) + self.nice)
+            except OSError:
+                pass
+        while True:
+            item = self.queue.get()
+            if item is _FIN:
+                break
+            if self.error is not None:
+                continue  # se vacía la cola sin escribir para no bloquear al productor
+            frame, detected_points, physical, label = item
+            try:
+                with stage("export.draw"):
+                    view = draw_overlay(frame.copy(), detected_points, physical, label)
+                with stage("export.write"):
+                    if self.writer is None:
+                        self.writer = self._open(view)
+                    self.writer.write(view)
+                self.written += 1
+            except Exception as e:
+                self.error = e
+                print(f"Error en la exportación de '{self.path}': {e}")
+        if self.writer is not None:
+            self.writer.release()
+
+    def close(self):
+        """
+        Escribe los frames pendientes y cierra el archivo.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_FIN)
+        self.thread.join()
+
+    def stats(self):
+        """
+        Contadores de la exportación: cada frame recibido cuenta como encolado o
+        como descartado (encolados + descartados = frames recibidos).
+        """
+        return {
+            "encolados": self.submitted,
+            "escritos": self.written,
+            "descartados": self.dropped,
+            "cola_maxima": self.max_depth,
+            "politica": self.policy,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+
+from color_labeling import COLOR_RANGES, MULTI_DETECTION_COLORS, get_labeler
+from motion_gate import MotionGate
+from trajectory_store import TRAJECTORY_EXT
+from video_to_trajectory import video_to_trajectory
+
+# Extensiones de video que se buscan en la carpeta de entrada
+VIDEO_EXTS = (".webm", ".mp4", ".avi", ".mkv", ".mov")
+
+# Archivo de estado del lote, dentro de la carpeta de salida
+STATE_FILE = "batch_state.json"
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def buscar_videos(carpeta, extensiones=VIDEO_EXTS):
+    """
+    Videos de 'carpeta' (sin entrar en subcarpetas), ordenados por nombre.
+    """
+    return sorted(os.path.join(carpeta, nombre) for nombre in os.listdir(carpeta)
+                  if nombre.lower().endswith(extensiones) and os.path.isfile(os.path.join(carpeta, nombre)))
+
+def nombres_salida(videos):
+    """
+    Nombre del .ptrj de cada video: el nombre del video sin extensión, o con la
+    extensión incluida si dos videos comparten el mismo nombre.
+    """
+    bases = [os.path.splitext(os.path.basename(v))[0] for v in videos]
+    nombres = {}
+    for video, base in zip(videos, bases):
+        if bases.count(base) > 1:
+            base = os.path.basename(video).replace(".", "_")
+        nombres[video] = base + TRAJECTORY_EXT
+    return nombres
+
+def firma(video):
+    st = os.stat(video)
+    return [st.st_size, st.st_mtime_ns]
+
+def cargar_estado(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"No se pudo leer el estado del lote '{path}' ({e}); se empieza de nuevo.")
+        return {}
+
+def guardar_estado(path, estado):
+    """
+    Escribe el estado en un archivo temporal y lo reemplaza de forma atómica, así
+    una interrupción a mitad de la escritura no deja un JSON corrupto.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _init_worker():
+    """
+    Construye una sola vez por proceso la tabla de colores.
+    """
+    get_labeler(COLOR_RANGES, MULTI_DETECTION_COLORS)
+
+def _procesar(tarea):
+    """
+    Procesa un video (video, salida, opciones) continuando la salida .ptrj si ya
+    existe. Devuelve (video, estadísticas o None, error o None); los errores se
+    capturan para que un video defectuoso no detenga el lote.
+    """
+    video, salida, opciones = tarea
+    compuerta = None
+    if opciones["motion_gate"]:
+        compuerta = MotionGate()
+    try:
+        stats = video_to_trajectory(video, salida, opciones["step"], seguir=opciones["track"],
+                                    piramide=opciones["pyramid"], compuerta=compuerta, reanudar=True)
+        return video, stats, None
+    except Exception as e:
+        return video, None, repr(e)
+
+def procesar_carpeta(carpeta, salida, workers=1, opciones=None, rehacer=False):
+    """
+    Genera una trayectoria .ptrj por cada video de 'carpeta' en la carpeta 'salida',
+    repartiendo los videos entre 'workers' procesos. El estado de cada video se
+    guarda en STATE_FILE: los completos (mismo archivo y mismas opciones) se saltan,
+    y los que quedaron a medias continúan después del último frame guardado en su
+    .ptrj. Si el video o las opciones cambiaron, se procesa de nuevo desde el principio.
+    Devuelve el estado final.
+    """
+    if opciones is None:
+        opciones = {"step": 1, "track": False, "pyramid": 1, "motion_gate": False}
+    os.makedirs(salida, exist_ok=True)
+    estado_path = os.path.join(salida, STATE_FILE)
+    estado = {} if rehacer else cargar_estado(estado_path)
+
+    videos = buscar_videos(carpeta)
+    nombres = nombres_salida(videos)
+    tareas = []
+    for video in videos:
+        clave = os.path.basename(video)
+        ptrj = os.path.join(salida, nombres[video])
+        previo = estado.get(clave)
+        vigente = (previo is not None and previo["firma"] == firma(video)
+                   and previo["opciones"] == opciones and previo["salida"] == nombres[video])
+        if vigente and previo["estado"] == "completo" and os.path.exists(ptrj):
+            print(f"{clave}: ya procesado ({previo['muestras']} muestras)")
+            continue
+        if not vigente and os.path.exists(ptrj):
+            os.remove(ptrj)
+        estado[clave] = {"estado": "en_proceso", "firma": firma(video), "opciones": opciones,
+                         "salida": nombres[video], "muestras": 0, "error": None}
+        tareas.append((video, ptrj, opciones))
+    guardar_estado(estado_path, estado)
+
+    if not tareas:
+        print("No hay videos pendientes.")
+        return estado
+
+    print(f"{len(tareas)} de {len(videos)} videos pendientes, {min(workers, len(tareas))} procesos")
+    if workers > 1:
+        pool = multiprocessing.Pool(min(workers, len(tareas)), initializer=_init_worker)
+        resultados = pool.imap_unordered(_procesar, tareas)
+    else:
+        pool = None
+        _init_worker()
+        resultados = map(_procesar, tareas)
+
+    try:
+        for video, stats, error in resultados:
+            clave = os.path.basename(video)
+            if error is not None:
+                # El .ptrj conserva lo procesado; la próxima corrida lo continúa
+                estado[clave].update(estado="error", error=error)
+                print(f"{clave}: error: {error}")
+            else:
+                total = stats["previas"] + stats["muestras"]
+                estado[clave].update(estado="completo", muestras=total, error=None)
+                print(f"{clave}: {total} muestras ({stats['muestras_por_segundo']:.1f} frames/s)")
+            guardar_estado(estado_path, estado)
+    except KeyboardInterrupt:
+        print("Interrumpido; los videos a medias continúan en la próxima corrida.")
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+            pool = None
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return estado
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generar la trayectoria de cada video de una carpeta, en paralelo y con reanudación.")
+    parser.add_argument("videos", nargs="?", default=os.path.join(SCRIPT_DIR, "..", "videos"),
+                        help="Carpeta con los videos (por defecto ../videos).")
+    parser.add_argument("--output", default=os.path.join(SCRIPT_DIR, "..", "utils", "trajectories"),
+                        help="Carpeta de salida para los .ptrj y el estado del lote (por defecto ../utils/trajectories).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Cantidad de procesos en paralelo.")
+    parser.add_argument("--step", type=int, default=1, help="Procesar uno de cada N frames.")
+    parser.add_argument("--track", action="store_true",
+                        help="Buscar los marcadores solo en ventanas alrededor de su última posición.")
+    parser.add_argument("--pyramid", type=int, choices=[1, 2, 4], default=1,
+                        help="Detectar sobre el frame reducido por N y refinar a resolución completa.")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="Reutilizar la detección anterior en los frames sin movimiento.")
+    parser.add_argument("--restart", action="store_true", help="Ignorar el estado guardado y procesar todo de nuevo.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.videos):
+        print(f"La carpeta de videos '{args.videos}' no existe.")
+        sys.exit(1)
+    opciones = {"step": max(1, args.step), "track": args.track, "pyramid": args.pyramid,
+                "motion_gate": args.motion_gate}
+    estado = procesar_carpeta(args.videos, args.output, max(1, args.workers), opciones, args.restart)
+    completos = sum(1 for e in estado.values() if e["estado"] == "completo")
+    print(f"Lote terminado: {completos} de {len(estado)} videos completos en {args.output}")
+
+# example : python3 batch_videos.py ../videos --output ../utils/trajectories --workers 4 --step 12
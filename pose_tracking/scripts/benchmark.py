@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+import cv2
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import numpy as np
+
+from color_labeling import COLOR_RANGES, MULTI_DETECTION_COLORS, detect_color_points
+from generate_routine import pixel_to_physical, process_image
+from screen_sampling import extraer_capturas
+
+# Colores BGR de los marcadores físicos (los hex anotados junto a color_ranges)
+MARKER_BGR = {
+    "red": (0, 0, 255),        # ff0000
+    "pink": (255, 0, 249),     # f900ff
+    "blue": (255, 0, 0),       # 0000ff
+    "white": (255, 255, 255),  # ffffff
+    "celeste": (247, 255, 0),  # 00fff7
+    "green": (0, 255, 18),     # 12ff00
+}
+
+# Subdivisión de píxel usada por cv2.circle para dibujar centros sub-píxel
+_SHIFT = 4
+
+# Tolerancia por defecto al comparar contra una línea base (fracción)
+DEFAULT_TOLERANCE = 0.10
+
+# Margen absoluto mínimo para los conteos (frames fallidos) y los errores en píxeles,
+# que con valores base chicos varían de a saltos; los tiempos usan solo la tolerancia
+COUNT_MARGIN = 0.5
+COUNT_METRICS = (".missed", ".max_error_px")
+
+
+def generate_frame(width, height, rng, radius=8, multi_count=3, noise=0.0,
+                   colors=None, multi_detection_colors=None):
+    """
+    Genera un frame sintético con un marcador circular por cada color (y
+    'multi_count' marcadores para los colores múltiples) sobre un fondo oscuro,
+    con ruido gaussiano opcional de desviación 'noise'. Devuelve el frame y la
+    verdad de campo {color: [(x, y), ...]} con centros sub-píxel.
+    Los marcadores no se superponen entre sí.
+    """
+    if colors is None:
+        colors = list(MARKER_BGR)
+    if multi_detection_colors is None:
+        multi_detection_colors = MULTI_DETECTION_COLORS
+
+    frame = np.full((height, width, 3), 32, dtype=np.uint8)
+    truth = {}
+    placed = []
+    min_dist = 2 * radius + 4
+    for color in colors:
+        count = multi_count if color in multi_detection_colors else 1
+        for _ in range(count):
+            for _ in range(1000):
+                x = rng.uniform(radius + 2, width - radius - 3)
+                y = rng.uniform(radius + 2, height - radius - 3)
+                if all((x - px) ** 2 + (y - py) ** 2 >= min_dist ** 2 for px, py in placed):
+                    break
+            else:
+                raise ValueError("No hay espacio para todos los marcadores en el frame.")
+            placed.append((x, y))
+            center = (int(round(x * (1 << _SHIFT))), int(round(y * (1 << _SHIFT))))
+            cv2.circle(frame, center, radius << _SHIFT, MARKER_BGR[color], -1, cv2.LINE_8, _SHIFT)
+            truth.setdefault(color, []).append((center[0] / (1 << _SHIFT), center[1] / (1 << _SHIFT)))
+
+    if noise > 0:
+        noisy = frame.astype(np.float32) + rng.normal(0, noise, frame.shape).astype(np.float32)
+        frame = np.clip(noisy, 0, 255).astype(np.uint8)
+    return frame, truth
+
+
+def latency_stats(samples):
+    """
+    Resumen de una lista de latencias en segundos: media y percentiles en ms,
+    y rendimiento en llamadas por segundo.
+    """
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "calls": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "throughput_per_s": float(1000.0 / ms.mean()) if ms.mean() > 0 else 0.0,
+    }
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def match_accuracy(detected_points, truth, max_dist=5.0):
+    """
+    Compara los puntos detectados con la verdad de campo. Cada punto verdadero se
+    empareja con el detectado más cercano del mismo color aún libre; si no hay
+    ninguno a menos de 'max_dist' píxeles cuenta como no detectado. Devuelve las
+    distancias de los emparejados y la cantidad de marcadores no detectados.
+    """
+    errors = []
+    missed = 0
+    for color, true_points in truth.items():
+        found = detected_points.get(color, [])
+        free = list(found if isinstance(found, list) else [found])
+        for (tx, ty) in true_points:
+            if not free:
+                missed += 1
+                continue
+            dists = [np.hypot(x - tx, y - ty) for (x, y) in free]
+            best = int(np.argmin(dists))
+            if dists[best] > max_dist:
+                missed += 1
+                continue
+            errors.append(float(dists[best]))
+            free.pop(best)
+    return errors, missed
+
+
+def bench_detection(width, height, frames, repeat, noise, rng):
+    """
+    Mide detect_color_points y su exactitud sobre 'frames' frames sintéticos.
+    """
+    samples = []
+    errors = []
+    missed = 0
+    total = 0
+    for _ in range(frames):
+        frame, truth = generate_frame(width, height, rng, noise=noise)
+        # La primera llamada construye la tabla de colores y no se cuenta
+        detect_color_points(frame.copy(), COLOR_RANGES, MULTI_DETECTION_COLORS)
+        samples += _timed(lambda: detect_color_points(frame.copy(), COLOR_RANGES, MULTI_DETECTION_COLORS),
+                          repeat)
+        detected_points, _ = detect_color_points(frame.copy(), COLOR_RANGES, MULTI_DETECTION_COLORS)
+        frame_errors, frame_missed = match_accuracy(detected_points, truth)
+        errors += frame_errors
+        missed += frame_missed
+        total += sum(len(points) for points in truth.values())
+    result = latency_stats(samples)
+    result["accuracy"] = {
+        "markers": total,
+        "missed": missed,
+        "mean_error_px": float(np.mean(errors)) if errors else None,
+        "max_error_px": float(np.max(errors)) if errors else None,
+    }
+    return result
+
+
+def bench_pixel_to_physical(repeat, rng):
+    """
+    Mide pixel_to_physical sobre posiciones relativas aleatorias.
+    """
+    coords = [tuple(p) for p in rng.integers(-400, 400, size=(repeat, 2))]
+    samples = []
+    for coord in coords:
+        start = time.perf_counter()
+        pixel_to_physical(coord)
+        samples.append(time.perf_counter() - start)
+    return latency_stats(samples)
+
+
+def bench_process_image(width, height, frames, repeat, noise, rng, workdir):
+    """
+    Mide process_image (lectura de disco incluida) sobre imágenes sintéticas
+    guardadas como JPEG.
+    """
+    paths = []
+    for i in range(frames):
+        frame, _ = generate_frame(width, height, rng, noise=noise)
+        path = os.path.join(workdir, f"synthetic_{width}x{height}_{i:03d}.jpg")
+        cv2.imwrite(path, frame)
+        paths.append(path)
+    samples = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        process_image(paths[0], COLOR_RANGES, MULTI_DETECTION_COLORS)
+        for path in paths:
+            samples += _timed(lambda: process_image(path, COLOR_RANGES, MULTI_DETECTION_COLORS), repeat)
+    return latency_stats(samples)
+
+
+def bench_extraer_capturas(width, height, video_frames, captures, noise, rng, workdir):
+    """
+    Mide extraer_capturas sobre un video sintético en MJPG. Devuelve el tiempo total
+    y el rendimiento en capturas por segundo.
+    """
+    video_path = os.path.join(workdir, f"synthetic_{width}x{height}.avi")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (width, height))
+    for _ in range(video_frames):
+        frame, _ = generate_frame(width, height, rng, noise=noise)
+        writer.write(frame)
+    writer.release()
+
+    output_folder = os.path.join(workdir, f"captures_{width}x{height}")
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        extraer_capturas(video_path, captures, output_folder)
+    duration = time.perf_counter() - start
+    return {
+        "video_frames": video_frames,
+        "captures": captures,
+        "seconds": duration,
+        "throughput_per_s": captures / duration if duration > 0 else 0.0,
+    }
+
+
+def run(resolutions, frames=5, repeat=10, noise=4.0, seed=0, video_frames=120, captures=20):
+    """
+    Ejecuta toda la batería y devuelve los resultados como diccionario serializable.
+    """
+    rng = np.random.default_rng(seed)
+    results = {
+        "meta": {
+            "seed": seed,
+            "frames": frames,
+            "repeat": repeat,
+            "noise": noise,
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "pixel_to_physical": bench_pixel_to_physical(max(1000, repeat * 100), rng),
+        "resolutions": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for (width, height) in resolutions:
+            key = f"{width}x{height}"
+            print(f"Midiendo {key}...")
+            results["resolutions"][key] = {
+                "detect_color_points": bench_detection(width, height, frames, repeat, noise, rng),
+                "process_image": bench_process_image(width, height, frames, repeat, noise, rng, workdir),
+                "extraer_capturas": bench_extraer_capturas(width, height, video_frames, captures,
+                                                           noise, rng, workdir),
+            }
+    return results
+
+
+def _metrics(results):
+    """
+    Aplana los resultados en {nombre: (valor, mayor_es_mejor)} para compararlos.
+    """
+    metrics = {"pixel_to_physical.p50_ms": (results["pixel_to_physical"]["p50_ms"], False)}
+    for key, res in results["resolutions"].items():
+        for name in ("detect_color_points", "process_image"):
+            metrics[f"{key}.{name}.p50_ms"] = (res[name]["p50_ms"], False)
+            metrics[f"{key}.{name}.p99_ms"] = (res[name]["p99_ms"], False)
+        metrics[f"{key}.extraer_capturas.throughput_per_s"] = (res["extraer_capturas"]["throughput_per_s"], True)
+        accuracy = res["detect_color_points"]["accuracy"]
+        metrics[f"{key}.detect_color_points.missed"] = (accuracy["missed"], False)
+        if accuracy["max_error_px"] is not None:
+            metrics[f"{key}.detect_color_points.max_error_px"] = (accuracy["max_error_px"], False)
+    return metrics
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compara los resultados con una línea base. Devuelve la lista de regresiones
+    (nombre, base, actual) que empeoran más que 'tolerance'.
+    """
+    current = _metrics(results)
+    previous = _metrics(baseline)
+    regressions = []
+    for name, (value, higher_is_better) in current.items():
+        if name not in previous:
+            continue
+        base = previous[name][0]
+        if higher_is_better:
+            worse = value < base * (1 - tolerance)
+        else:
+            worse = value > base * (1 + tolerance)
+            if name.endswith(COUNT_METRICS):
+                worse = worse and value - base > COUNT_MARGIN
+        status = "REGRESIÓN" if worse else "ok"
+        print(f"{name:55s} base={base:10.3f} actual={value:10.3f} {status}")
+        if worse:
+            regressions.append((name, base, value))
+    return regressions
+
+
+def parse_resolution(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reproducible de la detección de marcadores.")
+    parser.add_argument("--resolutions", default="640x480,1280x720,1920x1080",
+                        help="Resoluciones separadas por coma (ancho x alto).")
+    parser.add_argument("--frames", type=int, default=5, help="Frames sintéticos por resolución.")
+    parser.add_argument("--repeat", type=int, default=10, help="Repeticiones por frame.")
+    parser.add_argument("--noise", type=float, default=4.0, help="Desviación del ruido gaussiano.")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del generador.")
+    parser.add_argument("--video-frames", type=int, default=120, help="Frames del video sintético.")
+    parser.add_argument("--captures", type=int, default=20, help="Capturas a extraer del video sintético.")
+    parser.add_argument("--output", default="benchmark_results.json", help="Archivo JSON de resultados.")
+    parser.add_argument("--baseline", default=None, help="JSON de una ejecución anterior para comparar.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Empeoramiento relativo admitido frente a la línea base.")
+    args = parser.parse_args()
+
+    resolutions = [parse_resolution(r) for r in args.resolutions.split(",")]
+    results = run(resolutions, args.frames, args.repeat, args.noise, args.seed,
+                  args.video_frames, args.captures)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print("Resultados guardados en", args.output)
+
+    for key, res in results["resolutions"].items():
+        det = res["detect_color_points"]
+        print(f"{key}: detect_color_points p50={det['p50_ms']:.2f} ms p99={det['p99_ms']:.2f} ms "
+              f"error máx={det['accuracy']['max_error_px']} px fallos={det['accuracy']['missed']}; "
+              f"process_image p50={res['process_image']['p50_ms']:.2f} ms; "
+              f"extraer_capturas {res['extraer_capturas']['throughput_per_s']:.1f} capturas/s")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} métricas empeoraron respecto a la línea base.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+# example : python3 benchmark.py --resolutions 1280x720,1920x1080 --output /tmp/bench.json --baseline /tmp/bench_base.json
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+import sys
+import time
+import argparse
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from color_labeling import COLOR_RANGES, MULTI_DETECTION_COLORS, get_labeler
+
+# Distancia máxima (píxeles) entre la posición predicha de un track y una detección
+# para poder asociarlas
+MAX_DISTANCE = 30.0
+
+# Frames seguidos sin detección tras los cuales un track se descarta
+MAX_MISSED = 5
+
+# Costo de una asignación fuera de la compuerta: mayor que cualquier suma de costos válidos
+_FORBIDDEN = 1e9
+
+def hungarian(cost):
+    """
+    Asignación de costo mínimo (algoritmo húngaro con caminos de aumento más cortos,
+    O(n^2 m)) para una matriz de costos de n filas y m columnas con n <= m.
+    Devuelve, para cada fila, la columna asignada.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    n, m = cost.shape
+    if n > m:
+        raise ValueError("La matriz de costos debe tener a lo sumo tantas filas como columnas.")
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # fila (desde 1) asignada a cada columna; 0 = libre
+    way = np.zeros(m + 1, dtype=np.int64)
+    for row in range(1, n + 1):
+        owner[0] = row
+        col = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while owner[col] != 0:
+            used[col] = True
+            i = owner[col]
+            free = ~used[1:]
+            reduced = cost[i - 1] - u[i] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = col
+            candidates = np.where(free, minv[1:], np.inf)
+            nxt = int(np.argmin(candidates)) + 1
+            delta = candidates[nxt - 1]
+            u[owner[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            col = nxt
+        while col != 0:
+            prev = way[col]
+            owner[col] = owner[prev]
+            col = prev
+    assignment = np.empty(n, dtype=np.int64)
+    assigned = np.flatnonzero(owner[1:]) + 1
+    assignment[owner[assigned] - 1] = assigned - 1
+    return assignment
+
+def _candidate_pairs(predicted, detected, max_distance):
+    """
+    Pares (track, detección) a menos de 'max_distance', buscados con una grilla de
+    celdas de ese lado: cada track solo se compara con las detecciones de las 3x3
+    celdas vecinas. Devuelve (filas, columnas, distancias).
+    """
+    cells = defaultdict(list)
+    keys = np.floor(detected / max_distance).astype(np.int64)
+    for j, (cx, cy) in enumerate(keys):
+        cells[(cx, cy)].append(j)
+    rows, cols = [], []
+    for i, (cx, cy) in enumerate(np.floor(predicted / max_distance).astype(np.int64)):
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in cells.get((cx + dx, cy + dy), ()):
+                    rows.append(i)
+                    cols.append(j)
+    rows = np.array(rows, dtype=np.int64)
+    cols = np.array(cols, dtype=np.int64)
+    dist = np.linalg.norm(predicted[rows] - detected[cols], axis=1) if len(rows) else np.zeros(0)
+    close = dist <= max_distance
+    return rows[close], cols[close], dist[close]
+
+def associate(predicted, detected, max_distance=MAX_DISTANCE):
+    """
+    Asocia posiciones predichas (N, 2) con detecciones (M, 2) minimizando la suma
+    de distancias, sin pares a más de 'max_distance'. El problema se separa en los
+    grupos conexos de pares candidatos y cada grupo se resuelve con hungarian, así
+    el costo depende del tamaño de los grupos y no del total de marcadores.
+    Devuelve una lista de pares (índice predicho, índice detectado).
+    """
+    predicted = np.asarray(predicted, dtype=np.float64).reshape(-1, 2)
+    detected = np.asarray(detected, dtype=np.float64).reshape(-1, 2)
+    if len(predicted) == 0 or len(detected) == 0:
+        return []
+    rows, cols, dist = _candidate_pairs(predicted, detected, max_distance)
+
+    # Grupos conexos del grafo bipartito (union-find sobre filas y columnas)
+    parent = list(range(len(predicted) + len(detected)))
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for i, j in zip(rows, cols):
+        a, b = find(i), find(len(predicted) + j)
+        if a != b:
+            parent[a] = b
+    groups = defaultdict(list)
+    for k, i in enumerate(rows):
+        groups[find(i)].append(k)
+
+    pairs = []
+    for members in groups.values():
+        g_rows, g_cols, g_dist = rows[members], cols[members], dist[members]
+        if len(members) == 1:
+            pairs.append((int(g_rows[0]), int(g_cols[0])))
+            continue
+        track_ids, r = np.unique(g_rows, return_inverse=True)
+        det_ids, c = np.unique(g_cols, return_inverse=True)
+        cost = np.full((len(track_ids), len(det_ids)), _FORBIDDEN)
+        cost[r, c] = g_dist
+        transpose = len(track_ids) > len(det_ids)
+        assignment = hungarian(cost.T if transpose else cost)
+        for a, b in enumerate(assignment):
+            i, j = (b, a) if transpose else (a, b)
+            if cost[i, j] < _FORBIDDEN:
+                pairs.append((int(track_ids[i]), int(det_ids[j])))
+    return pairs
+
+class BlobTracker:
+    """
+    Identidad estable de los blobs de los colores de detección múltiple (por ejemplo
+    "celeste") a lo largo de los frames de un video. Cada track guarda su posición y
+    velocidad; en cada frame se predice su posición (velocidad constante) y se asocia
+    con las detecciones mediante associate. Las detecciones sin track crean uno nuevo
+    con el siguiente ID libre y los tracks sin detección durante más de 'max_missed'
+    frames se descartan. Los IDs no se reutilizan.
+    """
+
+    def __init__(self, color_ranges, multi_detection_colors=None, colors=None,
+                 max_distance=MAX_DISTANCE, max_missed=MAX_MISSED):
+        self.labeler = get_labeler(color_ranges, multi_detection_colors)
+        if colors is None:
+            colors = [c for c in self.labeler.colors if c in self.labeler.multi_detection_colors]
+        for color in colors:
+            if color not in self.labeler.colors:
+                raise ValueError(f"El color '{color}' no está en color_ranges.")
+        self.colors = list(colors)
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        # color -> {id: [posición, velocidad, frames sin detección, frames detectado]}
+        self.tracks = {color: {} for color in self.colors}
+        self.next_id = 0
+        self.frames = 0
+        self.created = 0
+        self.expired = 0
+        self.matched = 0
+
+    def reset(self):
+        """
+        Descarta los tracks y pone en cero los contadores de stats(), para empezar
+        otro video. Los IDs siguen sin reutilizarse.
+        """
+        self.tracks = {color: {} for color in self.colors}
+        self.frames = 0
+        self.created = 0
+        self.expired = 0
+        self.matched = 0
+
+    def update(self, frame):
+        """
+        Procesa el siguiente frame y devuelve {color: {id: (x, y)}} con los blobs
+        detectados en él (los tracks sin detección en este frame no se incluyen).
+        """
+        detections = self.labeler.blob_stats(frame, self.colors)
+        result = self.update_detections(detections)
+        self.labeler.count_frame({color for color, blobs in result.items() if blobs}, self.colors)
+        return result
+
+    def update_detections(self, detections):
+        """
+        Igual que update, a partir de un arreglo DETECTION_DTYPE ya calculado.
+        """
+        self.frames += 1
+        result = {}
+        for color in self.colors:
+            color_id = self.labeler.colors.index(color)
+            points = np.stack([detections["x"], detections["y"]], axis=1)[detections["color_id"] == color_id]
+            tracks = self.tracks[color]
+            ids = list(tracks)
+            # Velocidad constante también a través de los frames sin detección
+            predicted = np.array([tracks[i][0] + tracks[i][1] * (tracks[i][2] + 1) for i in ids]).reshape(-1, 2)
+
+            current = {}
+            used = set()
+            matched = np.zeros(len(points), dtype=bool)
+            for t, d in associate(predicted, points, self.max_distance):
+                track = tracks[ids[t]]
+                position = points[d]
+                track[1] = (position - track[0]) / (track[2] + 1)
+                track[0] = position
+                track[2] = 0
+                track[3] += 1
+                current[ids[t]] = (float(position[0]), float(position[1]))
+                used.add(ids[t])
+                matched[d] = True
+                self.matched += 1
+            for i in ids:
+                if i not in used:
+                    tracks[i][2] += 1
+                    if tracks[i][2] > self.max_missed:
+                        del tracks[i]
+                        self.expired += 1
+            for position in points[~matched]:
+                tracks[self.next_id] = [position.copy(), np.zeros(2), 0, 1]
+                current[self.next_id] = (float(position[0]), float(position[1]))
+                self.next_id += 1
+                self.created += 1
+            result[color] = current
+        return result
+
+    def stats(self):
+        """
+        Contadores de la ejecución: frames, tracks creados y descartados, tracks
+        activos y asociaciones realizadas.
+        """
+        return {
+            "frames": self.frames,
+            "created": self.created,
+            "expired": self.expired,
+            "active": sum(len(t) for t in self.tracks.values()),
+            "matched": self.matched,
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seguir con IDs estables los blobs de los colores de detección múltiple de un video.")
+    parser.add_argument("video", help="Ruta al archivo de video.")
+    parser.add_argument("--output", default=None, help="CSV de salida (frame,color,id,x,y).")
+    parser.add_argument("--colors", nargs="+", default=None,
+                        help="Colores a seguir (por defecto los de detección múltiple).")
+    parser.add_argument("--max-distance", type=float, default=MAX_DISTANCE,
+                        help="Distancia máxima en píxeles entre la predicción y la detección.")
+    parser.add_argument("--max-missed", type=int, default=MAX_MISSED,
+                        help="Frames sin detección tras los cuales se descarta un track.")
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        print(f"Error al abrir el video '{args.video}'.")
+        sys.exit(1)
+    tracker = BlobTracker(COLOR_RANGES, MULTI_DETECTION_COLORS, args.colors, args.max_distance, args.max_missed)
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    if out:
+        out.write("frame,color,id,x,y\n")
+    inicio = time.perf_counter()
+    frame_idx = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        for color, blobs in tracker.update(frame).items():
+            for blob_id, (x, y) in blobs.items():
+                if out:
+                    out.write(f"{frame_idx},{color},{blob_id},{x:.3f},{y:.3f}\n")
+        frame_idx += 1
+    cap.release()
+    if out:
+        out.close()
+    duracion = time.perf_counter() - inicio
+    print(f"{frame_idx} frames ({frame_idx / duracion if duracion > 0 else 0.0:.1f} frames/s):", tracker.stats())
+
+# example : python3 blob_tracker.py ../videos/square_drawing.webm --output ../utils/celeste_tracks.csv
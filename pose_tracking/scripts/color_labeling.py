@@ -0,0 +1,510 @@
+import hashlib
+import warnings
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from instrumentation import stage, count
+from marker_render import draw_points
+
+# Umbral de área de contorno para los colores con múltiples detecciones
+MIN_CONTOUR_AREA = 10
+
+# Rangos HSV por defecto de los marcadores del brazo (los mismos de los scripts)
+COLOR_RANGES = {
+    "red": [((0, 100, 100), (10, 255, 255)), ((170, 100, 100), (179, 255, 255))],  # ff0000
+    "pink": [((140, 100, 100), (160, 255, 255))],   # f900ff
+    "blue": [((110, 100, 100), (130, 255, 255))],   # 0000ff
+    "white": [((0, 0, 200), (180, 30, 255))],         # ffffff
+    "celeste": [((85, 100, 100), (95, 255, 255))],   # 00fff7
+    "green": [((50, 100, 100), (70, 255, 255))]      # 12ff00
+}
+MULTI_DETECTION_COLORS = ["celeste"]
+
+# Una fila por blob detectado: índice del color en color_ranges, centroide exacto
+# por momentos, área del contorno y recuadro (x, y, ancho, alto)
+DETECTION_DTYPE = np.dtype([
+    ("color_id", np.int16),
+    ("x", np.float64),
+    ("y", np.float64),
+    ("area", np.float64),
+    ("bbox_x", np.int32),
+    ("bbox_y", np.int32),
+    ("bbox_w", np.int32),
+    ("bbox_h", np.int32),
+])
+
+# En la detección piramidal, fracción del área del mayor blob grueso a partir de
+# la cual un blob de un color de punto único se vuelve a evaluar a resolución completa
+PYRAMID_AREA_RATIO = 0.5
+
+# Tamaño del espacio BGR de 8 bits (2^24 colores)
+_BGR_SPACE = 1 << 24
+
+
+def build_label_lut(color_ranges):
+    """
+    Construye una tabla de búsqueda BGR -> etiqueta de color a partir de color_ranges.
+    La etiqueta 0 es el fondo y los colores se numeran desde 1 en el orden del diccionario.
+    La tabla se obtiene aplicando exactamente la misma conversión HSV y los mismos
+    cv2.inRange que el algoritmo original sobre los 2^24 colores posibles, por lo que
+    clasificar un píxel con la tabla da el mismo resultado que umbralizar su HSV.
+    Si un color cae en los rangos de dos etiquetas, se queda con la primera.
+    """
+    if len(color_ranges) > 255:
+        raise ValueError("Se admiten como máximo 255 colores en color_ranges.")
+
+    # Todos los colores BGR en el mismo orden de bytes que _pack_bgr
+    all_colors = np.arange(_BGR_SPACE, dtype="<u4").view(np.uint8).reshape(-1, 4)[:, :3]
+    all_colors = np.ascontiguousarray(all_colors).reshape(4096, 4096, 3)
+    hsv = cv2.cvtColor(all_colors, cv2.COLOR_BGR2HSV)
+
+    lut = np.zeros(_BGR_SPACE, dtype=np.uint8)
+    overlapping = []
+    for label, (color, ranges) in enumerate(color_ranges.items(), start=1):
+        mask = None
+        for (lower, upper) in ranges:
+            lower = np.array(lower, dtype=np.uint8)
+            upper = np.array(upper, dtype=np.uint8)
+            current_mask = cv2.inRange(hsv, lower, upper)
+            if mask is None:
+                mask = current_mask
+            else:
+                mask = cv2.bitwise_or(mask, current_mask)
+        if mask is None:
+            continue
+        mask = mask.reshape(-1).view(bool)
+        if np.any(lut[mask] != 0):
+            overlapping.append(color)
+        lut[mask & (lut == 0)] = label
+
+    if overlapping:
+        warnings.warn("Los rangos HSV de %s se solapan con colores anteriores; "
+                      "los píxeles compartidos se asignan al primer color." % ", ".join(overlapping))
+    return lut
+
+
+def _pack_bgr(frame):
+    """
+    Empaqueta cada píxel BGR en un índice de 24 bits (B + 256*G + 65536*R),
+    el mismo orden usado para construir la tabla de etiquetas.
+    """
+    bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+    packed = bgra.view("<u4")[..., 0]
+    np.bitwise_and(packed, _BGR_SPACE - 1, out=packed)
+    return packed
+
+
+class ColorLabeler:
+    """
+    Motor de detección de marcadores de una sola pasada.
+    Clasifica todos los píxeles del frame en una imagen de etiquetas con una tabla
+    precalculada y extrae los blobs de todos los colores con una única llamada a
+    cv2.connectedComponentsWithStats. Solo se trazan contornos sobre recortes
+    pequeños alrededor de los blobs candidatos, de modo que el coste por frame no
+    crece con el número de colores. El resultado coincide con el del bucle por color
+    salvo en un caso: un blob encerrado en el hueco de otro del mismo color también
+    se reporta (RETR_EXTERNAL sobre la máscara completa lo omitía).
+    """
+
+    def __init__(self, color_ranges, multi_detection_colors=None):
+        if multi_detection_colors is None:
+            multi_detection_colors = []
+        self.colors = list(color_ranges.keys())
+        self.multi_detection_colors = set(multi_detection_colors)
+        self.lut = build_label_lut(color_ranges)
+        self._fingerprints = {}
+        self._masked_luts = {}
+
+    def fingerprint(self, colors=None):
+        """
+        Hash (hex) de todo lo que determina el resultado de detectar 'colors': el
+        conjunto de colores BGR asignado a cada uno, si tienen detección múltiple y el
+        área mínima. Cambiar los rangos de otro color no lo altera, salvo que al
+        solaparse le quite píxeles a alguno de 'colors'.
+        """
+        if colors is None:
+            colors = self.colors
+        key = tuple(colors)
+        if key not in self._fingerprints:
+            h = hashlib.sha256()
+            h.update(repr(MIN_CONTOUR_AREA).encode())
+            for color in colors:
+                label = self.colors.index(color) + 1
+                h.update(color.encode())
+                h.update(b"multi" if color in self.multi_detection_colors else b"single")
+                h.update(np.packbits(self.lut == label).tobytes())
+            self._fingerprints[key] = h.hexdigest()
+        return self._fingerprints[key]
+
+    def label(self, frame):
+        """
+        Devuelve la imagen de etiquetas (uint8) del frame BGR: 0 para el fondo,
+        i+1 para el i-ésimo color de color_ranges.
+        """
+        return self.lut.take(_pack_bgr(frame))
+
+    def detect(self, frame, colors=None):
+        """
+        Detecta los marcadores en el frame sin modificarlo. Devuelve el mismo
+        diccionario que detect_color_points: una lista de centroides para los
+        colores múltiples y el centroide del contorno de mayor área para el resto.
+        Si se indica 'colors', solo se buscan esos colores.
+        """
+        detected_points = {}
+        for color, blobs in self.detect_blobs(frame, colors).items():
+            if isinstance(blobs, list):
+                detected_points[color] = [point for _, point in blobs]
+            else:
+                detected_points[color] = blobs[1]
+        return detected_points
+
+    def detect_array(self, frame, colors=None):
+        """
+        Detección sin dibujo que devuelve un arreglo estructurado DETECTION_DTYPE con
+        una fila por blob, en el mismo orden que detect. Truncar x e y con int() da
+        exactamente los centroides de detect.
+        """
+        rows = []
+        for color, found in self.detect_blobs(frame, colors).items():
+            color_id = self.colors.index(color)
+            for contour, _ in (found if isinstance(found, list) else [found]):
+                rows.append(_detection_row(color_id, contour))
+        return np.array(rows, dtype=DETECTION_DTYPE)
+
+    def detect_pyramid(self, frame, scale=2, colors=None):
+        """
+        Detección de grueso a fino: busca los blobs en el frame submuestreado por
+        'scale' (2 o 4) y luego recalcula cada uno con momentos sub-píxel dentro de
+        una ventana pequeña a resolución completa. Devuelve el mismo arreglo que
+        detect_array (centroides en coordenadas del frame completo).
+        """
+        if scale <= 1:
+            return self.detect_array(frame, colors)
+        height, width = frame.shape[:2]
+        # Vecino más cercano: no mezcla colores en los bordes de los marcadores
+        small = cv2.resize(frame, (width // scale, height // scale), interpolation=cv2.INTER_NEAREST)
+        coarse = self.detect_blobs(small, colors, min_area=MIN_CONTOUR_AREA / (scale * scale),
+                                   all_blobs=True)
+
+        rows = []
+        for color, found in coarse.items():
+            color_id = self.colors.index(color)
+            multi = color in self.multi_detection_colors
+            if not multi:
+                # Blobs de área parecida pueden invertir su orden al submuestrear:
+                # se refinan todos los candidatos cercanos al mayor y se elige a resolución completa
+                areas = [cv2.contourArea(contour) + cv2.arcLength(contour, True) / 2 for contour, _ in found]
+                found = [blob for blob, area in zip(found, areas) if area >= PYRAMID_AREA_RATIO * max(areas)]
+            refined = {}
+            best, best_area, best_rank = None, -1.0, None
+            for contour, _ in found:
+                # Recuadro grueso llevado a resolución completa, con margen
+                bx, by, bw, bh = cv2.boundingRect(contour)
+                pad = 2 * scale
+                x0, y0 = max(0, bx * scale - pad), max(0, by * scale - pad)
+                x1, y1 = min(width, (bx + bw) * scale + pad), min(height, (by + bh) * scale + pad)
+                fine = self.detect_blobs(frame[y0:y1, x0:x1], [color]).get(color)
+                if fine is None:
+                    continue
+                if not multi:
+                    fine_contour = fine[0]
+                    area = cv2.contourArea(fine_contour)
+                    rank = _scan_order(fine_contour + (x0, y0))
+                    if area > best_area or (area == best_area and rank < best_rank):
+                        best, best_area, best_rank = (fine_contour, (x0, y0)), area, rank
+                    continue
+                # Se conservan los blobs finos cuyo centroide cae en el recuadro grueso;
+                # la clave evita duplicados cuando dos ventanas se superponen
+                for fine_contour, (cX, cY) in fine:
+                    cX, cY = cX + x0, cY + y0
+                    if bx * scale - scale <= cX < (bx + bw + 1) * scale and \
+                            by * scale - scale <= cY < (by + bh + 1) * scale:
+                        key = tuple(fine_contour[0, 0] + (x0, y0))
+                        refined[key] = (fine_contour, (x0, y0))
+            if best is not None:
+                rows.append(_detection_row(color_id, *best))
+            for key in sorted(refined, key=lambda k: (-k[1], -k[0])):
+                fine_contour, offset = refined[key]
+                rows.append(_detection_row(color_id, fine_contour, offset))
+        return np.array(rows, dtype=DETECTION_DTYPE)
+
+    def blob_stats(self, frame, colors=None, min_area=MIN_CONTOUR_AREA):
+        """
+        Estadísticas de todos los blobs de 'colors' (por defecto los de detección
+        múltiple) sin trazar contornos: un arreglo DETECTION_DTYPE con una fila por
+        par (componente conexo, color), calculado con operaciones vectorizadas sobre
+        los píxeles etiquetados. El centroide es el promedio de los píxeles y el área
+        su cantidad, por lo que difieren levemente de los momentos del contorno de
+        detect_array (el polígono del contorno pasa por los centros de los píxeles del
+        borde). Se descartan los blobs con 'min_area' píxeles o menos. Las filas salen
+        por color y, dentro de cada color, en orden de barrido de su primer píxel.
+        """
+        if colors is None:
+            colors = [c for c in self.colors if c in self.multi_detection_colors]
+        lut = self._masked_lut(colors)
+
+        with stage("detect.convert"):
+            packed = _pack_bgr(frame)
+        with stage("detect.threshold"):
+            labels = lut.take(packed)
+        with stage("detect.components"):
+            n, components, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+                labels, 8, cv2.CV_32S, cv2.CCL_GRANA)
+        if n <= 1:
+            return np.zeros(0, dtype=DETECTION_DTYPE)
+
+        with stage("detect.blob_stats"):
+            if len(colors) == 1:
+                # Con un solo color cada componente es un blob: alcanzan las estadísticas de OpenCV
+                comp = np.arange(1, n)
+                color_id = np.full(n - 1, self.colors.index(colors[0]), dtype=np.int16)
+                area = stats[1:, cv2.CC_STAT_AREA].astype(np.float64)
+                x, y = centroids[1:, 0], centroids[1:, 1]
+                bbox = stats[1:, :4]
+            else:
+                # Componentes que pueden mezclar colores que se tocan: sumas por par
+                # (componente, color) sobre los píxeles etiquetados
+                foreground = cv2.findNonZero(labels).reshape(-1, 2)
+                xs, ys = foreground[:, 0], foreground[:, 1]
+                num_labels = len(self.colors) + 1
+                pairs = components[ys, xs].astype(np.int64) * num_labels + labels[ys, xs]
+                size = n * num_labels
+                counts = np.bincount(pairs, minlength=size)
+                keys = np.flatnonzero(counts)
+                area = counts[keys].astype(np.float64)
+                x = np.bincount(pairs, weights=xs, minlength=size)[keys] / area
+                y = np.bincount(pairs, weights=ys, minlength=size)[keys] / area
+                comp, color_id = keys // num_labels, (keys % num_labels - 1).astype(np.int16)
+                bbox = stats[comp, :4]
+                mixed = np.bincount(comp, minlength=n) > 1
+                if mixed.any():
+                    # Recuadro propio de cada color dentro de los componentes mezclados
+                    for k in np.flatnonzero(mixed[comp]):
+                        sel = pairs == keys[k]
+                        bx, by = xs[sel].min(), ys[sel].min()
+                        bbox[k] = (bx, by, xs[sel].max() - bx + 1, ys[sel].max() - by + 1)
+
+            keep = area > min_area
+            count("detect.blobs_rejected_area", int((~keep).sum()))
+            result = np.zeros(int(keep.sum()), dtype=DETECTION_DTYPE)
+            result["color_id"] = color_id[keep]
+            result["x"] = x[keep]
+            result["y"] = y[keep]
+            result["area"] = area[keep]
+            result["bbox_x"] = bbox[keep, 0]
+            result["bbox_y"] = bbox[keep, 1]
+            result["bbox_w"] = bbox[keep, 2]
+            result["bbox_h"] = bbox[keep, 3]
+            # Por color y, dentro de cada color, por componente (orden de barrido)
+            result = result[np.lexsort((comp[keep], result["color_id"]))]
+        return result
+
+    def _masked_lut(self, colors):
+        """
+        Tabla de etiquetas en la que solo 'colors' conservan su etiqueta (el resto
+        queda como fondo), construida una vez por conjunto de colores.
+        """
+        key = tuple(sorted(colors))
+        if key not in self._masked_luts:
+            wanted = np.zeros(len(self.colors) + 1, dtype=bool)
+            for color in colors:
+                wanted[self.colors.index(color) + 1] = True
+            self._masked_luts[key] = np.where(wanted[self.lut], self.lut, 0).astype(np.uint8)
+        return self._masked_luts[key]
+
+    def detect_blobs(self, frame, colors=None, min_area=MIN_CONTOUR_AREA, all_blobs=False):
+        """
+        Igual que detect, pero cada detección es un par (contorno, centroide) para
+        quien necesite la forma del blob además de su posición. 'min_area' es el
+        umbral de área para los colores con múltiples detecciones; con 'all_blobs'
+        todos los colores se tratan como de detección múltiple.
+        Las métricas por frame no se cuentan aquí (ver count_frame).
+        """
+        with stage("detect.convert"):
+            packed = _pack_bgr(frame)
+        with stage("detect.threshold"):
+            labels = self.lut.take(packed)
+        with stage("detect.components"):
+            n, components, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+                labels, 8, cv2.CV_32S, cv2.CCL_GRANA)
+            if n > 1:
+                # Cantidad de píxeles de cada color dentro de cada componente
+                num_labels = len(self.colors) + 1
+                foreground = cv2.findNonZero(labels).reshape(-1, 2)
+                rows, cols = foreground[:, 1], foreground[:, 0]
+                pairs = components[rows, cols] * num_labels + labels[rows, cols]
+                color_counts = np.bincount(pairs, minlength=n * num_labels).reshape(n, num_labels)
+        if n <= 1:
+            return {}
+
+        with stage("detect.contours"):
+            return self._select_blobs(labels, components, stats, color_counts,
+                                      colors, min_area, all_blobs)
+
+    def count_frame(self, detected_colors, colors=None):
+        """
+        Registra en las métricas una detección completa: un 'detect.frames' y un
+        'detect.missed.<color>' por cada color buscado que no está en el resultado
+        final 'detected_colors'. La llaman los puntos de entrada (detect_points,
+        MarkerTracker.update, BlobTracker.update...) una vez por frame, no las
+        búsquedas internas por ventana o por nivel de la pirámide.
+        """
+        count("detect.frames")
+        for color in self.colors:
+            if (colors is None or color in colors) and color not in detected_colors:
+                count(f"detect.missed.{color}")
+
+    def _select_blobs(self, labels, components, stats, color_counts, colors, min_area, all_blobs):
+        """
+        Elige los contornos de cada color a partir de los componentes conexos,
+        con las mismas reglas que el bucle original por color.
+        """
+        # Cota superior del área de contorno: el polígono pasa por centros de píxel
+        widths = stats[:, cv2.CC_STAT_WIDTH]
+        heights = stats[:, cv2.CC_STAT_HEIGHT]
+        area_bound = (widths - 1) * (heights - 1)
+
+        detected_points = {}
+        for label, color in enumerate(self.colors, start=1):
+            if colors is not None and color not in colors:
+                continue
+            candidates = np.flatnonzero(color_counts[1:, label]) + 1
+            if candidates.size == 0:
+                continue
+
+            if all_blobs or color in self.multi_detection_colors:
+                found = []
+                passing = candidates[area_bound[candidates] > min_area]
+                count("detect.blobs_rejected_area", candidates.size - passing.size)
+                for comp in passing:
+                    for cnt in self._component_contours(labels, components, stats, comp, label):
+                        if cv2.contourArea(cnt) <= min_area:
+                            count("detect.blobs_rejected_area")
+                        else:
+                            point = _centroid(cnt)
+                            if point is not None:
+                                found.append((_scan_order(cnt), cnt, point))
+                if found:
+                    found.sort(key=lambda item: item[0])
+                    detected_points[color] = [(cnt, point) for _, cnt, point in found]
+            else:
+                # Se evalúan los componentes de mayor a menor cota hasta que
+                # ninguno restante pueda superar al mejor contorno encontrado.
+                # En caso de empate gana el primero en el orden de findContours,
+                # igual que max(contours, key=cv2.contourArea).
+                order = candidates[np.argsort(-area_bound[candidates], kind="stable")]
+                best, best_area, best_rank = None, -1.0, None
+                for comp in order:
+                    bound = area_bound[comp]
+                    if bound < best_area or (bound == 0 and best is not None):
+                        break
+                    for cnt in self._component_contours(labels, components, stats, comp, label):
+                        area = cv2.contourArea(cnt)
+                        rank = _scan_order(cnt)
+                        if area > best_area or (area == best_area and rank < best_rank):
+                            best, best_area, best_rank = cnt, area, rank
+                if best is not None:
+                    point = _centroid(best)
+                    if point is not None:
+                        detected_points[color] = (best, point)
+        return detected_points
+
+    @staticmethod
+    def _component_contours(labels, components, stats, comp, label):
+        """
+        Traza los contornos externos del color 'label' dentro del componente 'comp',
+        trabajando solo sobre su recuadro (con un píxel de margen) y devolviendo
+        los puntos en coordenadas del frame completo.
+        """
+        x = stats[comp, cv2.CC_STAT_LEFT]
+        y = stats[comp, cv2.CC_STAT_TOP]
+        w = stats[comp, cv2.CC_STAT_WIDTH]
+        h = stats[comp, cv2.CC_STAT_HEIGHT]
+        mask = np.zeros((h + 2, w + 2), dtype=np.uint8)
+        inside = components[y:y + h, x:x + w] == comp
+        crop_labels = labels[y:y + h, x:x + w][inside]
+        if crop_labels.min() != label or crop_labels.max() != label:
+            # Componente con píxeles de varios colores que se tocan
+            inside &= labels[y:y + h, x:x + w] == label
+        mask[1:-1, 1:-1][inside] = 255
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                       offset=(int(x) - 1, int(y) - 1))
+        return contours
+
+
+def _detection_row(color_id, contour, offset=(0, 0)):
+    """
+    Fila de DETECTION_DTYPE para un contorno; 'offset' lleva las coordenadas de un
+    recorte a las del frame completo.
+    """
+    M = cv2.moments(contour)
+    bx, by, bw, bh = cv2.boundingRect(contour)
+    return (color_id, M["m10"] / M["m00"] + offset[0], M["m01"] / M["m00"] + offset[1],
+            cv2.contourArea(contour), bx + offset[0], by + offset[1], bw, bh)
+
+
+def _scan_order(contour):
+    """
+    Clave de orden equivalente al de cv2.findContours sobre el frame completo:
+    los contornos salen en orden de barrido inverso de su primer punto.
+    """
+    x, y = contour[0, 0]
+    return (-int(y), -int(x))
+
+
+def _centroid(contour):
+    """
+    Centroide entero (truncado) de un contorno, o None si su área es nula.
+    """
+    M = cv2.moments(contour)
+    if M["m00"] == 0:
+        return None
+    return (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+
+
+def _config_key(color_ranges, multi_detection_colors):
+    ranges_key = tuple((color, tuple((tuple(lower), tuple(upper)) for (lower, upper) in ranges))
+                       for color, ranges in color_ranges.items())
+    return ranges_key, tuple(multi_detection_colors or ())
+
+
+@lru_cache(maxsize=8)
+def _cached_labeler(key):
+    ranges_key, multi_key = key
+    color_ranges = {color: list(ranges) for color, ranges in ranges_key}
+    return ColorLabeler(color_ranges, list(multi_key))
+
+
+def get_labeler(color_ranges, multi_detection_colors=None):
+    """
+    Devuelve un ColorLabeler para la configuración dada, reutilizando la tabla
+    de búsqueda si ya se construyó para los mismos rangos.
+    """
+    return _cached_labeler(_config_key(color_ranges, multi_detection_colors))
+
+
+def detect_markers(frame, color_ranges, multi_detection_colors=None, colors=None):
+    """
+    Detección sin efectos secundarios: no modifica el frame ni dibuja nada.
+    Devuelve un arreglo estructurado DETECTION_DTYPE (ver ColorLabeler.detect_array).
+    """
+    labeler = get_labeler(color_ranges, multi_detection_colors)
+    detections = labeler.detect_array(frame, colors)
+    labeler.count_frame({labeler.colors[c] for c in detections["color_id"]}, colors)
+    return detections
+
+
+def detect_color_points(frame, color_ranges, multi_detection_colors=None):
+    """
+    Detecta los puntos de color en la imagen y devuelve un diccionario.
+    Para los colores listados en multi_detection_colors se retornará una lista
+    de centroides; para el resto se retorna un único punto (el de mayor área).
+    Además, se dibuja el punto y se etiqueta el color.
+    """
+    labeler = get_labeler(color_ranges, multi_detection_colors)
+    detected_points = labeler.detect(frame)
+    labeler.count_frame(detected_points)
+    draw_points(frame, detected_points)
+    return detected_points, frame
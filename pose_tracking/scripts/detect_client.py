@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+
+# Cliente liviano de detection_daemon.py: solo usa la biblioteca estándar, así que
+# no paga la importación de cv2/NumPy ni la construcción de la tabla de colores.
+DEFAULT_SOCKET = "/tmp/pose_tracking_detect.sock"
+
+# Pedidos enviados sin respuesta como máximo (el servicio además aplica su propio límite)
+WINDOW = 32
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def connect(socket_path=DEFAULT_SOCKET, port=None, start=False, timeout=30.0):
+    """
+    Conecta con el servicio. Con 'start', si no está corriendo se lo lanza en segundo
+    plano y se espera hasta 'timeout' segundos a que acepte conexiones.
+    """
+    def intentar():
+        if port is not None:
+            return socket.create_connection(("127.0.0.1", port))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    try:
+        return intentar()
+    except OSError:
+        if not start:
+            raise
+    command = [sys.executable, os.path.join(SCRIPT_DIR, "detection_daemon.py")]
+    command += ["--port", str(port)] if port is not None else ["--socket", socket_path]
+    subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    limite = time.monotonic() + timeout
+    while True:
+        try:
+            return intentar()
+        except OSError:
+            if time.monotonic() > limite:
+                raise
+            time.sleep(0.1)
+
+def request_all(sock, requests, on_partial=None):
+    """
+    Envía los pedidos ((dict, bytes o None)) manteniendo hasta WINDOW sin respuesta
+    y devuelve las respuestas finales en el orden de los pedidos. Las respuestas
+    parciales (las muestras de un video) se pasan a on_partial(i, respuesta) a medida
+    que llegan; sin on_partial se juntan en la lista "samples" de la respuesta final.
+    """
+    window = threading.Semaphore(WINDOW)
+    stream = sock.makefile("rb")
+    errors = []
+
+    def enviar():
+        try:
+            for i, (request, data) in enumerate(requests):
+                window.acquire()
+                request = dict(request, id=i)
+                if data is not None:
+                    request["bytes"] = len(data)
+                sock.sendall(json.dumps(request).encode() + b"\n" + (data or b""))
+        except OSError as e:
+            errors.append(e)
+
+    sender = threading.Thread(target=enviar, daemon=True)
+    sender.start()
+    responses = [None] * len(requests)
+    partials = {}
+    pending = len(requests)
+    while pending:
+        line = stream.readline()
+        if not line:
+            raise ConnectionError("El servicio cerró la conexión.")
+        response = json.loads(line)
+        if response.get("id") is None:
+            raise ConnectionError(response.get("error", "Respuesta inválida del servicio."))
+        i = response["id"]
+        if response.get("partial"):
+            if on_partial is not None:
+                on_partial(i, response)
+            else:
+                partials.setdefault(i, []).append(response["sample"])
+            continue
+        if i in partials:
+            response["samples"] = partials.pop(i)
+        responses[i] = response
+        pending -= 1
+        window.release()
+    sender.join()
+    if errors:
+        raise errors[0]
+    return responses
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pedir detecciones al servicio local (detection_daemon.py).")
+    parser.add_argument("op", choices=["image", "frame", "video", "ping", "stats"],
+                        help="image: rutas de imágenes; frame: se envía el contenido del archivo; video: rutas de videos.")
+    parser.add_argument("paths", nargs="*", help="Archivos a procesar.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Socket Unix del servicio (por defecto {DEFAULT_SOCKET}).")
+    parser.add_argument("--port", type=int, default=None, help="Conectar a 127.0.0.1:PUERTO en lugar del socket Unix.")
+    parser.add_argument("--start", action="store_true", help="Iniciar el servicio si no está corriendo.")
+    parser.add_argument("--reduced", type=int, choices=[1, 2, 4, 8], default=1,
+                        help="Decodificar las imágenes a 1/N de su resolución.")
+    parser.add_argument("--pyramid", type=int, choices=[1, 2, 4], default=1,
+                        help="Detectar sobre el frame reducido por N y refinar a resolución completa.")
+    parser.add_argument("--step", type=int, default=1, help="Videos: procesar uno de cada N frames.")
+    parser.add_argument("--output", default=None,
+                        help="Videos: guardar la trayectoria en este archivo (.csv o .ptrj) en lugar de devolverla.")
+    parser.add_argument("--json", action="store_true", help="Mostrar las respuestas completas en JSON.")
+    args = parser.parse_args()
+
+    if args.op in ("ping", "stats"):
+        requests = [({"op": args.op}, None)]
+    elif args.op == "frame":
+        requests = []
+        for path in args.paths:
+            with open(path, "rb") as f:
+                requests.append(({"op": "frame", "pyramid": args.pyramid}, f.read()))
+    elif args.op == "image":
+        requests = [({"op": "image", "path": os.path.abspath(p), "reduced": args.reduced, "pyramid": args.pyramid}, None)
+                    for p in args.paths]
+    else:
+        if args.output and len(args.paths) > 1:
+            print("--output admite un solo video.")
+            sys.exit(1)
+        requests = [({"op": "video", "path": os.path.abspath(p), "step": args.step, "pyramid": args.pyramid,
+                      "output": os.path.abspath(args.output) if args.output else None}, None)
+                    for p in args.paths]
+
+    try:
+        sock = connect(args.socket, args.port, args.start)
+    except OSError as e:
+        print(f"No se pudo conectar con el servicio de detección ({e}); iniciarlo con detection_daemon.py o usar --start.")
+        sys.exit(1)
+    names = args.paths or [args.op]
+
+    def mostrar_muestra(i, response):
+        frame_idx, t, pose = response["sample"]
+        print(f"{names[i]} frame {frame_idx}: PhysicalRed =", pose, flush=True)
+
+    with sock:
+        responses = request_all(sock, requests, mostrar_muestra if args.op == "video" and not args.json else None)
+
+    failed = 0
+    for name, response in zip(names, responses):
+        if not response["ok"]:
+            failed += 1
+            print(f"{name}: error: {response['error']}")
+        elif args.json or args.op in ("ping", "stats"):
+            response.pop("id", None)
+            print(json.dumps(response) if args.op != "ping" else "ok")
+        elif args.op == "video":
+            if "stats" in response:
+                print(f"{name}: {response['stats']['escritas']} de {response['stats']['muestras']} muestras guardadas")
+            else:
+                print(f"{name}: {response['count']} muestras")
+        else:
+            print(f"{name}: PhysicalRed =", response["physical"])
+    sys.exit(1 if failed else 0)
+
+# example : python3 detect_client.py image ../screenshots/dotted/captura_001_dotted.jpg --start
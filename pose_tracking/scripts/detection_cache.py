@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+# Cantidad máxima de resultados guardados; al superarla se descartan los usados hace más tiempo
+DEFAULT_MAX_ENTRIES = 100000
+
+# Cada cuántos resultados nuevos se confirman en disco (y se aplica el límite de entradas)
+COMMIT_EVERY = 256
+
+# Se incrementa cuando cambia la forma de calcular o guardar los resultados
+CACHE_VERSION = 1
+
+def file_digest(path):
+    """
+    sha256 (hex) del contenido del archivo.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def config_digest(*parts):
+    """
+    Hash (hex) de los parámetros de detección, por ejemplo la huella de
+    ColorLabeler.fingerprint más la reducción y la pirámide usadas.
+    """
+    return hashlib.sha256(json.dumps([CACHE_VERSION] + list(parts)).encode()).hexdigest()
+
+class DetectionCache:
+    """
+    Caché en disco (SQLite) de resultados de detección por imagen. La clave es el
+    hash del contenido del archivo más el hash de la configuración, de modo que una
+    imagen modificada o un cambio de umbrales que la afecte produce una clave nueva;
+    las entradas viejas dejan de usarse y se descartan por LRU al superar 'max_entries'
+    (se comprueba en cada confirmación, así que lo guardado en disco nunca lo supera).
+    Para no volver a leer archivos sin cambios, el hash de contenido se recuerda
+    junto con el tamaño y la fecha de modificación de cada ruta.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS results ("
+                        "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS files ("
+                        "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)")
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.pending = 0
+        self.entries = None  # cantidad de entradas al cerrar
+
+    def content_digest(self, path):
+        """
+        Hash del contenido de 'path', recalculado solo si cambió su tamaño o fecha.
+        """
+        st = os.stat(path)
+        row = self.db.execute("SELECT size, mtime_ns, digest FROM files WHERE path = ?",
+                              (path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        digest = file_digest(path)
+        self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                        (path, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def key(self, path, config):
+        """
+        Clave de la imagen 'path' con la configuración 'config' (ver config_digest),
+        o None si el archivo no se puede leer.
+        """
+        try:
+            return self.content_digest(path) + ":" + config
+        except OSError:
+            return None
+
+    def get(self, key):
+        """
+        Resultado guardado para 'key' (ya decodificado de JSON) y si hubo acierto.
+        """
+        row = None
+        if key is not None:
+            row = self.db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None, False
+        self.hits += 1
+        self.db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), True
+
+    def reuse(self):
+        """
+        Cuenta como acierto un resultado que se reutiliza dentro de la misma corrida
+        (la misma imagen repetida). Devuelve True.
+        """
+        self.hits += 1
+        return True
+
+    def put(self, key, value):
+        if key is None:
+            return
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                        (key, json.dumps(value), time.time()))
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.evict_results()
+            self.db.commit()
+            self.pending = 0
+
+    def evict_results(self):
+        """
+        Descarta los resultados usados hace más tiempo hasta quedar en max_entries.
+        """
+        total = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        excess = total - self.max_entries
+        if excess > 0:
+            self.db.execute("DELETE FROM results WHERE key IN "
+                            "(SELECT key FROM results ORDER BY last_used LIMIT ?)", (excess,))
+            self.evicted += excess
+
+    def evict(self):
+        """
+        Aplica el límite de entradas y olvida las rutas que ya no existen.
+        """
+        self.evict_results()
+        # Rutas que ya no existen
+        stale = [(p,) for (p,) in self.db.execute("SELECT path FROM files") if not os.path.exists(p)]
+        self.db.executemany("DELETE FROM files WHERE path = ?", stale)
+
+    def __len__(self):
+        if self.entries is not None:
+            return self.entries
+        return self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        total = self.hits + self.misses
+        return (f"Caché de detección: {self.hits} de {total} imágenes reutilizadas "
+                f"({self.hit_rate() * 100:.1f}%), {len(self)} entradas, {self.evicted} descartadas")
+
+    def close(self):
+        self.evict()
+        self.db.commit()
+        self.entries = len(self)
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import stat
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from queue import Empty
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from color_labeling import COLOR_RANGES, MULTI_DETECTION_COLORS, get_labeler
+from generate_routine import REDUCED_READ_FLAGS, read_image, detect_points, physical_red
+from video_to_trajectory import video_to_trajectory
+
+# Protocolo (igual por socket Unix o TCP local): cada pedido es una línea JSON con
+# un "id" elegido por el cliente y una operación "op":
+#   {"op": "image", "path": ..., "reduced": 1, "pyramid": 1}
+#   {"op": "frame", "bytes": N, "pyramid": 1}   seguida de N bytes de imagen codificada (JPEG, PNG...)
+#   {"op": "video", "path": ..., "step": 1, "pyramid": 1, "output": ... (opcional)}
+#   {"op": "ping"} / {"op": "stats"}
+# Cada respuesta es una línea JSON con el mismo "id", "ok" y, si falló, "error".
+# Las respuestas pueden llegar en otro orden que los pedidos. Un video sin "output"
+# se responde con una línea {"id", "ok", "partial": true, "sample": [frame, t, pose]}
+# por muestra, a medida que se detectan, y al final {"id", "ok", "count": N}.
+DEFAULT_SOCKET = "/tmp/pose_tracking_detect.sock"
+DEFAULT_PORT = 5006
+
+# Pedidos en curso admitidos entre todas las conexiones; al llegar al límite se
+# deja de leer de los sockets y los clientes quedan frenados por el control de flujo
+MAX_PENDING = 64
+
+# Tamaño máximo de una línea de pedido y de una imagen enviada en el pedido
+MAX_LINE = 1 << 16
+MAX_FRAME_BYTES = 64 << 20
+
+# Muestras de un video detectadas y aún no enviadas; con la cola llena el proceso
+# de detección espera a que el cliente las lea
+STREAM_QUEUE = 64
+
+def _init_worker():
+    """
+    Construye una sola vez por proceso la tabla de colores.
+    """
+    get_labeler(COLOR_RANGES, MULTI_DETECTION_COLORS)
+
+def _result(points):
+    return {"points": {color: list(p) for color, p in points.items()},
+            "physical": physical_red(points)}
+
+def detect_image(path, reduced=1, pyramid=1):
+    frame = read_image(path, reduced)
+    if frame is None:
+        raise IOError(f"No se pudo cargar la imagen: {path}")
+    return _result(detect_points(frame, COLOR_RANGES, MULTI_DETECTION_COLORS, pyramid, reduced))
+
+def detect_encoded(data, pyramid=1):
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("No se pudo decodificar la imagen recibida.")
+    return _result(detect_points(frame, COLOR_RANGES, MULTI_DETECTION_COLORS, pyramid))
+
+def detect_video(path, step=1, pyramid=1, output=None):
+    """
+    Escribe la trayectoria en 'output' (como video_to_trajectory) y devuelve sus
+    estadísticas.
+    """
+    return {"stats": video_to_trajectory(path, output, step, piramide=pyramid)}
+
+def stream_video(path, step, pyramid, queue):
+    """
+    Pone en 'queue' cada muestra [frame, t, [x, y, z] o None] del video a medida que
+    se detecta, y None al terminar (también si falla). Devuelve la cantidad de muestras.
+    """
+    count = 0
+    try:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise IOError(f"Error al abrir el video '{path}'.")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_idx = 0
+        try:
+            while cap.grab():
+                if frame_idx % step == 0:
+                    ret, frame = cap.retrieve()
+                    if ret:
+                        points = detect_points(frame, COLOR_RANGES, MULTI_DETECTION_COLORS, pyramid)
+                        queue.put([frame_idx, frame_idx / fps, physical_red(points, f"frame {frame_idx}")])
+                        count += 1
+                frame_idx += 1
+        finally:
+            cap.release()
+    finally:
+        queue.put(None)
+    return count
+
+def socket_in_use(path):
+    """
+    True si 'path' existe y no es un socket abandonado: es otro tipo de archivo o
+    hay un servicio que acepta conexiones en él.
+    """
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return True
+    except FileNotFoundError:
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+class DetectionServer:
+    """
+    Servicio asyncio que mantiene los procesos de detección ya iniciados (con cv2,
+    NumPy y la tabla de colores cargados) y les reparte los pedidos de los clientes.
+    Cada conexión puede enviar varios pedidos sin esperar las respuestas; el total
+    en curso se limita a 'max_pending'.
+    """
+
+    def __init__(self, workers=1, max_pending=MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pool = None
+        self.manager = None
+        self.slots = None
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.active = 0
+        self.busy_time = 0.0
+
+    def start(self):
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        # Fuerza el arranque de todos los procesos antes del primer pedido
+        for future in [self.pool.submit(_init_worker) for _ in range(self.workers)]:
+            future.result()
+        # Colas por las que los procesos envían las muestras de los videos
+        self.manager = multiprocessing.Manager()
+        self.slots = asyncio.Semaphore(self.max_pending)
+
+    def stats(self):
+        return {"workers": self.workers, "requests": self.requests, "errors": self.errors,
+                "active": self.active, "uptime": time.time() - self.started,
+                "busy_time": self.busy_time}
+
+    async def _stream(self, path, step, pyramid, emit):
+        """
+        Detecta el video en un proceso del pool y envía cada muestra con 'emit' a
+        medida que llega; la cola acotada frena al proceso si el cliente lee lento.
+        """
+        loop = asyncio.get_running_loop()
+        queue = self.manager.Queue(STREAM_QUEUE)
+        future = loop.run_in_executor(self.pool, stream_video, path, step, pyramid, queue)
+        while True:
+            try:
+                sample = await loop.run_in_executor(None, queue.get, True, 1.0)
+            except Empty:
+                if future.done():  # el proceso terminó sin poner el final (se cayó)
+                    break
+                continue
+            if sample is None:
+                break
+            await emit({"partial": True, "sample": sample})
+        return {"count": await future}
+
+    async def _run(self, request, data, emit):
+        op = request.get("op")
+        if op == "ping":
+            return {}
+        if op == "stats":
+            return self.stats()
+        pyramid = int(request.get("pyramid", 1))
+        if pyramid not in (1, 2, 4):
+            raise ValueError("pyramid debe ser 1, 2 o 4.")
+        if op == "image":
+            reduced = int(request.get("reduced", 1))
+            if reduced != 1 and reduced not in REDUCED_READ_FLAGS:
+                raise ValueError("reduced debe ser 1, 2, 4 u 8.")
+            call = (detect_image, os.path.abspath(request["path"]), reduced, pyramid)
+        elif op == "frame":
+            call = (detect_encoded, data, pyramid)
+        elif op == "video":
+            output = request.get("output")
+            path, step = os.path.abspath(request["path"]), max(1, int(request.get("step", 1)))
+            call = (detect_video, path, step, pyramid, os.path.abspath(output)) if output else None
+        else:
+            raise ValueError(f"Operación desconocida: {op}")
+        inicio = time.perf_counter()
+        try:
+            if call is None:
+                return await self._stream(path, step, pyramid, emit)
+            return await asyncio.get_running_loop().run_in_executor(self.pool, *call)
+        finally:
+            self.busy_time += time.perf_counter() - inicio
+
+    async def _answer(self, request, data, writer, lock):
+        closed = False
+
+        async def emit(response):
+            # Si el cliente se desconectó se sigue sin escribir, para que el proceso
+            # de detección termine el pedido en lugar de quedar esperando
+            nonlocal closed
+            if closed:
+                return
+            response["id"] = request.get("id")
+            response.setdefault("ok", True)
+            async with lock:
+                try:
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()
+                except ConnectionError:
+                    closed = True
+
+        try:
+            response = await self._run(request, data, emit)
+            response["ok"] = True
+        except Exception as e:
+            self.errors += 1
+            response = {"ok": False, "error": str(e) or repr(e)}
+        finally:
+            self.active -= 1
+            self.slots.release()
+        await emit(response)
+
+    async def handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                # Sin lugar libre no se lee el siguiente pedido (contrapresión)
+                await self.slots.acquire()
+                # El lugar pasa a _answer solo si el pedido se encola; en cualquier
+                # otro caso (fin, pedido inválido, error inesperado) se libera acá
+                queued = False
+                try:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("el pedido debe ser un objeto JSON.")
+                    data = None
+                    size = int(request.get("bytes") or 0)
+                    if size > MAX_FRAME_BYTES:
+                        raise ValueError(f"Imagen demasiado grande ({size} bytes).")
+                    if size > 0:
+                        data = await reader.readexactly(size)
+                    queued = True
+                except (ValueError, TypeError, asyncio.LimitOverrunError, asyncio.IncompleteReadError) as e:
+                    self.errors += 1
+                    async with lock:
+                        writer.write(json.dumps({"id": None, "ok": False, "error": f"Pedido inválido: {e}"})
+                                     .encode() + b"\n")
+                    break
+                except ConnectionError:
+                    break
+                finally:
+                    if not queued:
+                        self.slots.release()
+                self.requests += 1
+                self.active += 1
+                task = asyncio.create_task(self._answer(request, data, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=None, host="127.0.0.1", port=None):
+        """
+        Atiende pedidos hasta recibir SIGTERM o Ctrl-C. Devuelve False sin iniciar
+        nada si el socket o el puerto ya están en uso.
+        """
+        if port is None:
+            if socket_in_use(socket_path):
+                print(f"Ya hay un servicio (u otro archivo) en {socket_path}; no se inicia otro.")
+                return False
+            if os.path.exists(socket_path):
+                os.remove(socket_path)  # socket de un servicio que terminó sin borrarlo
+        self.start()
+        try:
+            if port is not None:
+                server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+                address = f"{host}:{port}"
+            else:
+                server = await asyncio.start_unix_server(self.handle, socket_path, limit=MAX_LINE)
+                address = socket_path
+        except OSError as e:
+            print(f"No se pudo escuchar en {socket_path if port is None else f'{host}:{port}'} ({e}).")
+            self.pool.shutdown()
+            self.manager.shutdown()
+            return False
+        print(f"Servicio de detección escuchando en {address} ({self.workers} procesos)", flush=True)
+        # SIGTERM detiene el servicio igual que Ctrl-C (se borra el socket)
+        serving = asyncio.ensure_future(server.serve_forever())
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+        try:
+            async with server:
+                await serving
+        except asyncio.CancelledError:
+            print("Servicio detenido.")
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            self.manager.shutdown()
+            if port is None and os.path.exists(socket_path):
+                os.remove(socket_path)
+        return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio local de detección con los procesos ya iniciados (ver detect_client.py).")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Socket Unix donde escuchar (por defecto {DEFAULT_SOCKET}).")
+    parser.add_argument("--port", type=int, default=None,
+                        help=f"Escuchar en 127.0.0.1:PUERTO en lugar del socket Unix (por ejemplo {DEFAULT_PORT}).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Cantidad de procesos de detección.")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING,
+                        help="Pedidos en curso admitidos antes de dejar de leer de los clientes.")
+    args = parser.parse_args()
+
+    server = DetectionServer(max(1, args.workers), max(1, args.max_pending))
+    try:
+        if not asyncio.run(server.serve(args.socket, port=args.port)):
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("Servicio detenido.")
+
+# example : python3 detection_daemon.py --workers 4
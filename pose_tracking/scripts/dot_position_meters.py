@@ -1,63 +1,7 @@
 import cv2
-import numpy as np
 
-def detect_color_points(frame, color_ranges, multi_detection_colors=None):
-    """
-    Detecta los puntos de color en la imagen y devuelve un diccionario.
-    Para los colores listados en multi_detection_colors se retornará una lista
-    de centroides; para el resto se retorna un único punto (el de mayor área).
-    Además, se dibuja el punto y se etiqueta el color.
-    """
-    if multi_detection_colors is None:
-        multi_detection_colors = []
-    
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    detected_points = {}
-    
-    for color, ranges in color_ranges.items():
-        mask = None
-        # Combina todos los rangos para ese color (por ejemplo, el rojo usa 2 rangos)
-        for (lower, upper) in ranges:
-            lower = np.array(lower, dtype=np.uint8)
-            upper = np.array(upper, dtype=np.uint8)
-            current_mask = cv2.inRange(hsv, lower, upper)
-            if mask is None:
-                mask = current_mask
-            else:
-                mask = cv2.bitwise_or(mask, current_mask)
-        
-        # Encontrar contornos en la máscara
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Si el color debe tener múltiples detecciones, se procesan todos los contornos
-        if color in multi_detection_colors:
-            points = []
-            for cnt in contours:
-                if cv2.contourArea(cnt) > 10:  # Umbral para evitar falsos positivos (ajustable)
-                    M = cv2.moments(cnt)
-                    if M["m00"] != 0:
-                        cX = int(M["m10"] / M["m00"])
-                        cY = int(M["m01"] / M["m00"])
-                        points.append((cX, cY))
-                        # Dibujar el punto y etiquetar con el nombre del color
-                        cv2.circle(frame, (cX, cY), 5, (255, 255, 255), -1)
-                        cv2.putText(frame, color, (cX + 5, cY + 5),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-            if points:
-                detected_points[color] = points
-        else:
-            # Para otros colores se toma el contorno de mayor área
-            if contours:
-                c = max(contours, key=cv2.contourArea)
-                M = cv2.moments(c)
-                if M["m00"] != 0:
-                    cX = int(M["m10"] / M["m00"])
-                    cY = int(M["m01"] / M["m00"])
-                    detected_points[color] = (cX, cY)
-                    cv2.circle(frame, (cX, cY), 5, (255, 255, 255), -1)
-                    cv2.putText(frame, color, (cX + 5, cY + 5),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-    return detected_points, frame
+from color_labeling import detect_color_points
+from marker_render import draw_relative_positions, draw_physical
 
 def pixel_to_physical(pixel_coord):
     """
@@ -113,19 +57,7 @@ def main():
         print("No se detectó el punto verde de la base.")
     
     # Anotar en la imagen las posiciones relativas
-    for color, rel in relative_positions.items():
-        if isinstance(rel, list):
-            for idx, (dx, dy) in enumerate(rel):
-                (x, y) = detected_points[color][idx]
-                text = f"{color}:({dx},{dy})"
-                cv2.putText(annotated_frame, text, (x + 5, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-        else:
-            (dx, dy) = rel
-            (x, y) = detected_points[color]
-            text = f"{color}:({dx},{dy})"
-            cv2.putText(annotated_frame, text, (x + 5, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    draw_relative_positions(annotated_frame, detected_points, relative_positions)
     
     # Si se detectó el punto rojo, se calcula su posición física aproximada
     if "red" in relative_positions:
@@ -134,10 +66,7 @@ def main():
         red_physical = pixel_to_physical(red_rel)
         print("La posición física aproximada del punto rojo es:", red_physical)
         # Anotar en la imagen también la posición física
-        (rx, ry) = detected_points["red"]
-        text_phys = f"PhysRed:{red_physical}"
-        cv2.putText(annotated_frame, text_phys, (rx + 5, ry - 25),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+        draw_physical(annotated_frame, detected_points["red"], red_physical)
     else:
         print("No se detectó el punto rojo.")
     
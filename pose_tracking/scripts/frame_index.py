@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+import os
+import argparse
+import numpy as np
+
+import cv2
+
+from instrumentation import stage, count
+
+# Extensión del índice, junto al video: square_drawing.webm -> square_drawing.webm.fidx.npz
+INDEX_EXT = ".fidx.npz"
+
+# Se incrementa cuando cambia el contenido del índice
+INDEX_VERSION = 1
+
+# Costo aproximado de un salto a un keyframe, en frames decodificados: solo se salta
+# si el keyframe está más adelante que la posición actual por al menos esta cantidad
+SEEK_COST_FRAMES = 10
+
+class FrameIndex:
+    """
+    Índice de los frames de un video: cantidad exacta, timestamp de cada frame (ms)
+    y posiciones de los keyframes. Se construye una vez con build_index recorriendo
+    los paquetes del contenedor sin decodificarlos y se guarda junto al video.
+    """
+
+    def __init__(self, timestamps, keyframes, fps, size=0, mtime_ns=0):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)
+        self.fps = float(fps)
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def keyframe_before(self, frame_idx):
+        """
+        Último keyframe en o antes de 'frame_idx' (0 si no se conocen keyframes).
+        """
+        k = np.searchsorted(self.keyframes, frame_idx, side="right") - 1
+        return int(self.keyframes[k]) if k >= 0 else 0
+
+    def frame_at(self, msec):
+        """
+        Índice del frame cuyo timestamp es el más cercano a 'msec'.
+        """
+        i = int(np.searchsorted(self.timestamps, msec))
+        if i >= len(self.timestamps):
+            return len(self.timestamps) - 1
+        if i > 0 and msec - self.timestamps[i - 1] < self.timestamps[i] - msec:
+            return i - 1
+        return i
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez_compressed(f, version=INDEX_VERSION, timestamps=self.timestamps, keyframes=self.keyframes,
+                                fps=self.fps, size=self.size, mtime_ns=self.mtime_ns)
+
+def index_path(video_path):
+    return video_path + INDEX_EXT
+
+def build_index(video_path):
+    """
+    Recorre el video una vez y arma su FrameIndex. Con el backend FFmpeg se leen
+    los paquetes sin decodificar (CAP_PROP_FORMAT = -1), lo que además permite saber
+    cuáles son keyframes; si no está disponible se hace una pasada con grab() y se
+    toma el frame 0 como único keyframe. Devuelve None si el video no se puede abrir.
+    """
+    st = os.stat(video_path)
+    raw = True
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not cap.isOpened():
+        raw = False
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    timestamps = []
+    keyframes = []
+    with stage("index.scan"):
+        while cap.grab():
+            if raw and cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframes.append(len(timestamps))
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+    cap.release()
+    if not keyframes:
+        keyframes = [0]
+    return FrameIndex(timestamps, keyframes, fps, st.st_size, st.st_mtime_ns)
+
+def load_index(video_path):
+    """
+    Índice guardado del video, o None si no existe, es de otra versión o el video
+    cambió desde que se construyó (tamaño o fecha de modificación distintos).
+    """
+    path = index_path(video_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                return None
+            index = FrameIndex(data["timestamps"], data["keyframes"], float(data["fps"]),
+                               int(data["size"]), int(data["mtime_ns"]))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"No se pudo leer el índice '{path}' ({e}); se vuelve a construir.")
+        return None
+    st = os.stat(video_path)
+    if index.size != st.st_size or index.mtime_ns != st.st_mtime_ns:
+        return None
+    return index
+
+def get_index(video_path, rebuild=False):
+    """
+    Índice del video: el guardado si sigue vigente o uno nuevo (que se guarda junto
+    al video; si la carpeta no admite escritura solo se usa en memoria).
+    """
+    index = None if rebuild else load_index(video_path)
+    if index is not None:
+        count("index.loaded")
+        return index
+    index = build_index(video_path)
+    if index is None:
+        return None
+    count("index.built")
+    try:
+        index.save(index_path(video_path))
+    except OSError as e:
+        print(f"No se pudo guardar el índice de '{video_path}' ({e}).")
+    return index
+
+def leer_frames_indexados(cap, indices, index, seek_cost=SEEK_COST_FRAMES, contador=None):
+    """
+    Generador que entrega (i, frame_idx, frame) para los índices pedidos (ordenados
+    de forma ascendente) usando el índice del video: para cada frame se salta al
+    keyframe anterior si está más adelante que la posición actual y desde ahí se
+    avanza con grab() decodificando solo lo necesario. Después de cada salto se
+    comprueba con el timestamp en qué frame quedó realmente el decodificador, así
+    un seek impreciso no desplaza los índices. Los frames que no se pueden leer se
+    entregan como None. Si se pasa 'contador' (un dict), en contador["frames"] se
+    suman los frames decodificados.
+    """
+    if contador is None:
+        contador = {}
+    contador.setdefault("frames", 0)
+    actual = 0  # índice del próximo frame que entregará grab()
+    for i, frame_idx in enumerate(indices):
+        frame_idx = int(frame_idx)
+        if frame_idx >= len(index):
+            yield i, frame_idx, None
+            continue
+        keyframe = index.keyframe_before(frame_idx)
+        if keyframe > actual + seek_cost or frame_idx < actual:
+            with stage("video.seek"):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+                ret = cap.grab()
+            count("video.seeks")
+            if ret:
+                contador["frames"] += 1
+                # Frame en el que quedó realmente el decodificador
+                actual = index.frame_at(cap.get(cv2.CAP_PROP_POS_MSEC)) + 1
+                if actual - 1 > frame_idx:
+                    # El seek se pasó: se vuelve al principio y se avanza desde ahí
+                    count("video.seek_overshoot")
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    actual = 0
+        ret = True
+        while actual <= frame_idx:
+            with stage("video.grab"):
+                ret = cap.grab()
+            if not ret:
+                break
+            contador["frames"] += 1
+            actual += 1
+        if not ret:
+            yield i, frame_idx, None
+            continue
+        with stage("video.retrieve"):
+            ret, frame = cap.retrieve()
+        yield i, frame_idx, frame if ret else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construir el índice de frames (cantidad exacta, timestamps y keyframes) de uno o más videos.")
+    parser.add_argument("videos", nargs="+", help="Rutas a los videos.")
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruir aunque ya exista un índice vigente.")
+    args = parser.parse_args()
+
+    for video in args.videos:
+        index = get_index(video, args.rebuild)
+        if index is None:
+            print(f"Error al abrir el video '{video}'.")
+            continue
+        duracion = index.timestamps[-1] / 1000 if len(index) else 0.0
+        print(f"{video}: {len(index)} frames, {len(index.keyframes)} keyframes, {duracion:.2f} s -> {index_path(video)}")
+
+# example : python3 frame_index.py ../videos/square_drawing.webm
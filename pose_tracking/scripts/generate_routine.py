@@ -1,65 +1,24 @@
 import cv2
-import numpy as np
 import csv
 import os
+import argparse
+import multiprocessing
 
-def detect_color_points(frame, color_ranges, multi_detection_colors=None):
-    """
-    Detecta los puntos de color en la imagen y devuelve un diccionario.
-    Para los colores listados en multi_detection_colors se retornará una lista
-    de centroides; para el resto se retorna un único punto (el de mayor área).
-    Además, se dibuja el punto y se etiqueta el color.
-    """
-    if multi_detection_colors is None:
-        multi_detection_colors = []
-    
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    detected_points = {}
-    
-    for color, ranges in color_ranges.items():
-        mask = None
-        # Combina todos los rangos para ese color (por ejemplo, el rojo usa 2 rangos)
-        for (lower, upper) in ranges:
-            lower = np.array(lower, dtype=np.uint8)
-            upper = np.array(upper, dtype=np.uint8)
-            current_mask = cv2.inRange(hsv, lower, upper)
-            if mask is None:
-                mask = current_mask
-            else:
-                mask = cv2.bitwise_or(mask, current_mask)
-        
-        # Encontrar contornos en la máscara
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Si el color debe tener múltiples detecciones, se procesan todos los contornos
-        if color in multi_detection_colors:
-            points = []
-            for cnt in contours:
-                if cv2.contourArea(cnt) > 10:  # Umbral para evitar falsos positivos (ajustable)
-                    M = cv2.moments(cnt)
-                    if M["m00"] != 0:
-                        cX = int(M["m10"] / M["m00"])
-                        cY = int(M["m01"] / M["m00"])
-                        points.append((cX, cY))
-                        # Dibujar y etiquetar el punto
-                        cv2.circle(frame, (cX, cY), 5, (255, 255, 255), -1)
-                        cv2.putText(frame, color, (cX + 5, cY + 5),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-            if points:
-                detected_points[color] = points
-        else:
-            # Para otros colores se toma el contorno de mayor área
-            if contours:
-                c = max(contours, key=cv2.contourArea)
-                M = cv2.moments(c)
-                if M["m00"] != 0:
-                    cX = int(M["m10"] / M["m00"])
-                    cY = int(M["m01"] / M["m00"])
-                    detected_points[color] = (cX, cY)
-                    cv2.circle(frame, (cX, cY), 5, (255, 255, 255), -1)
-                    cv2.putText(frame, color, (cX + 5, cY + 5),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-    return detected_points, frame
+import instrumentation
+from color_labeling import get_labeler
+from instrumentation import stage, count
+from trajectory_store import open_trajectory_writer
+from detection_cache import DetectionCache, DEFAULT_MAX_ENTRIES, config_digest
+
+# Muestras por segundo con las que se guardan los tiempos en los archivos .ptrj
+# (el stepDelay de 500 ms con el que el sketch recorre la rutina)
+ROUTINE_RATE = 2.0
+
+# Nombre del archivo de la caché de detecciones (junto al CSV de salida)
+CACHE_FILE = "detection_cache.sqlite"
+
+# Marcadores necesarios para calcular la posición física del rojo
+DETECTED_COLORS = ["green", "red"]
 
 def pixel_to_physical(pixel_coord):
     """
@@ -75,26 +34,92 @@ def pixel_to_physical(pixel_coord):
     physical_x = 0
     return [physical_x, physical_y, physical_z]
 
-def process_image(image_path, color_ranges, multi_detection_colors):
+# Lecturas a resolución reducida que el decodificador JPEG hace sin costo extra
+REDUCED_READ_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def read_image(image_path, reduced=1):
+    """
+    Lee la imagen; con 'reduced' (2, 4 u 8) se decodifica directamente a esa
+    fracción de su tamaño. Devuelve None (e informa) si no se puede cargar.
+    """
+    with stage("image.imread"):
+        if reduced > 1:
+            frame = cv2.imread(image_path, REDUCED_READ_FLAGS[reduced])
+        else:
+            frame = cv2.imread(image_path)
+    if frame is None:
+        count("image.read_failed")
+        print("No se pudo cargar la imagen:", image_path)
+    return frame
+
+def process_image(image_path, color_ranges, multi_detection_colors, reduced=1, pyramid=1):
     """
     Lee la imagen en 'image_path', detecta los marcadores y calcula la posición física
     del punto rojo (PhysicalRed) a partir de la posición relativa respecto al punto verde.
+    Con 'reduced' (2, 4 u 8) la imagen se decodifica directamente a esa fracción de
+    su tamaño; 'pyramid' se pasa a process_frame.
     Devuelve la lista [x, y, z] o None si falla la detección.
     """
-    frame = cv2.imread(image_path)
+    frame = read_image(image_path, reduced)
     if frame is None:
-        print("No se pudo cargar la imagen:", image_path)
         return None
     
-    detected_points, _ = detect_color_points(frame, color_ranges, multi_detection_colors)
+    return process_frame(frame, color_ranges, multi_detection_colors, image_path,
+                         pyramid=pyramid, frame_scale=reduced)
+
+def process_frame(frame, color_ranges, multi_detection_colors, source="", pyramid=1, frame_scale=1):
+    """
+    Igual que process_image pero sobre un frame ya decodificado (por ejemplo,
+    leído directamente de un video). 'source' solo se usa en los mensajes.
+    Devuelve la lista [x, y, z] o None si falla la detección.
+    """
+    detected_points = detect_points(frame, color_ranges, multi_detection_colors, pyramid, frame_scale)
+    return physical_red(detected_points, source)
+
+def detect_points(frame, color_ranges, multi_detection_colors, pyramid=1, frame_scale=1):
+    """
+    Detecta solo los dos marcadores que intervienen en el cálculo (verde y rojo) y
+    devuelve {color: (x, y)} con los que se encontraron.
+    Con 'pyramid' > 1 se detecta de grueso a fino (ver ColorLabeler.detect_pyramid);
+    'frame_scale' indica que el frame está reducido por ese factor respecto al original.
+    En ambos casos se usan los centroides sub-píxel en lugar de truncarlos.
+    """
+    count("frames.processed")
+    labeler = get_labeler(color_ranges, multi_detection_colors)
+    # Detección sin dibujo y solo de los dos marcadores que intervienen en el cálculo
+    if pyramid > 1:
+        detections = labeler.detect_pyramid(frame, pyramid, DETECTED_COLORS)
+    else:
+        detections = labeler.detect_array(frame, DETECTED_COLORS)
     
+    if pyramid > 1 or frame_scale > 1:
+        # Centro del píxel reducido llevado a coordenadas de la imagen original
+        offset = (frame_scale - 1) / 2
+        detected_points = {labeler.colors[det["color_id"]]: (float(det["x"]) * frame_scale + offset,
+                                                             float(det["y"]) * frame_scale + offset)
+                           for det in detections}
+    else:
+        detected_points = {labeler.colors[det["color_id"]]: (int(det["x"]), int(det["y"]))
+                           for det in detections}
+    labeler.count_frame(detected_points, DETECTED_COLORS)
+    return detected_points
+
+def physical_red(detected_points, source=""):
+    """
+    Calcula la posición física del punto rojo a partir de los puntos detectados
+    (relativa al punto verde). Devuelve la lista [x, y, z] o None si falta alguno.
+    """
     if "green" not in detected_points:
-        print("No se detectó el punto verde en:", image_path)
+        print("No se detectó el punto verde en:", source)
         return None
     base = detected_points["green"]
     
     if "red" not in detected_points:
-        print("No se detectó el punto rojo en:", image_path)
+        print("No se detectó el punto rojo en:", source)
         return None
     red = detected_points["red"]
     # Calcula la posición relativa (en píxeles) del rojo respecto al verde
@@ -102,7 +127,43 @@ def process_image(image_path, color_ranges, multi_detection_colors):
     red_phys = pixel_to_physical(red_rel)
     return red_phys
 
-def main():
+def _init_worker(color_ranges, multi_detection_colors, metrics=False):
+    """
+    Inicializa cada proceso del pool construyendo una sola vez la tabla de colores.
+    """
+    if metrics:
+        instrumentation.enable()
+    get_labeler(color_ranges, multi_detection_colors)
+
+def _process_task(task):
+    """
+    Detecta los marcadores de una imagen (idx, path, color_ranges, multi_detection_colors,
+    reduced, pyramid) y devuelve (idx, {color: (x, y)} o None si no se pudo leer,
+    error o None, métricas o None). Las excepciones se capturan para que una imagen
+    defectuosa no detenga el lote.
+    """
+    idx, image_path, color_ranges, multi_detection_colors, reduced, pyramid = task
+    try:
+        frame = read_image(image_path, reduced)
+        if frame is None:
+            return idx, None, None, None
+        return idx, detect_points(frame, color_ranges, multi_detection_colors,
+                                  pyramid, reduced), None, None
+    except Exception as e:
+        return idx, None, repr(e), None
+
+def _process_task_in_worker(task):
+    """
+    _process_task para los procesos del pool: adjunta las métricas acumuladas en el
+    proceso desde la tarea anterior, para sumarlas en el proceso principal.
+    """
+    result = _process_task(task)
+    if instrumentation.enabled():
+        result = result[:3] + (instrumentation.snapshot(reset=True),)
+    return result
+
+def main(workers=1, chunksize=16, input_csv=None, output_csv=None, reduced=1, pyramid=1,
+         cache_path="", cache_size=DEFAULT_MAX_ENTRIES):
     # Define los rangos HSV para cada color
     color_ranges = {
         "red": [((0, 100, 100), (10, 255, 255)), ((170, 100, 100), (179, 255, 255))],  # ff0000
@@ -115,34 +176,111 @@ def main():
     multi_detection_colors = ["celeste"]
 
     # Archivo CSV de entrada (con columna "path")
-    input_csv = "/home/rovestrada/pose_track_ws/pose_tracking/utils/image_paths.csv"
+    if input_csv is None:
+        input_csv = "/home/rovestrada/pose_track_ws/pose_tracking/utils/image_paths.csv"
     # Archivo CSV de salida
-    output_csv = "/home/rovestrada/pose_track_ws/pose_tracking/utils/physical_red_results.csv"
+    if output_csv is None:
+        output_csv = "/home/rovestrada/pose_track_ws/pose_tracking/utils/physical_red_results.csv"
+    # Caché de detecciones: por defecto junto al archivo de salida ('None' la desactiva)
+    if cache_path == "":
+        cache_path = os.path.join(os.path.dirname(os.path.abspath(output_csv)), CACHE_FILE)
     
-    results = []  # Cada elemento: [point, x, y, z]
+    cache = None
+    config = None
+    if cache_path is not None:
+        cache = DetectionCache(cache_path, cache_size)
+        # La clave depende solo de lo que afecta a la detección del verde y el rojo
+        labeler = get_labeler(color_ranges, multi_detection_colors)
+        config = config_digest(labeler.fingerprint(DETECTED_COLORS), reduced, pyramid)
     
-    # Abrir el CSV de entrada y procesar cada imagen
-    with open(input_csv, newline='', encoding='utf-8') as csvfile:
+    # Abrir el CSV de entrada y procesar cada imagen; cada resultado se escribe
+    # en la salida (CSV, o .ptrj según la extensión) en cuanto está disponible,
+    # en el orden de entrada
+    with open(input_csv, newline='', encoding='utf-8') as csvfile, \
+         open_trajectory_writer(output_csv, ROUTINE_RATE) as writer:
         reader = csv.DictReader(csvfile)
+        # Si el path es relativo, se asume que es relativo al directorio actual.
+        # Las imágenes ya procesadas con la misma configuración se toman de la caché
+        # y solo el resto se envía a detectar.
+        # Una imagen repetida en la misma corrida se detecta una sola vez.
+        lookups = []
+        pending = set()
         for idx, row in enumerate(reader, start=1):
-            image_path = row["path"]
-            # Si el path es relativo, se asume que es relativo al directorio actual
-            image_path = os.path.normpath(image_path)
-            red_phys = process_image(image_path, color_ranges, multi_detection_colors)
-            if red_phys is not None:
-                results.append([idx, red_phys[0], red_phys[1], red_phys[2]])
-                print(f"Imagen {idx}: PhysicalRed =", red_phys)
-            else:
-                print(f"Imagen {idx}: No se pudo obtener la posición física del rojo.")
-    
-    # Escribir resultados en el CSV de salida
-    with open(output_csv, "w", newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["point", "x", "y", "z"])
-        for row in results:
-            writer.writerow(row)
+            path = os.path.normpath(row["path"])
+            key, points, hit = None, None, False
+            if cache is not None:
+                key = cache.key(path, config)
+                if key is not None and key in pending:
+                    hit = cache.reuse()
+                else:
+                    points, hit = cache.get(key)
+                    if not hit and key is not None:
+                        pending.add(key)
+            lookups.append((idx, path, key, points, hit))
+        computed = {}
+        tasks = ((idx, path, color_ranges, multi_detection_colors, reduced, pyramid)
+                 for idx, path, key, points, hit in lookups if not hit)
+        
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                        initargs=(color_ranges, multi_detection_colors,
+                                                  instrumentation.enabled()))
+            outputs = pool.imap(_process_task_in_worker, tasks, chunksize=chunksize)
+        else:
+            pool = None
+            outputs = map(_process_task, tasks)
+        
+        try:
+            for idx, path, key, points, hit in lookups:
+                error = None
+                if not hit:
+                    _, points, error, metrics = next(outputs)
+                    instrumentation.merge(metrics)
+                    if cache is not None and points is not None:
+                        cache.put(key, points)
+                        computed[key] = points
+                elif points is None:
+                    points = computed.get(key)
+                red_phys = physical_red(points, path) if points is not None else None
+                with stage("csv.write"):
+                    writer.append(idx, (idx - 1) / ROUTINE_RATE, red_phys)
+                if red_phys is not None:
+                    print(f"Imagen {idx}: PhysicalRed =", red_phys)
+                elif error is not None:
+                    print(f"Imagen {idx}: Error al procesar la imagen: {error}")
+                else:
+                    print(f"Imagen {idx}: No se pudo obtener la posición física del rojo.")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            if cache is not None:
+                cache.close()
     
+    if cache is not None:
+        print(cache.report())
     print("Proceso completado. Resultados guardados en", output_csv)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Calcular la posición física del punto rojo para una lista de imágenes.")
+    parser.add_argument("--input", default=None, help="CSV de entrada con columna 'path'.")
+    parser.add_argument("--output", default=None, help="CSV de salida (point,x,y,z) o archivo .ptrj.")
+    parser.add_argument("--workers", type=int, default=1, help="Cantidad de procesos en paralelo.")
+    parser.add_argument("--chunksize", type=int, default=16, help="Imágenes enviadas a cada proceso por tanda.")
+    parser.add_argument("--reduced", type=int, choices=[1] + sorted(REDUCED_READ_FLAGS), default=1,
+                        help="Decodificar las imágenes a 1/N de su resolución.")
+    parser.add_argument("--pyramid", type=int, choices=[1, 2, 4], default=1,
+                        help="Detectar sobre el frame reducido por N y refinar a resolución completa.")
+    parser.add_argument("--cache", default="", metavar="ARCHIVO",
+                        help=f"Caché de detecciones (por defecto {CACHE_FILE} junto a la salida).")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de detecciones.")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Cantidad máxima de resultados en la caché.")
+    parser.add_argument("--metrics", default=None, metavar="ARCHIVO",
+                        help="Medir latencias por etapa y guardarlas en ARCHIVO (.json o .prom).")
+    args = parser.parse_args()
+    
+    if args.metrics:
+        instrumentation.enable(args.metrics)
+    main(args.workers, args.chunksize, args.input, args.output, args.reduced, args.pyramid,
+         None if args.no_cache else args.cache, args.cache_size)
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+# Límites superiores (en segundos) de los buckets de los histogramas de latencia
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+# Variables de entorno para activar la instrumentación sin tocar el código
+ENV_ENABLE = "POSE_METRICS"
+ENV_OUTPUT = "POSE_METRICS_FILE"
+
+_enabled = False
+_output = None
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_atexit_registered = False
+
+
+class _NullStage:
+    """
+    Contexto vacío que se devuelve cuando la instrumentación está desactivada.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def enabled():
+    return _enabled
+
+
+def enable(output=None):
+    """
+    Activa la instrumentación. Al terminar el proceso se imprime una tabla resumen
+    y, si se indica 'output', se escriben las métricas en ese archivo: en formato de
+    texto de Prometheus si termina en .prom, en JSON en cualquier otro caso.
+    """
+    global _enabled, _output, _atexit_registered
+    _enabled = True
+    if output is not None:
+        _output = output
+    if not _atexit_registered:
+        atexit.register(_dump_at_exit)
+        _atexit_registered = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def stage(name):
+    """
+    Contexto que mide la latencia de una etapa: 'with stage("detect.label"): ...'.
+    Si la instrumentación está desactivada devuelve un contexto vacío compartido.
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def observe(name, seconds):
+    """
+    Registra una latencia (en segundos) en el histograma 'name'.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = {"buckets": [0] * len(BUCKETS), "count": 0,
+                                        "sum": 0.0, "min": float("inf"), "max": 0.0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist["buckets"][i] += 1
+                break
+        hist["count"] += 1
+        hist["sum"] += seconds
+        hist["min"] = min(hist["min"], seconds)
+        hist["max"] = max(hist["max"], seconds)
+
+
+def count(name, value=1):
+    """
+    Incrementa el contador 'name'.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot(reset=False):
+    """
+    Copia serializable de las métricas actuales. Con 'reset' se vacían, lo que
+    permite enviar a otro proceso solo lo acumulado desde la última vez.
+    """
+    global _histograms, _counters
+    with _lock:
+        data = {
+            "histograms": {name: dict(h, buckets=list(h["buckets"])) for name, h in _histograms.items()},
+            "counters": dict(_counters),
+        }
+        if reset:
+            _histograms = {}
+            _counters = {}
+    return data
+
+
+def merge(data):
+    """
+    Suma a las métricas locales un snapshot tomado en otro proceso.
+    """
+    if not _enabled or not data:
+        return
+    with _lock:
+        for name, value in data["counters"].items():
+            _counters[name] = _counters.get(name, 0) + value
+        for name, other in data["histograms"].items():
+            hist = _histograms.get(name)
+            if hist is None:
+                _histograms[name] = dict(other, buckets=list(other["buckets"]))
+                continue
+            hist["buckets"] = [a + b for a, b in zip(hist["buckets"], other["buckets"])]
+            hist["count"] += other["count"]
+            hist["sum"] += other["sum"]
+            hist["min"] = min(hist["min"], other["min"])
+            hist["max"] = max(hist["max"], other["max"])
+
+
+def _percentile(hist, q):
+    """
+    Percentil aproximado: límite superior del bucket que lo contiene.
+    """
+    target = q * hist["count"]
+    seen = 0
+    for bound, n in zip(BUCKETS, hist["buckets"]):
+        seen += n
+        if seen >= target:
+            return min(bound, hist["max"])
+    return hist["max"]
+
+
+def summary_table(data=None):
+    """
+    Tabla de texto con las latencias por etapa y los contadores.
+    """
+    if data is None:
+        data = snapshot()
+    lines = [f"{'etapa':32s} {'n':>8s} {'media ms':>10s} {'p50 ms':>10s} {'p99 ms':>10s} "
+             f"{'máx ms':>10s} {'total s':>9s}"]
+    for name in sorted(data["histograms"]):
+        h = data["histograms"][name]
+        mean = h["sum"] / h["count"] if h["count"] else 0.0
+        lines.append(f"{name:32s} {h['count']:8d} {mean * 1000:10.3f} {_percentile(h, 0.5) * 1000:10.3f} "
+                     f"{_percentile(h, 0.99) * 1000:10.3f} {h['max'] * 1000:10.3f} {h['sum']:9.3f}")
+    if data["counters"]:
+        lines.append("")
+        lines.append(f"{'contador':32s} {'valor':>8s}")
+        for name in sorted(data["counters"]):
+            lines.append(f"{name:32s} {data['counters'][name]:8d}")
+    return "\n".join(lines)
+
+
+def _metric_name(name):
+    return "pose_tracking_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def prometheus_text(data=None):
+    """
+    Métricas en el formato de texto de Prometheus (histogramas en segundos).
+    """
+    if data is None:
+        data = snapshot()
+    lines = []
+    for name in sorted(data["histograms"]):
+        h = data["histograms"][name]
+        metric = _metric_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS, h["buckets"]):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"{metric}_sum {h['sum']}")
+        lines.append(f"{metric}_count {h['count']}")
+    for name in sorted(data["counters"]):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {data['counters'][name]}")
+    return "\n".join(lines) + "\n"
+
+
+def write(path, data=None):
+    """
+    Escribe las métricas en 'path' (Prometheus si termina en .prom, JSON si no).
+    """
+    if data is None:
+        data = snapshot()
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".prom"):
+            f.write(prometheus_text(data))
+        else:
+            json.dump(dict(data, buckets=[b if b != float("inf") else "inf" for b in BUCKETS]), f, indent=2)
+
+
+def _dump_at_exit():
+    if not _enabled:
+        return
+    data = snapshot()
+    if not data["histograms"] and not data["counters"]:
+        return
+    print(summary_table(data), file=sys.stderr)
+    if _output:
+        write(_output, data)
+        print("Métricas guardadas en", _output, file=sys.stderr)
+
+
+if os.environ.get(ENV_ENABLE, "") not in ("", "0"):
+    enable(os.environ.get(ENV_OUTPUT) or None)
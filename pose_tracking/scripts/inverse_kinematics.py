@@ -0,0 +1,149 @@
+import os
+import time
+import argparse
+import numpy as np
+
+from trajectory_store import Trajectory, TrajectoryWriter, TRAJECTORY_EXT, KIND_JOINTS
+
+# Longitudes de los eslabones (las mismas que en pose_tracking.pde)
+F = 50.0
+T = 70.0
+
+# Parámetros con los que el sketch recorre la rutina
+STEP_DELAY = 0.5  # segundos entre muestras de un CSV, que no tiene tiempos (stepDelay del sketch)
+PLAYBACK_FPS = 60.0
+
+def solve_ik(positions, f=F, t=T):
+    """
+    Cinemática inversa de IK() en pose_tracking.pde para todas las posiciones a la vez.
+    'positions' es (N, 3) con columnas x, y, z. Devuelve (alpha, beta, gamma, reachable):
+    los ángulos en radianes y una máscara que indica qué posiciones están dentro del
+    espacio de trabajo. Fuera de él (o si la posición es NaN) los ángulos quedan en NaN,
+    que es lo que el sketch calcularía sin avisar.
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    X, Y, Z = positions[:, 0], positions[:, 1], positions[:, 2]
+
+    L2 = X * X + Y * Y
+    dia2 = L2 + Z * Z
+    dia = np.sqrt(dia2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cos_a = (t * t - f * f - dia2) / (-2 * f * dia)
+        cos_b = (dia2 - t * t - f * f) / (-2 * f * t)
+    # Comparaciones con NaN dan False, así que las posiciones inválidas quedan fuera
+    reachable = (np.abs(cos_a) <= 1) & (np.abs(cos_b) <= 1)
+    unreachable = ~reachable
+    cos_a[unreachable] = np.nan
+    cos_b[unreachable] = np.nan
+    alpha = np.pi / 2 - (np.arctan2(np.sqrt(L2), Z) + np.arccos(cos_a))
+    beta = np.arccos(cos_b) - np.pi
+    gamma = np.arctan2(Y, X)
+    gamma[unreachable] = np.nan
+    return alpha, beta, gamma, reachable
+
+def forward_kinematics(alpha, beta, gamma, f=F, t=T):
+    """
+    Inverso de solve_ik: posición (N, 3) del efector para los ángulos dados.
+    """
+    theta1 = np.pi / 2 - np.asarray(alpha, dtype=np.float64)  # primer eslabón, medido desde el eje Z
+    theta2 = theta1 + np.asarray(beta, dtype=np.float64)
+    L = f * np.sin(theta1) + t * np.sin(theta2)
+    Z = f * np.cos(theta1) + t * np.cos(theta2)
+    gamma = np.asarray(gamma, dtype=np.float64)
+    return np.stack([L * np.cos(gamma), L * np.sin(gamma), Z], axis=1)
+
+def resample_routine(positions, step_delay=STEP_DELAY, fps=PLAYBACK_FPS, t=None):
+    """
+    Reproduce el recorrido del sketch: interpolación lineal entre muestras consecutivas,
+    volviendo a la primera al final. Sin 't' las muestras están separadas por
+    'step_delay' segundos; con 't' (tiempos crecientes, por ejemplo los de unos
+    keyframes) cada tramo dura lo que indican sus tiempos y el regreso a la primera
+    dura 'step_delay'. Devuelve las posiciones (M, 3) muestreadas a 'fps' cuadros
+    por segundo.
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    n = len(positions)
+    if n == 0:
+        return positions
+    if t is None:
+        t = np.arange(n) * step_delay
+    else:
+        t = np.asarray(t, dtype=np.float64) - t[0]
+    period = t[-1] + step_delay
+    frames = max(int(round(period * fps)), 1)
+    times = np.arange(frames) / fps
+    knots = np.append(t, period)
+    closed = np.vstack([positions, positions[:1]])
+    k = np.clip(np.searchsorted(knots, times, side="right") - 1, 0, n - 1)
+    span = knots[k + 1] - knots[k]
+    u = ((times - knots[k]) / np.where(span > 0, span, 1.0))[:, None]
+    return closed[k] * (1 - u) + closed[k + 1] * u
+
+def joint_track(positions, valid=None, step_delay=STEP_DELAY, fps=PLAYBACK_FPS, t=None):
+    """
+    Pista de ángulos lista para reproducir: remuestrea las posiciones válidas de la
+    trayectoria como lo haría el sketch (ver resample_routine) y resuelve la IK de
+    todos los cuadros. Devuelve (alpha, beta, gamma, reachable).
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    if valid is not None:
+        valid = np.asarray(valid, dtype=bool)
+        positions = positions[valid]
+        if t is not None:
+            t = np.asarray(t)[valid]
+    return solve_ik(resample_routine(positions, step_delay, fps, t))
+
+def write_joint_track(path, alpha, beta, gamma, reachable, fps=PLAYBACK_FPS):
+    """
+    Guarda la pista como .ptrj de ángulos (kind 1): alpha, beta, gamma en las columnas
+    x, y, z y la alcanzabilidad como máscara de validez.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    n = len(alpha)
+    with TrajectoryWriter(path, capacity=max(n, 1), rate=fps, kind=KIND_JOINTS) as writer:
+        writer.extend(np.arange(1, n + 1), np.arange(n) / fps,
+                      np.stack([alpha, beta, gamma], axis=1), reachable)
+
+def load_positions(path):
+    """
+    Lee una trayectoria .ptrj o un CSV point,x,y,z. Devuelve (points, positions (N, 3),
+    valid, t, rate): en un CSV 't' es None y 'rate' la del sketch (1 / STEP_DELAY).
+    """
+    if path.endswith(TRAJECTORY_EXT):
+        traj = Trajectory(path)
+        return traj.point, traj.positions(), traj.valid.astype(bool), traj.t, traj.rate
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    return data[:, 0].astype(np.int64), data[:, 1:4], np.ones(len(data), dtype=bool), None, 1.0 / STEP_DELAY
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validar una trayectoria con la IK del brazo y precalcular sus ángulos.")
+    parser.add_argument("input", help="Trayectoria .ptrj o CSV (point,x,y,z).")
+    parser.add_argument("--output", default=None,
+                        help="Pista de ángulos .ptrj para el sketch (por ejemplo utils/joint_angles.ptrj).")
+    parser.add_argument("--fps", type=float, default=PLAYBACK_FPS, help="Cuadros por segundo de la pista.")
+    parser.add_argument("--step-delay", type=float, default=None,
+                        help="Segundos entre muestras de la rutina (por defecto 1 / la tasa del .ptrj, "
+                             f"o {STEP_DELAY:g} para un CSV).")
+    args = parser.parse_args()
+
+    points, positions, valid, t, rate = load_positions(args.input)
+    step_delay = args.step_delay or (1.0 / rate if rate > 0 else STEP_DELAY)
+    inicio = time.perf_counter()
+    alpha, beta, gamma, reachable = solve_ik(positions)
+    duracion = time.perf_counter() - inicio
+    unreachable = np.flatnonzero(valid & ~reachable)
+    print(f"{len(positions)} muestras ({valid.sum()} válidas) resueltas en {duracion * 1000:.2f} ms")
+    if len(unreachable):
+        print(f"{len(unreachable)} muestras fuera del espacio de trabajo, por ejemplo los puntos:",
+              [int(points[i]) for i in unreachable[:10]])
+    else:
+        print("Todas las muestras válidas son alcanzables.")
+
+    if args.output:
+        alpha, beta, gamma, reachable = joint_track(positions, valid, step_delay, args.fps, t)
+        write_joint_track(args.output, alpha, beta, gamma, reachable, args.fps)
+        print(f"Pista de {len(alpha)} cuadros guardada en {args.output} "
+              f"({(~reachable).sum()} cuadros inalcanzables)")
+
+# example : python3 inverse_kinematics.py ../utils/physical_red_results.csv --output ../utils/joint_angles.ptrj
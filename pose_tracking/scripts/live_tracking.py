@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+import os
+import cv2
+import csv
+import time
+import argparse
+import threading
+import collections
+import numpy as np
+
+import instrumentation
+from color_labeling import COLOR_RANGES, MULTI_DETECTION_COLORS, get_labeler
+from generate_routine import detect_points, physical_red
+from instrumentation import stage, count
+from marker_render import PHYSICAL_COLOR, FONT
+from marker_tracker import MarkerTracker
+from annotated_export import AnnotatedVideoWriter, POLICIES
+from pose_stream import PosePublisher, DEFAULT_HOST, DEFAULT_PORT
+
+# Latencias que se conservan para los percentiles (las de los últimos frames); una
+# sesión en vivo no tiene fin, así que no se guardan todas
+LATENCY_WINDOW = 10000
+
+class LatestFrameBuffer:
+    """
+    Buffer circular pequeño entre la captura y la detección. Cuando está lleno
+    descarta el frame más viejo, y el consumidor siempre toma el más reciente
+    (descartando los anteriores), de modo que un frame lento de detección nunca
+    genera una cola creciente.
+    """
+
+    def __init__(self, size=2):
+        self.frames = collections.deque(maxlen=size)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+                count("live.dropped")
+            self.frames.append(item)
+            self.condition.notify()
+
+    def latest(self, timeout=None):
+        """
+        Devuelve el elemento más reciente y descarta el resto, o None si el buffer
+        se cerró (o venció 'timeout') sin frames pendientes.
+        """
+        with self.condition:
+            if not self.frames and not self.closed:
+                self.condition.wait(timeout)
+            if not self.frames:
+                return None
+            item = self.frames.pop()
+            self.dropped += len(self.frames)
+            count("live.dropped", len(self.frames))
+            self.frames.clear()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+class CaptureThread(threading.Thread):
+    """
+    Hilo de captura: lee frames de cualquier fuente de cv2.VideoCapture y los deja
+    en el buffer junto con el instante de captura. Si 'realtime' es True y la fuente
+    es un archivo existente, se respeta su FPS nativo para simular una cámara (las
+    URL y las cámaras ya entregan los frames a su ritmo).
+    """
+
+    def __init__(self, source, buffer, realtime=True):
+        super().__init__(name="captura", daemon=True)
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"No se pudo abrir la fuente de video '{source}'.")
+        self.buffer = buffer
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.realtime = realtime
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.captured = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                if self.is_file and self.realtime:
+                    # Esperar al instante en que este frame se mostraría en tiempo real
+                    wait = start + self.captured / self.fps - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                with stage("live.capture"):
+                    ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self.buffer.put((self.captured, time.perf_counter(), frame))
+                self.captured += 1
+        finally:
+            self.cap.release()
+            self.buffer.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+def run_live(source, color_ranges=None, multi_detection_colors=None, buffer_size=2,
+             realtime=True, track=False, output_csv=None, display=False, on_pose=None,
+             report_every=30, export=None):
+    """
+    Seguimiento en vivo: la captura corre en su propio hilo y la detección más
+    pixel_to_physical se hacen solo sobre el frame más reciente. Para cada pose se
+    mide la latencia desde la captura del frame hasta tener la posición física; los
+    percentiles se calculan sobre los últimos LATENCY_WINDOW frames.
+    'on_pose(timestamp, frame_idx, [x, y, z] o None)' se llama con cada resultado.
+    'export' es un AnnotatedVideoWriter opcional que recibe cada frame procesado
+    con sus anotaciones (quien lo pasa se encarga de cerrarlo).
+    Devuelve un diccionario con estadísticas de la ejecución.
+    """
+    if color_ranges is None:
+        color_ranges = COLOR_RANGES
+    if multi_detection_colors is None:
+        multi_detection_colors = MULTI_DETECTION_COLORS
+    # Construir la tabla de colores antes de abrir la fuente, para que no cuente como latencia
+    get_labeler(color_ranges, multi_detection_colors)
+    tracker = MarkerTracker(color_ranges, multi_detection_colors, colors=["red", "green"]) if track else None
+
+    buffer = LatestFrameBuffer(buffer_size)
+    capture = CaptureThread(source, buffer, realtime)
+    latencies = collections.deque(maxlen=LATENCY_WINDOW)
+    latency_max = 0.0
+    processed = 0
+    csvfile = open(output_csv, "w", newline='', encoding='utf-8') if output_csv else None
+    writer = csv.writer(csvfile) if csvfile else None
+    if writer:
+        writer.writerow(["point", "x", "y", "z"])
+
+    capture.start()
+    start = time.perf_counter()
+    try:
+        while True:
+            item = buffer.latest(timeout=1.0)
+            if item is None:
+                if buffer.closed:
+                    break
+                continue
+            frame_idx, captured_at, frame = item
+            source_name = f"frame {frame_idx}"
+            with stage("live.pose"):
+                if tracker is not None:
+                    points = tracker.update(frame)
+                else:
+                    points = detect_points(frame, color_ranges, multi_detection_colors)
+                red_phys = physical_red(points, source_name)
+            latency = time.perf_counter() - captured_at
+            instrumentation.observe("live.capture_to_pose", latency)
+            latencies.append(latency)
+            latency_max = max(latency_max, latency)
+            processed += 1
+
+            if on_pose is not None:
+                on_pose(time.time(), frame_idx, red_phys)
+            if export is not None:
+                export.submit(frame, points, red_phys, source_name)
+            if writer and red_phys is not None:
+                writer.writerow([frame_idx + 1, red_phys[0], red_phys[1], red_phys[2]])
+            if display:
+                view = frame.copy()
+                if red_phys is not None:
+                    cv2.putText(view, f"PhysRed:{[round(v, 2) for v in red_phys]}", (10, 25),
+                                FONT, 0.6, PHYSICAL_COLOR, 2)
+                cv2.imshow("Seguimiento en vivo", view)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            if report_every and processed % report_every == 0:
+                recent = np.asarray([latencies[i] for i in range(-min(report_every, len(latencies)), 0)]) * 1000
+                print(f"Frame {frame_idx}: PhysicalRed = {red_phys} | latencia p50 {np.percentile(recent, 50):.1f} ms, "
+                      f"descartados {buffer.dropped}")
+    finally:
+        capture.stop()
+        capture.join(timeout=2.0)
+        if csvfile:
+            csvfile.close()
+        if display:
+            cv2.destroyAllWindows()
+
+    duration = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1000 if latencies else np.zeros(1)
+    stats = {
+        "captured": capture.captured,
+        "processed": processed,
+        "dropped": buffer.dropped,
+        "processed_fps": processed / duration if duration > 0 else 0.0,
+        "latency_p50_ms": float(np.percentile(ms, 50)),
+        "latency_p99_ms": float(np.percentile(ms, 99)),
+        "latency_max_ms": latency_max * 1000,
+    }
+    if tracker is not None:
+        stats["tracker"] = tracker.stats()
+    if export is not None:
+        stats["export"] = export.stats()
+    return stats
+
+def parse_source(text):
+    """
+    Un número se interpreta como índice de cámara; cualquier otra cosa como ruta o URL.
+    """
+    return int(text) if text.isdigit() else text
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seguimiento del brazo en tiempo real desde una cámara o un video.")
+    parser.add_argument("source", help="Índice de cámara (0, 1, ...) o ruta/URL de video.")
+    parser.add_argument("--buffer", type=int, default=2, help="Frames que guarda el buffer de captura.")
+    parser.add_argument("--no-realtime", action="store_true",
+                        help="Leer los archivos de video tan rápido como sea posible.")
+    parser.add_argument("--track", action="store_true",
+                        help="Buscar los marcadores solo en ventanas alrededor de su última posición.")
+    parser.add_argument("--output", default=None, help="CSV opcional con las poses (point,x,y,z).")
+    parser.add_argument("--display", action="store_true", help="Mostrar el video con la posición física.")
+    parser.add_argument("--publish", nargs="?", const=f"{DEFAULT_HOST}:{DEFAULT_PORT}", default=None,
+                        metavar="HOST:PUERTO",
+                        help="Enviar cada pose por UDP a pose_tracking.pde (por defecto %(const)s).")
+    parser.add_argument("--export", default=None, metavar="VIDEO",
+                        help="Guardar un video anotado de los frames procesados para revisión.")
+    parser.add_argument("--export-policy", choices=POLICIES, default="drop",
+                        help="Con la cola de exportación llena: descartar el frame (drop, para no atrasar "
+                             "la fuente en vivo) o esperar (block).")
+    parser.add_argument("--export-fps", type=float, default=30.0, help="FPS del video anotado.")
+    parser.add_argument("--metrics", default=None, metavar="ARCHIVO",
+                        help="Medir latencias por etapa y guardarlas en ARCHIVO (.json o .prom).")
+    args = parser.parse_args()
+
+    if args.metrics:
+        instrumentation.enable(args.metrics)
+
+    publisher = None
+    if args.publish:
+        host, _, port = args.publish.rpartition(":")
+        publisher = PosePublisher(host or DEFAULT_HOST, int(port))
+    export = AnnotatedVideoWriter(args.export, args.export_fps, args.export_policy) if args.export else None
+    try:
+        stats = run_live(parse_source(args.source), buffer_size=max(1, args.buffer),
+                         realtime=not args.no_realtime, track=args.track,
+                         output_csv=args.output, display=args.display, on_pose=publisher, export=export)
+    finally:
+        if publisher is not None:
+            publisher.close()
+        if export is not None:
+            export.close()
+    print(f"Capturados {stats['captured']}, procesados {stats['processed']}, descartados {stats['dropped']} "
+          f"({stats['processed_fps']:.1f} poses/s)")
+    print(f"Latencia captura -> pose: p50 {stats['latency_p50_ms']:.1f} ms, "
+          f"p99 {stats['latency_p99_ms']:.1f} ms, máx {stats['latency_max_ms']:.1f} ms")
+    if export is not None:
+        print(f"Video anotado: {export.written} frames en {args.export}, {export.dropped} descartados")
+
+# example : python3 live_tracking.py 0 --track --display --publish
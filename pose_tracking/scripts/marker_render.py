@@ -0,0 +1,89 @@
+import cv2
+
+# Estilo de las anotaciones (el mismo que usaban los scripts)
+MARKER_COLOR = (255, 255, 255)
+RELATIVE_COLOR = (0, 255, 0)
+PHYSICAL_COLOR = (0, 0, 255)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def draw_points(frame, detected_points):
+    """
+    Dibuja cada punto del diccionario de detect_color_points y lo etiqueta con
+    el nombre de su color. Modifica 'frame' y lo devuelve.
+    """
+    for color, points in detected_points.items():
+        for (cX, cY) in (points if isinstance(points, list) else [points]):
+            cv2.circle(frame, (cX, cY), 5, MARKER_COLOR, -1)
+            cv2.putText(frame, color, (cX + 5, cY + 5), FONT, 0.5, MARKER_COLOR, 2)
+    return frame
+
+
+def draw_detections(frame, detections, colors, copy=True):
+    """
+    Dibuja el arreglo de detecciones de detect_markers (DETECTION_DTYPE); 'colors'
+    es la lista de nombres en el orden de color_ranges. Por defecto trabaja sobre
+    una copia para no alterar el frame original.
+    """
+    if copy:
+        frame = frame.copy()
+    for det in detections:
+        cX, cY = int(det["x"]), int(det["y"])
+        cv2.circle(frame, (cX, cY), 5, MARKER_COLOR, -1)
+        cv2.putText(frame, colors[det["color_id"]], (cX + 5, cY + 5), FONT, 0.5, MARKER_COLOR, 2)
+    return frame
+
+
+def draw_relative_positions(frame, detected_points, relative_positions):
+    """
+    Escribe junto a cada punto su posición relativa (en píxeles) respecto a la base.
+    """
+    for color, rel in relative_positions.items():
+        points = detected_points[color]
+        if isinstance(rel, list):
+            pairs = zip(points, rel)
+        else:
+            pairs = [(points, rel)]
+        for (x, y), (dx, dy) in pairs:
+            text = f"{color}:({dx},{dy})"
+            cv2.putText(frame, text, (x + 5, y - 10), FONT, 0.5, RELATIVE_COLOR, 2)
+    return frame
+
+
+def draw_physical(frame, point, physical, label="PhysRed"):
+    """
+    Escribe la posición física calculada para el punto 'point' (por defecto el rojo).
+    """
+    (x, y) = point
+    cv2.putText(frame, f"{label}:{physical}", (x + 5, y - 25), FONT, 0.5, PHYSICAL_COLOR, 2)
+    return frame
+
+
+def draw_overlay(frame, detected_points, physical=None, label=None):
+    """
+    Anotación completa de un frame: los marcadores con su color, su posición
+    relativa a la base verde (si se detectó) y la posición física del rojo.
+    Acepta centroides con decimales (se redondean) y escribe 'label' (por ejemplo
+    el número de frame) en la esquina. Modifica 'frame' y lo devuelve.
+    """
+    points = {}
+    for color, value in detected_points.items():
+        if isinstance(value, list):
+            points[color] = [(int(round(x)), int(round(y))) for x, y in value]
+        else:
+            points[color] = (int(round(value[0])), int(round(value[1])))
+    draw_points(frame, points)
+    if "green" in points:
+        bx, by = points["green"]
+        relative_positions = {}
+        for color, value in points.items():
+            if isinstance(value, list):
+                relative_positions[color] = [(x - bx, y - by) for x, y in value]
+            else:
+                relative_positions[color] = (value[0] - bx, value[1] - by)
+        draw_relative_positions(frame, points, relative_positions)
+    if physical is not None and "red" in points:
+        draw_physical(frame, points["red"], [round(v, 2) for v in physical])
+    if label is not None:
+        cv2.putText(frame, str(label), (10, 25), FONT, 0.6, MARKER_COLOR, 2)
+    return frame
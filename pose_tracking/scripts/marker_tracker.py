@@ -0,0 +1,132 @@
+from color_labeling import get_labeler
+from instrumentation import count
+
+class MarkerTracker:
+    """
+    Seguimiento temporal de marcadores de un solo punto (por ejemplo el efector rojo
+    y la base verde) a lo largo de frames consecutivos de un video.
+    Para cada marcador se mantiene una ventana de búsqueda centrada en la posición
+    predicha a partir de las dos últimas detecciones (velocidad constante), y la
+    clasificación de colores se hace solo dentro de esas ventanas. Si un marcador no
+    aparece en su ventana (o su blob queda cortado por el borde de la ventana), se
+    vuelve a buscar en el frame completo.
+    """
+
+    def __init__(self, color_ranges, multi_detection_colors=None, colors=None, window=48):
+        """
+        'colors' son los marcadores a seguir (por defecto todos los que no están en
+        multi_detection_colors) y 'window' es la mitad del lado de la ventana de
+        búsqueda en píxeles, que además crece con la velocidad del marcador.
+        """
+        self.labeler = get_labeler(color_ranges, multi_detection_colors)
+        if colors is None:
+            colors = [c for c in self.labeler.colors if c not in self.labeler.multi_detection_colors]
+        for color in colors:
+            if color not in self.labeler.colors:
+                raise ValueError(f"El color '{color}' no está en color_ranges.")
+            if color in self.labeler.multi_detection_colors:
+                raise ValueError(f"El color '{color}' tiene detección múltiple y no se puede seguir por ventana.")
+        self.colors = list(colors)
+        self.window = window
+        # color -> (última posición, posición anterior o None)
+        self.history = {}
+        self.hits = 0
+        self.misses = 0
+        self.full_scans = 0
+        self.lost = 0
+
+    def reset(self):
+        """
+        Olvida las posiciones conocidas; el próximo frame se analiza completo.
+        """
+        self.history = {}
+
+    def predict(self, color):
+        """
+        Posición predicha (x, y) del marcador en el próximo frame y la velocidad
+        estimada en píxeles por frame, o None si el marcador no se está siguiendo.
+        """
+        if color not in self.history:
+            return None
+        last, previous = self.history[color]
+        if previous is None:
+            return last, (0, 0)
+        vx, vy = last[0] - previous[0], last[1] - previous[1]
+        return (last[0] + vx, last[1] + vy), (vx, vy)
+
+    def update(self, frame):
+        """
+        Procesa el siguiente frame y devuelve {color: (x, y)} para los marcadores
+        encontrados, con el mismo formato que detect_color_points. En las métricas
+        cuenta como un frame procesado, igual que generate_routine.detect_points.
+        """
+        count("frames.processed")
+        height, width = frame.shape[:2]
+        detected_points = {}
+        pending = []
+        for color in self.colors:
+            prediction = self.predict(color)
+            if prediction is None:
+                pending.append(color)
+                continue
+            (px, py), (vx, vy) = prediction
+            half = self.window + max(abs(vx), abs(vy))
+            x0, y0 = max(0, px - half), max(0, py - half)
+            x1, y1 = min(width, px + half + 1), min(height, py + half + 1)
+            point = None
+            if x0 < x1 and y0 < y1:
+                point = self._detect_in_window(frame, color, x0, y0, x1, y1)
+            if point is None:
+                self.misses += 1
+                pending.append(color)
+            else:
+                self.hits += 1
+                detected_points[color] = point
+
+        if pending:
+            # Búsqueda en el frame completo para los marcadores nuevos o perdidos
+            self.full_scans += 1
+            found = self.labeler.detect(frame, pending)
+            for color in pending:
+                if color in found:
+                    detected_points[color] = found[color]
+                else:
+                    self.lost += 1
+                    self.history.pop(color, None)
+
+        for color, point in detected_points.items():
+            last = self.history.get(color, (None, None))[0]
+            self.history[color] = (point, last)
+        self.labeler.count_frame(detected_points, self.colors)
+        return detected_points
+
+    def _detect_in_window(self, frame, color, x0, y0, x1, y1):
+        """
+        Busca el marcador dentro de la ventana [x0, x1) x [y0, y1). Devuelve el
+        centroide en coordenadas del frame o None si no está o si su blob toca un
+        borde de la ventana que no es borde del frame (podría estar cortado).
+        """
+        height, width = frame.shape[:2]
+        blob = self.labeler.detect_blobs(frame[y0:y1, x0:x1], [color]).get(color)
+        if blob is None:
+            return None
+        contour, (cX, cY) = blob
+        xs, ys = contour[:, 0, 0], contour[:, 0, 1]
+        if ((x0 > 0 and xs.min() == 0) or (y0 > 0 and ys.min() == 0) or
+                (x1 < width and xs.max() == x1 - x0 - 1) or (y1 < height and ys.max() == y1 - y0 - 1)):
+            return None
+        return (cX + x0, cY + y0)
+
+    def stats(self):
+        """
+        Contadores de la ejecución: aciertos y fallos en ventana, búsquedas en el
+        frame completo, marcadores perdidos y la tasa de aciertos.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "full_scans": self.full_scans,
+            "lost": self.lost,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import struct
+import hashlib
+import argparse
+import numpy as np
+
+# Formato binario de malla (.pmesh), little-endian:
+#   cabecera de 64 bytes: magic "PMSH" | versión u32 | vértices u32 | índices u32 |
+#                         error máximo permitido f32 | desvío máximo medido f32 |
+#                         sha256 del .obj de origen (32 bytes) | relleno
+#   vértices intercalados: px, py, pz, nx, ny, nz (f32)
+#   índices de triángulos (u32)
+MAGIC = b"PMSH"
+VERSION = 1
+HEADER_FORMAT = "<4sIIIff32s"
+HEADER_SIZE = 64
+
+# Desvío máximo (en unidades del modelo) de cada nivel de detalle; el nivel 0 es la
+# malla original sin decimar
+LOD_ERRORS = (0.0, 0.5, 1.0, 2.0)
+
+# Ángulo (en grados) a partir del cual una arista se sombrea marcada en los niveles decimados
+CREASE_ANGLE = 40.0
+
+MESH_NAMES = ("r1", "r2", "r3", "r4", "r5")
+MANIFEST = "manifest.json"
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.digest()
+
+def parse_obj(path):
+    """
+    Lee posiciones, normales y caras de un .obj. Cada combinación distinta de
+    índices v//vn se convierte en un vértice; los polígonos se triangulan en abanico.
+    Devuelve (positions (N, 3), normals (N, 3), triangles (M, 3)).
+    """
+    positions, normals, corners, triangles = [], [], {}, []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "v":
+                positions.append([float(c) for c in parts[1:4]])
+            elif parts[0] == "vn":
+                normals.append([float(c) for c in parts[1:4]])
+            elif parts[0] == "f":
+                face = []
+                for ref in parts[1:]:
+                    fields = ref.split("/")
+                    v = int(fields[0])
+                    n = int(fields[2]) if len(fields) > 2 and fields[2] else 0
+                    # Índices negativos: relativos al final de la lista
+                    key = (v if v > 0 else len(positions) + v + 1,
+                           n if n >= 0 else len(normals) + n + 1)
+                    face.append(corners.setdefault(key, len(corners)))
+                for k in range(1, len(face) - 1):
+                    triangles.append((face[0], face[k], face[k + 1]))
+
+    keys = np.array(list(corners), dtype=np.int64).reshape(-1, 2)
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    vertex_pos = positions[keys[:, 0] - 1]
+    if len(normals):
+        vertex_nrm = np.where((keys[:, 1] > 0)[:, None], normals[np.maximum(keys[:, 1], 1) - 1], 0.0)
+    else:
+        vertex_nrm = np.zeros_like(vertex_pos)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    return vertex_pos, vertex_nrm, triangles
+
+def face_normals(positions, triangles):
+    """
+    Normales de las caras sin normalizar (su largo es el doble del área).
+    """
+    a, b, c = (positions[triangles[:, k]] for k in range(3))
+    return np.cross(b - a, c - a)
+
+def _normalize(v):
+    length = np.linalg.norm(v, axis=1, keepdims=True)
+    return v / np.where(length > 0, length, 1.0)
+
+def crease_normals(triangles, areas_normals, crease_angle):
+    """
+    Normal de cada esquina de triángulo: suma (ponderada por área) de las normales de
+    las caras que comparten el vértice y forman con la cara de la esquina un ángulo
+    menor que 'crease_angle' grados. Las superficies curvas quedan suaves y las
+    aristas marcadas se mantienen.
+    Devuelve (3M, 3) en el orden de triangles.reshape(-1).
+    """
+    corner_vertex = triangles.reshape(-1)
+    corner_face = np.repeat(np.arange(len(triangles)), 3)
+    unit = _normalize(areas_normals)
+    order = np.argsort(corner_vertex, kind="stable")
+    _, starts, sizes = np.unique(corner_vertex[order], return_index=True, return_counts=True)
+    # Todos los pares (esquina, esquina) que comparten vértice
+    group_size = np.repeat(sizes, sizes)
+    group_start = np.repeat(starts, sizes)
+    i = np.repeat(np.arange(len(order)), group_size)
+    j = group_start[i] + (np.arange(len(i)) - np.repeat(np.cumsum(group_size) - group_size, group_size))
+    fi, fj = corner_face[order[i]], corner_face[order[j]]
+    near = np.einsum("ij,ij->i", unit[fi], unit[fj]) >= np.cos(np.radians(crease_angle))
+    normals = np.zeros((len(order), 3))
+    np.add.at(normals, order[i[near]], areas_normals[fj[near]])
+    return _normalize(normals)
+
+def decimate(positions, triangles, max_error, crease_angle=CREASE_ANGLE):
+    """
+    Decimación por agrupamiento de vértices en una grilla: todos los vértices de una
+    celda se reemplazan por su promedio. Con celdas de lado max_error / sqrt(3) ningún
+    vértice se mueve más que max_error. Los triángulos que colapsan o se repiten se
+    descartan y las normales se recalculan con crease_normals.
+    Devuelve (positions, normals, triangles, desvío máximo medido).
+    """
+    # Se unen primero las copias de un mismo punto (el .obj repite posiciones por normal)
+    unique_pos, welded = np.unique(positions, axis=0, return_inverse=True)
+    welded = welded.reshape(-1)
+    cell = max_error / np.sqrt(3)
+    coords = np.floor((unique_pos - unique_pos.min(axis=0)) / cell).astype(np.int64)
+    _, cluster = np.unique(coords, axis=0, return_inverse=True)
+    cluster = cluster.reshape(-1)
+    counts = np.bincount(cluster)
+    centers = np.stack([np.bincount(cluster, unique_pos[:, k]) for k in range(3)], axis=1) / counts[:, None]
+    deviation = float(np.linalg.norm(unique_pos - centers[cluster], axis=1).max()) if len(unique_pos) else 0.0
+
+    tri = cluster[welded[triangles]]
+    keep = (tri[:, 0] != tri[:, 1]) & (tri[:, 1] != tri[:, 2]) & (tri[:, 0] != tri[:, 2])
+    tri = tri[keep]
+    if len(tri):
+        # Caras repetidas: mismos vértices en el mismo sentido de giro
+        rows = np.arange(len(tri))[:, None]
+        rolled = tri[rows, (np.argmin(tri, axis=1)[:, None] + np.arange(3)) % 3]
+        _, first = np.unique(rolled, axis=0, return_index=True)
+        tri = tri[np.sort(first)]
+    area_normals = face_normals(centers, tri)
+    tri = tri[np.linalg.norm(area_normals, axis=1) > 0]
+    area_normals = face_normals(centers, tri)
+
+    corner_normals = crease_normals(tri, area_normals, crease_angle)
+    # Un vértice por cada (celda, normal) distinta
+    quantized = np.round(corner_normals * 4096).astype(np.int64)
+    corner_keys = np.concatenate([tri.reshape(-1, 1), quantized], axis=1)
+    unique_keys, first, corner_index = np.unique(corner_keys, axis=0, return_index=True, return_inverse=True)
+    corner_index = corner_index.reshape(-1)
+    return centers[unique_keys[:, 0]], corner_normals[first], corner_index.reshape(-1, 3), deviation
+
+def write_pmesh(path, positions, normals, triangles, max_error, deviation, source_hash):
+    vertices = np.concatenate([positions, normals], axis=1).astype("<f4")
+    indices = np.ascontiguousarray(triangles, dtype="<u4").reshape(-1)
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(vertices), len(indices),
+                         max_error, deviation, source_hash).ljust(HEADER_SIZE, b"\0")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(vertices.tobytes())
+        f.write(indices.tobytes())
+    os.replace(tmp, path)
+
+def read_pmesh(path):
+    """
+    Devuelve (vertices (N, 6), triangles (M, 3), cabecera como diccionario).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, n_vertices, n_indices, max_error, deviation, source_hash = \
+        struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} no es un archivo .pmesh válido.")
+    vertices = np.frombuffer(data, "<f4", n_vertices * 6, HEADER_SIZE).reshape(-1, 6)
+    indices = np.frombuffer(data, "<u4", n_indices, HEADER_SIZE + n_vertices * 24).reshape(-1, 3)
+    header = {"max_error": max_error, "deviation": deviation, "sha256": source_hash.hex()}
+    return vertices, indices, header
+
+def lod_path(output_dir, name, level):
+    return os.path.join(output_dir, f"{name}.lod{level}.pmesh")
+
+def preprocess(obj_path, output_dir, lod_errors=LOD_ERRORS, manifest=None, force=False,
+               crease_angle=CREASE_ANGLE):
+    """
+    Genera los .pmesh de todos los niveles de detalle de 'obj_path'. Si el hash del
+    .obj y los parámetros coinciden con los del manifiesto y los archivos existen, no
+    hace nada. Devuelve la entrada del manifiesto y si hubo que regenerar.
+    """
+    name = os.path.splitext(os.path.basename(obj_path))[0]
+    source_hash = file_hash(obj_path)
+    entry = (manifest or {}).get(name)
+    if (not force and entry and entry["sha256"] == source_hash.hex()
+            and entry["lod_errors"] == list(lod_errors) and entry.get("crease_angle") == crease_angle
+            and all(os.path.exists(lod_path(output_dir, name, lvl)) for lvl in range(len(lod_errors)))):
+        return entry, False
+
+    positions, normals, triangles = parse_obj(obj_path)
+    levels = []
+    for level, max_error in enumerate(lod_errors):
+        if max_error > 0:
+            lod = decimate(positions, triangles, max_error, crease_angle)
+        else:
+            lod = positions, normals, triangles, 0.0
+        write_pmesh(lod_path(output_dir, name, level), *lod[:3], max_error, lod[3], source_hash)
+        levels.append({"file": os.path.basename(lod_path(output_dir, name, level)),
+                       "max_error": max_error, "deviation": lod[3],
+                       "vertices": len(lod[0]), "triangles": len(lod[2])})
+    return {"sha256": source_hash.hex(), "lod_errors": list(lod_errors), "crease_angle": crease_angle,
+            "levels": levels}, True
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    meshes_dir = os.path.join(here, "..", "meshes")
+    parser = argparse.ArgumentParser(description="Preprocesar las mallas .obj del brazo a .pmesh con niveles de detalle.")
+    parser.add_argument("--meshes", default=meshes_dir, help="Carpeta con r1.obj ... r5.obj.")
+    parser.add_argument("--output", default=None, help="Carpeta de salida (por defecto meshes/cache).")
+    parser.add_argument("--errors", type=float, nargs="+", default=list(LOD_ERRORS),
+                        help="Desvío máximo de cada nivel de detalle (0 = malla original).")
+    parser.add_argument("--force", action="store_true", help="Regenerar aunque los .obj no hayan cambiado.")
+    args = parser.parse_args()
+
+    output_dir = args.output or os.path.join(args.meshes, "cache")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    for name in MESH_NAMES:
+        obj_path = os.path.join(args.meshes, name + ".obj")
+        if not os.path.exists(obj_path):
+            print("No se encontró la malla:", obj_path)
+            continue
+        inicio = time.perf_counter()
+        entry, rebuilt = preprocess(obj_path, output_dir, args.errors, manifest, args.force)
+        manifest[name] = entry
+        if not rebuilt:
+            print(f"{name}: sin cambios")
+            continue
+        detalle = ", ".join(f"lod{i} {lvl['triangles']} tri (desvío {lvl['deviation']:.3f})"
+                            for i, lvl in enumerate(entry["levels"]))
+        print(f"{name}: {detalle} [{(time.perf_counter() - inicio) * 1000:.0f} ms]")
+    save_manifest(output_dir, manifest)
+    print("Mallas guardadas en", output_dir)
+
+# example : python3 mesh_cache.py
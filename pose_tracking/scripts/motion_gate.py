@@ -0,0 +1,72 @@
+import cv2
+
+from instrumentation import stage, count
+
+class MotionGate:
+    """
+    Filtro de movimiento previo a la detección. Cada frame se reduce 'scale' veces
+    (promediando píxeles, lo que además atenúa el ruido de compresión) y se compara
+    con la versión reducida del último frame que sí se procesó. Si menos de
+    'min_changed' píxeles reducidos cambian más de 'threshold' niveles en algún
+    canal, el frame se considera quieto y se puede reutilizar la detección anterior.
+    Con 'max_carry' > 0 se fuerza una detección tras esa cantidad de frames seguidos
+    reutilizados, para no arrastrar indefinidamente un resultado.
+    """
+
+    def __init__(self, threshold=15, min_changed=1, scale=8, max_carry=50):
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.scale = scale
+        self.max_carry = max_carry
+        self.reference = None
+        self.carried = 0
+        self.checked = 0
+        self.skipped = 0
+
+    def reset(self):
+        """
+        Olvida el frame de referencia; el próximo frame se procesa siempre.
+        """
+        self.reference = None
+        self.carried = 0
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        size = (max(1, w // self.scale), max(1, h // self.scale))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def check(self, frame):
+        """
+        Devuelve True si el frame debe procesarse (hubo movimiento, no hay referencia
+        o se alcanzó max_carry); en ese caso pasa a ser la nueva referencia.
+        Devuelve False si se puede reutilizar el resultado anterior.
+        """
+        self.checked += 1
+        with stage("gate.diff"):
+            small = self._small(frame)
+            moved = True
+            if (self.reference is not None and self.reference.shape == small.shape
+                    and (self.max_carry <= 0 or self.carried < self.max_carry)):
+                diff = cv2.absdiff(small, self.reference)
+                if diff.ndim == 3:
+                    diff = diff.max(axis=2)
+                moved = cv2.countNonZero(cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)[1]) \
+                    >= self.min_changed
+        if moved:
+            self.reference = small
+            self.carried = 0
+            return True
+        self.carried += 1
+        self.skipped += 1
+        count("gate.skipped")
+        return False
+
+    def skip_fraction(self):
+        return self.skipped / self.checked if self.checked else 0.0
+
+    def stats(self):
+        return {
+            "frames": self.checked,
+            "reutilizados": self.skipped,
+            "fraccion_reutilizada": self.skip_fraction(),
+        }
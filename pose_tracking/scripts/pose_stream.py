@@ -0,0 +1,115 @@
+import time
+import socket
+import struct
+import argparse
+
+# Mensaje de pose (orden de red, 28 bytes):
+#   magic "PT" | versión u8 | flags u8 (bit 0 = pose válida) | secuencia u32 |
+#   timestamp f64 (segundos, epoch) | x f32 | y f32 | z f32
+POSE_FORMAT = "!2sBBIdfff"
+POSE_SIZE = struct.calcsize(POSE_FORMAT)
+POSE_MAGIC = b"PT"
+POSE_VERSION = 1
+FLAG_VALID = 0x01
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5005
+
+def encode_pose(seq, timestamp, pose):
+    """
+    Empaqueta una pose [x, y, z] (o None si la detección falló) en un mensaje binario.
+    """
+    if pose is None:
+        return struct.pack(POSE_FORMAT, POSE_MAGIC, POSE_VERSION, 0, seq & 0xFFFFFFFF,
+                           timestamp, 0.0, 0.0, 0.0)
+    return struct.pack(POSE_FORMAT, POSE_MAGIC, POSE_VERSION, FLAG_VALID, seq & 0xFFFFFFFF,
+                       timestamp, pose[0], pose[1], pose[2])
+
+def decode_pose(data):
+    """
+    Inverso de encode_pose: devuelve (seq, timestamp, [x, y, z] o None).
+    Lanza ValueError si el mensaje no tiene el formato esperado.
+    """
+    if len(data) < POSE_SIZE:
+        raise ValueError(f"Mensaje de pose demasiado corto ({len(data)} bytes).")
+    magic, version, flags, seq, timestamp, x, y, z = struct.unpack_from(POSE_FORMAT, data)
+    if magic != POSE_MAGIC or version != POSE_VERSION:
+        raise ValueError("Mensaje de pose con cabecera desconocida.")
+    return seq, timestamp, ([x, y, z] if flags & FLAG_VALID else None)
+
+class PosePublisher:
+    """
+    Publica poses por UDP local (por defecto a 127.0.0.1:5005, donde escucha
+    pose_tracking.pde). Se puede usar directamente como callback 'on_pose' de
+    live_tracking.run_live.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.seq = 0
+        self.sent = 0
+        self.errors = 0
+
+    def publish(self, pose, timestamp=None):
+        """
+        Envía la pose [x, y, z] (o None para indicar que no hubo detección).
+        Un error de envío se cuenta pero no interrumpe el seguimiento.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        message = encode_pose(self.seq, timestamp, pose)
+        self.seq += 1
+        try:
+            self.sock.sendto(message, self.address)
+            self.sent += 1
+        except OSError:
+            self.errors += 1
+
+    def __call__(self, timestamp, frame_idx, pose):
+        self.publish(pose, timestamp)
+
+    def close(self):
+        self.sock.close()
+
+class PoseReceiver:
+    """
+    Receptor en Python del mismo flujo (útil para depurar o para otros consumidores).
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+
+    def receive(self, timeout=None):
+        """
+        Espera el próximo mensaje y devuelve (seq, timestamp, pose), o None si vence 'timeout'.
+        """
+        self.sock.settimeout(timeout)
+        try:
+            data, _ = self.sock.recvfrom(64)
+        except socket.timeout:
+            return None
+        return decode_pose(data)
+
+    def close(self):
+        self.sock.close()
+
+if __name__ == "__main__":
+    # Muestra las poses recibidas y la latencia desde su publicación
+    parser = argparse.ArgumentParser(description="Escuchar el flujo binario de poses.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    receiver = PoseReceiver(args.host, args.port)
+    print(f"Escuchando poses en {args.host}:{args.port}")
+    try:
+        while True:
+            message = receiver.receive()
+            seq, timestamp, pose = message
+            print(f"#{seq}: {pose} ({(time.time() - timestamp) * 1000:.2f} ms)")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.close()
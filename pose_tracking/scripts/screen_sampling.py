@@ -1,10 +1,92 @@
 #!/usr/bin/env python
 import cv2
 import os
+import time
 import argparse
 import numpy as np
 
-def extraer_capturas(video_path, num_capturas, output_folder):
+import instrumentation
+from instrumentation import stage, count
+from frame_index import get_index, leer_frames_indexados
+
+# Costo aproximado de un seek, en frames decodificados: con CAP_PROP_POS_FRAMES
+# el decodificador vuelve al keyframe anterior y decodifica hasta el frame pedido.
+# Si la separación media entre capturas es menor, conviene una sola pasada secuencial.
+SEEK_COST_FRAMES = 30
+
+MODOS = ("auto", "index", "seek", "sequential")
+
+def elegir_modo(indices, seek_cost=SEEK_COST_FRAMES):
+    """
+    Elige entre 'seek' y 'sequential' según la densidad del muestreo:
+    la pasada secuencial decodifica hasta el último índice, mientras que
+    cada seek cuesta del orden de seek_cost frames.
+    """
+    if len(indices) == 0:
+        return "seek"
+    frames_secuenciales = int(indices[-1]) + 1
+    frames_seek = len(indices) * seek_cost
+    return "sequential" if frames_secuenciales <= frames_seek else "seek"
+
+def leer_frames(cap, indices, modo="auto", indice=None, contador=None):
+    """
+    Generador que entrega (i, frame_idx, frame) para cada índice pedido (ordenados
+    de forma ascendente). En modo 'seek' se posiciona con CAP_PROP_POS_FRAMES antes
+    de cada lectura; en modo 'sequential' recorre el video una sola vez hacia adelante,
+    usando grab() para saltar los frames no deseados y retrieve() solo para los pedidos.
+    En modo 'index' (requiere 'indice', un FrameIndex) salta al keyframe anterior a
+    cada frame pedido y avanza desde ahí (ver frame_index.leer_frames_indexados).
+    Los frames que no se pueden leer se entregan como None. Si se pasa 'contador'
+    (un dict), en contador["frames"] se suman los frames leídos del video.
+    """
+    if contador is None:
+        contador = {}
+    contador.setdefault("frames", 0)
+    if modo == "auto":
+        modo = "index" if indice is not None else elegir_modo(indices)
+
+    if modo == "index":
+        if indice is None:
+            raise ValueError("El modo 'index' requiere el índice de frames del video.")
+        yield from leer_frames_indexados(cap, indices, indice, contador=contador)
+        return
+
+    if modo == "seek":
+        for i, frame_idx in enumerate(indices):
+            with stage("video.seek_read"):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+                ret, frame = cap.read()
+            contador["frames"] += 1
+            yield i, frame_idx, frame if ret else None
+        return
+
+    actual = 0  # índice del próximo frame que entregará grab()
+    for i, frame_idx in enumerate(indices):
+        ret = True
+        while actual <= frame_idx:
+            with stage("video.grab"):
+                ret = cap.grab()
+            if not ret:
+                break
+            contador["frames"] += 1
+            actual += 1
+        if not ret:
+            # El video terminó antes (CAP_PROP_FRAME_COUNT puede ser inexacto en WebM)
+            for j in range(i, len(indices)):
+                yield j, indices[j], None
+            break
+        with stage("video.retrieve"):
+            ret, frame = cap.retrieve()
+        yield i, frame_idx, frame if ret else None
+
+def extraer_capturas(video_path, num_capturas, output_folder, modo="auto", usar_indice=False):
+    """
+    Guarda 'num_capturas' frames equidistantes del video en 'output_folder'. Con
+    'usar_indice' (o el modo 'index') la cantidad de frames sale del índice del video
+    (ver frame_index), que se guarda junto al video la primera vez y se reutiliza en
+    las siguientes; así los índices no dependen de CAP_PROP_FRAME_COUNT, que puede
+    ser inexacto en WebM.
+    """
     # Verifica que el archivo de video exista
     if not os.path.exists(video_path):
         print(f"El archivo de video '{video_path}' no existe.")
@@ -20,9 +102,17 @@ def extraer_capturas(video_path, num_capturas, output_folder):
         print("Error al abrir el video.")
         return
     
-    # Obtén el total de frames del video
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    print(f"Total de frames en el video: {total_frames}")
+    # Obtén el total de frames del video (exacto si hay índice)
+    indice = None
+    if usar_indice or modo == "index":
+        with stage("video.index"):
+            indice = get_index(video_path)
+    if indice is not None:
+        total_frames = len(indice)
+        print(f"Total de frames en el video: {total_frames} (índice, {len(indice.keyframes)} keyframes)")
+    else:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        print(f"Total de frames en el video: {total_frames}")
     
     # Si el número de capturas solicitado es mayor que el total de frames,
     # se ajusta para no exceder el total de frames
@@ -34,29 +124,55 @@ def extraer_capturas(video_path, num_capturas, output_folder):
     indices = np.linspace(0, total_frames - 1, num_capturas, dtype=int)
     print(f"Índices de frames a extraer: {indices}")
     
+    if modo == "auto":
+        modo = "index" if indice is not None else elegir_modo(indices)
+    print(f"Modo de lectura: {modo}")
+    
     # Extrae y guarda cada captura
-    for i, frame_idx in enumerate(indices):
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-        ret, frame = cap.read()
-        if not ret:
+    inicio = time.perf_counter()
+    guardadas = 0
+    contador = {"frames": 0}
+    for i, frame_idx, frame in leer_frames(cap, indices, modo, indice, contador):
+        if frame is None:
+            count("video.read_failed")
             print(f"Error al leer el frame {frame_idx}.")
             continue
         
         # Construye el nombre de archivo para la captura
         output_path = os.path.join(output_folder, f"captura_{i+1:03d}.jpg")
-        cv2.imwrite(output_path, frame)
+        with stage("capture.imwrite"):
+            cv2.imwrite(output_path, frame)
+        count("frames.captured")
+        guardadas += 1
         print(f"Guardado {output_path}")
     
     cap.release()
+    # Incluye los frames intermedios que se decodifican en modo secuencial o índice
+    leidos = contador["frames"]
+    duracion = time.perf_counter() - inicio
     print("Extracción de capturas completada.")
+    if duracion > 0:
+        print(f"Rendimiento: {guardadas / duracion:.1f} capturas/s, "
+              f"{leidos / duracion:.1f} frames leídos/s "
+              f"({leidos} frames en {duracion:.2f} s)")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extraer capturas equidistantes de un video.")
     parser.add_argument("video", help="Ruta al archivo de video.")
     parser.add_argument("num", type=int, help="Cantidad de capturas a extraer.")
     parser.add_argument("--output", default="screenshots", help="Carpeta de salida para las capturas.")
+    parser.add_argument("--mode", choices=MODOS, default="auto",
+                        help="Lectura con el índice de frames (saltando a keyframes), por seek, secuencial de una pasada, "
+                             "o elección automática (índice si está disponible).")
+    parser.add_argument("--index", action="store_true",
+                        help="Usar el índice de frames, guardado junto al video como <video>.fidx.npz "
+                             "(por defecto se usa CAP_PROP_FRAME_COUNT).")
+    parser.add_argument("--metrics", default=None, metavar="ARCHIVO",
+                        help="Medir latencias por etapa y guardarlas en ARCHIVO (.json o .prom).")
     args = parser.parse_args()
     
-    extraer_capturas(args.video, args.num, args.output)
+    if args.metrics:
+        instrumentation.enable(args.metrics)
+    extraer_capturas(args.video, args.num, args.output, args.mode, args.index)
 
 # example : python3 screen_sampling.py /home/rovestrada/pose_track_ws/pose_tracking/videos/square_drawing.webm 20 --output /home/rovestrada/pose_track_ws/pose_tracking/screenshots
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los scripts se importan entre sí por nombre, igual que al ejecutarlos desde scripts/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,24 @@
+import numpy as np
+
+from annotated_export import AnnotatedVideoWriter
+
+
+def exportar(writer, frames=100):
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    with writer:
+        for i in range(frames):
+            writer.submit(frame, {"red": (10, 10)}, [0.0, 0.0, 0.0], f"frame {i}")
+    return writer.stats()
+
+
+def test_default_policy_keeps_every_frame(tmp_path):
+    stats = exportar(AnnotatedVideoWriter(str(tmp_path / "anotado.avi"), 10.0, queue_size=1))
+    assert stats["politica"] == "block"
+    assert stats["descartados"] == 0
+    assert stats["escritos"] == stats["encolados"] == 100
+
+
+def test_drop_policy_reports_dropped_frames(tmp_path):
+    stats = exportar(AnnotatedVideoWriter(str(tmp_path / "anotado.avi"), 10.0, "drop", queue_size=1))
+    assert stats["encolados"] + stats["descartados"] == 100
+    assert stats["escritos"] == stats["encolados"]
@@ -0,0 +1,24 @@
+from benchmark import compare
+
+
+def resultados(p50_ms, missed=0, max_error_px=0.2):
+    return {
+        "pixel_to_physical": {"p50_ms": p50_ms},
+        "resolutions": {"640x480": {
+            "detect_color_points": {"p50_ms": 1.0, "p99_ms": 2.0,
+                                    "accuracy": {"missed": missed, "max_error_px": max_error_px}},
+            "process_image": {"p50_ms": 1.0, "p99_ms": 2.0},
+            "extraer_capturas": {"throughput_per_s": 100.0},
+        }},
+    }
+
+
+def test_small_timing_regression_is_flagged():
+    regressions = compare(resultados(0.011), resultados(0.005))
+    assert [name for name, _, _ in regressions] == ["pixel_to_physical.p50_ms"]
+
+
+def test_counts_keep_absolute_margin():
+    assert compare(resultados(0.005, max_error_px=0.4), resultados(0.005, max_error_px=0.2)) == []
+    regressions = compare(resultados(0.005, missed=1), resultados(0.005, missed=0))
+    assert [name for name, _, _ in regressions] == ["640x480.detect_color_points.missed"]
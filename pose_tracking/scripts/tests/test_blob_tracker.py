@@ -0,0 +1,54 @@
+import numpy as np
+
+from blob_tracker import BlobTracker
+from color_labeling import COLOR_RANGES, MULTI_DETECTION_COLORS, DETECTION_DTYPE
+
+
+def detecciones(tracker, points):
+    det = np.zeros(len(points), dtype=DETECTION_DTYPE)
+    det["color_id"] = tracker.labeler.colors.index("celeste")
+    det["x"] = [x for x, _ in points]
+    det["y"] = [y for _, y in points]
+    return det
+
+
+def nuevo_tracker(**kwargs):
+    return BlobTracker(COLOR_RANGES, MULTI_DETECTION_COLORS, colors=["celeste"], **kwargs)
+
+
+def test_ids_survive_a_crossing():
+    tracker = nuevo_tracker(max_distance=30.0)
+    # Dos blobs que se cruzan en x = 100 moviéndose en sentidos opuestos
+    ids = None
+    for step in range(11):
+        a = (50.0 + 10 * step, 100.0)
+        b = (150.0 - 10 * step, 104.0)
+        result = tracker.update_detections(detecciones(tracker, [b, a] if step % 2 else [a, b]))["celeste"]
+        by_x = {round(x): blob_id for blob_id, (x, _) in result.items()}
+        current = (by_x[round(a[0])], by_x[round(b[0])]) if a[0] != b[0] else None
+        if current is None:
+            continue
+        if ids is None:
+            ids = current
+        assert current == ids
+    assert tracker.stats()["created"] == 2
+
+
+def test_track_expires_after_max_missed():
+    tracker = nuevo_tracker(max_missed=2)
+    first = tracker.update_detections(detecciones(tracker, [(10.0, 10.0)]))["celeste"]
+    for _ in range(2):
+        assert tracker.update_detections(detecciones(tracker, []))["celeste"] == {}
+    assert tracker.stats()["active"] == 1
+    tracker.update_detections(detecciones(tracker, []))
+    assert tracker.stats()["active"] == 0
+    assert tracker.stats()["expired"] == 1
+    again = tracker.update_detections(detecciones(tracker, [(10.0, 10.0)]))["celeste"]
+    assert set(again) != set(first)
+
+
+def test_reset_clears_stats():
+    tracker = nuevo_tracker()
+    tracker.update_detections(detecciones(tracker, [(10.0, 10.0)]))
+    tracker.reset()
+    assert tracker.stats() == {"frames": 0, "created": 0, "expired": 0, "active": 0, "matched": 0}
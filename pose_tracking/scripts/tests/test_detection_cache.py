@@ -0,0 +1,26 @@
+import sqlite3
+
+import detection_cache
+from detection_cache import DetectionCache
+
+
+def stored(path):
+    db = sqlite3.connect(path)
+    try:
+        return db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    finally:
+        db.close()
+
+
+def test_limit_applies_while_running(tmp_path, monkeypatch):
+    monkeypatch.setattr(detection_cache, "COMMIT_EVERY", 10)
+    path = str(tmp_path / "cache.sqlite")
+    cache = DetectionCache(path, max_entries=25)
+    for i in range(200):
+        cache.put(f"k{i}", {"red": [i, i]})
+    # Sin cerrar (como tras un corte), lo confirmado en disco respeta el límite
+    assert stored(path) <= 25
+    assert cache.get("k199") == ({"red": [199, 199]}, True)
+    assert cache.get("k0") == (None, False)
+    cache.close()
+    assert stored(path) == 25
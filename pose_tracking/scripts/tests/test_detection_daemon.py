@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import socket
+import subprocess
+
+import pytest
+
+from detect_client import request_all
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    path = str(tmp_path / "detect.sock")
+    process = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIR, "detection_daemon.py"),
+                                "--socket", path, "--workers", "1", "--max-pending", "2"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.monotonic() + 30
+    while not os.path.exists(path):
+        assert process.poll() is None and time.monotonic() < limite
+        time.sleep(0.1)
+    yield path
+    process.terminate()
+    process.wait(timeout=10)
+
+
+def conectar(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(10)
+    sock.connect(path)
+    return sock
+
+
+def test_malformed_requests_do_not_leak_slots(daemon):
+    for line in (b"[1]\n", b'{"op": "ping", "bytes": [1]}\n', b"[1]\n", b'"ping"\n'):
+        with conectar(daemon) as sock:
+            sock.sendall(line)
+            response = sock.makefile("rb").readline()
+            assert b"Pedido inv" in response
+    with conectar(daemon) as sock:
+        responses = request_all(sock, [({"op": "ping"}, None), ({"op": "ping", "bytes": None}, None)])
+    assert [r["ok"] for r in responses] == [True, True]
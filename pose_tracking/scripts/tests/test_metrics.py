@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+import pytest
+
+import instrumentation
+from color_labeling import COLOR_RANGES, MULTI_DETECTION_COLORS
+from generate_routine import detect_points
+from marker_tracker import MarkerTracker
+
+MARKERS = {"green": (0, 255, 18), "red": (0, 0, 255)}
+
+
+@pytest.fixture
+def metrics():
+    instrumentation.snapshot(reset=True)
+    instrumentation.enable()
+    yield lambda: instrumentation.snapshot()["counters"]
+    instrumentation.disable()
+    instrumentation.snapshot(reset=True)
+
+
+def frames(n, jump_at=None, missing_red_at=None):
+    """
+    Frames con el verde fijo y el rojo moviéndose; en 'jump_at' el rojo salta fuera
+    de la ventana del tracker y en 'missing_red_at' no aparece.
+    """
+    for i in range(n):
+        frame = np.full((240, 320, 3), 32, dtype=np.uint8)
+        cv2.circle(frame, (60, 180), 8, MARKERS["green"], -1)
+        x = 100 + 3 * i + (120 if jump_at is not None and i >= jump_at else 0)
+        if i != missing_red_at:
+            cv2.circle(frame, (x, 80), 8, MARKERS["red"], -1)
+        yield frame
+
+
+@pytest.mark.parametrize("pyramid", [1, 2, 4])
+def test_detect_points_counts_one_frame_per_call(metrics, pyramid):
+    for frame in frames(6, missing_red_at=3):
+        detect_points(frame, COLOR_RANGES, MULTI_DETECTION_COLORS, pyramid)
+    counters = metrics()
+    assert counters["frames.processed"] == 6
+    assert counters["detect.frames"] == 6
+    assert counters["detect.missed.red"] == 1
+    assert "detect.missed.green" not in counters
+
+
+def test_tracker_counts_one_frame_per_update(metrics):
+    tracker = MarkerTracker(COLOR_RANGES, MULTI_DETECTION_COLORS, colors=["red", "green"])
+    for frame in frames(8, jump_at=4, missing_red_at=6):
+        tracker.update(frame)
+    counters = metrics()
+    # El salto lo encuentra la búsqueda en el frame completo: no es una pérdida
+    assert tracker.stats()["full_scans"] > 1
+    assert counters["frames.processed"] == 8
+    assert counters["detect.frames"] == 8
+    assert counters["detect.missed.red"] == 1
+    assert "detect.missed.green" not in counters
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pytest
+
+from inverse_kinematics import load_positions, resample_routine
+from trajectory_filter import hermite, linear, process
+from trajectory_store import TrajectoryWriter, load_samples
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "..", "utils", "physical_red_results.csv")
+
+
+@pytest.mark.parametrize("window, tolerance", [(1, 0.5), (3, 0.5), (5, 2.0)])
+def test_keyframes_stay_within_tolerance(window, tolerance):
+    points, t, positions = load_samples(DATA)
+    result = process(t, positions, window, tolerance)
+    assert result["keyframes"] <= result["samples"]
+    for interpolate in (hermite, linear):
+        played = interpolate(result["t"], result["positions"], t)
+        deviation = np.linalg.norm(played - positions, axis=1).max()
+        assert deviation <= tolerance + 1e-9
+
+
+def test_keyframes_keep_playback_timing(tmp_path):
+    points, t, positions = load_samples(DATA)
+    result = process(t, positions)
+    path = str(tmp_path / "keyframes.ptrj")
+    with TrajectoryWriter(path, rate=2.0) as writer:
+        for i in result["keyframe_index"]:
+            writer.append(int(points[i]), t[i], list(result["smoothed"][i]))
+
+    _, key_positions, valid, key_t, rate = load_positions(path)
+    assert rate == 2.0
+    # Recorrer los keyframes con sus tiempos da lo mismo (dentro de la tolerancia)
+    # que recorrer todas las muestras cada 1 / rate segundos
+    dense = resample_routine(positions, 1.0 / rate)
+    sparse = resample_routine(key_positions[valid], 1.0 / rate, t=key_t[valid])
+    assert sparse.shape == dense.shape
+    assert np.linalg.norm(sparse - dense, axis=1).max() <= 0.5 + 1e-6
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pytest
+
+import trajectory_store
+from trajectory_store import Trajectory, TrajectoryWriter, _layout
+
+
+def write_samples(writer, start, n):
+    for i in range(start, start + n):
+        writer.append(i + 1, i / 2.0, [0.0, float(i), -float(i)])
+
+
+def check_samples(path, n):
+    traj = Trajectory(path)
+    assert len(traj) == n
+    assert np.array_equal(traj.point, np.arange(1, n + 1))
+    assert np.array_equal(traj.y, np.arange(n, dtype=np.float32))
+
+
+def test_close_shrinks_to_count(tmp_path):
+    path = str(tmp_path / "a.ptrj")
+    with TrajectoryWriter(path) as writer:
+        write_samples(writer, 0, 20)
+    assert os.path.getsize(path) == _layout(20)[1]
+    assert Trajectory(path).capacity == 20
+    check_samples(path, 20)
+
+
+def test_grow_and_resume(tmp_path):
+    path = str(tmp_path / "a.ptrj")
+    with TrajectoryWriter(path, capacity=4) as writer:
+        write_samples(writer, 0, 11)
+    with TrajectoryWriter(path) as writer:
+        write_samples(writer, 11, 6)
+    assert os.path.getsize(path) == _layout(17)[1]
+    check_samples(path, 17)
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_interrupted_growth_keeps_file_readable(tmp_path, monkeypatch):
+    path = str(tmp_path / "a.ptrj")
+    writer = TrajectoryWriter(path, capacity=4)
+    write_samples(writer, 0, 4)
+    writer.flush()
+
+    def crash(*args):
+        raise KeyboardInterrupt
+
+    # El proceso se corta con el archivo nuevo ya escrito pero sin reemplazar al original
+    monkeypatch.setattr(trajectory_store.os, "replace", crash)
+    with pytest.raises(KeyboardInterrupt):
+        write_samples(writer, 4, 1)
+    monkeypatch.undo()
+    check_samples(path, 4)
+
+    # Un escritor nuevo (como en --resume) continúa desde las muestras guardadas
+    with TrajectoryWriter(path) as writer:
+        write_samples(writer, 4, 3)
+    check_samples(path, 7)
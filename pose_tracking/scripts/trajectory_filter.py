@@ -0,0 +1,209 @@
+import os
+import sys
+import argparse
+import numpy as np
+
+from trajectory_store import TRAJECTORY_EXT, Trajectory, load_samples, open_trajectory_writer
+
+# Valores por defecto del post-procesamiento
+SMOOTH_WINDOW = 1      # muestras del promedio móvil centrado (1 = sin suavizado)
+TOLERANCE = 0.5        # desvío máximo (en las unidades de la trayectoria) respecto de las muestras
+
+def smooth(positions, window=SMOOTH_WINDOW, max_shift=None):
+    """
+    Quita el temblor con un promedio móvil centrado de 'window' muestras. En los
+    extremos se promedia solo lo disponible, así que el primer y el último punto
+    se mueven poco. Con 'max_shift' ningún punto se aleja más que eso de su
+    posición original (el promedio redondea las esquinas; así se limita cuánto).
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    if window <= 1 or len(positions) < 3:
+        return positions.copy()
+    half = window // 2
+    padded = np.concatenate([np.zeros((1, 3)), np.cumsum(positions, axis=0)])
+    idx = np.arange(len(positions))
+    lo = np.maximum(idx - half, 0)
+    hi = np.minimum(idx + half + 1, len(positions))
+    smoothed = (padded[hi] - padded[lo]) / (hi - lo)[:, None]
+    if max_shift is not None:
+        shift = smoothed - positions
+        norm = np.linalg.norm(shift, axis=1)
+        scale = np.where(norm > max_shift, max_shift / np.where(norm > 0, norm, 1.0), 1.0)
+        smoothed = positions + shift * scale[:, None]
+    return smoothed
+
+def _segment_distance(points, a, b):
+    """
+    Distancia de cada punto (N, 3) al segmento a-b (a y b pueden ser (3,) o (N, 3)).
+    """
+    ab = b - a
+    denom = np.einsum("...i,...i->...", ab, ab)
+    u = np.einsum("...i,...i->...", points - a, ab) / np.where(denom > 0, denom, 1.0)
+    u = np.clip(u, 0.0, 1.0)
+    closest = a + u[..., None] * ab
+    return np.linalg.norm(points - closest, axis=-1)
+
+def simplify(positions, tolerance=TOLERANCE):
+    """
+    Ramer-Douglas-Peucker en 3D (iterativo): índices de las muestras que se conservan
+    de modo que ninguna muestra descartada quede a más de 'tolerance' del segmento
+    entre las conservadas que la rodean.
+    """
+    n = len(positions)
+    if n <= 2:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        d = _segment_distance(positions[i + 1:j], positions[i], positions[j])
+        k = int(np.argmax(d))
+        if d[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return np.flatnonzero(keep)
+
+def hermite(t, positions, out_t):
+    """
+    Spline cúbica de Hermite con tangentes de Catmull-Rom (diferencias centradas
+    respecto al tiempo) que pasa por todos los puntos, evaluada en 'out_t'.
+    """
+    n = len(positions)
+    if n == 1:
+        return np.repeat(positions, len(out_t), axis=0)
+    tangents = np.empty_like(positions)
+    tangents[1:-1] = (positions[2:] - positions[:-2]) / (t[2:] - t[:-2])[:, None]
+    tangents[0] = (positions[1] - positions[0]) / (t[1] - t[0])
+    tangents[-1] = (positions[-1] - positions[-2]) / (t[-1] - t[-2])
+
+    k = np.clip(np.searchsorted(t, out_t, side="right") - 1, 0, n - 2)
+    h = (t[k + 1] - t[k])[:, None]
+    s = (out_t[:, None] - t[k][:, None]) / h
+    s2, s3 = s * s, s * s * s
+    return ((2 * s3 - 3 * s2 + 1) * positions[k] + (s3 - 2 * s2 + s) * h * tangents[k]
+            + (-2 * s3 + 3 * s2) * positions[k + 1] + (s3 - s2) * h * tangents[k + 1])
+
+def linear(t, positions, out_t):
+    """
+    Interpolación lineal entre los puntos, evaluada en 'out_t' (como recorre la
+    rutina el sketch).
+    """
+    return np.stack([np.interp(out_t, t, positions[:, i]) for i in range(3)], axis=1)
+
+def fit(t, positions, tolerance=TOLERANCE, reference=None):
+    """
+    Keyframes de la trayectoria: se parte de la simplificación RDP y se agrega en
+    cada tramo la muestra peor aproximada hasta que, en el instante de cada muestra,
+    ni la spline ni la interpolación lineal entre keyframes se alejen más de
+    'tolerance' de 'reference' (por defecto las mismas posiciones; con las muestras
+    originales si 'positions' está suavizada). Devuelve los índices de los keyframes
+    y el desvío final.
+    """
+    if reference is None:
+        reference = positions
+    keyframes = simplify(positions, tolerance)
+    while True:
+        error = np.maximum(
+            np.linalg.norm(hermite(t[keyframes], positions[keyframes], t) - reference, axis=1),
+            np.linalg.norm(linear(t[keyframes], positions[keyframes], t) - reference, axis=1))
+        if len(keyframes) == len(t) or error.max() <= tolerance:
+            return keyframes, float(error.max()) if len(t) else 0.0
+        # La peor muestra de cada tramo que se pasa de la tolerancia
+        interval = np.searchsorted(keyframes, np.arange(len(t)), side="right") - 1
+        over = np.flatnonzero(error > tolerance)
+        # En un keyframe el desvío es solo el del suavizado (acotado por 'tolerance')
+        over = over[~np.isin(over, keyframes)]
+        if len(over) == 0:
+            return keyframes, float(error.max())
+        order = np.lexsort((-error[over], interval[over]))
+        first = np.concatenate([[True], np.diff(interval[over][order]) != 0])
+        keyframes = np.union1d(keyframes, over[order][first])
+
+def resample(t, positions, rate):
+    """
+    Evalúa la spline que pasa por los keyframes (t, positions) a 'rate' muestras
+    por segundo. Devuelve (tiempos, posiciones).
+    """
+    n = int(np.floor((t[-1] - t[0]) * rate + 1e-9)) + 1
+    out_t = t[0] + np.arange(n) / rate
+    return out_t, hermite(t, positions, out_t)
+
+def process(t, positions, window=SMOOTH_WINDOW, tolerance=TOLERANCE):
+    """
+    Suaviza (sin mover ningún punto más de 'tolerance') y simplifica una trayectoria
+    (tiempos crecientes y posiciones (N, 3)). Los keyframes reproducen las muestras
+    originales con un desvío máximo de 'tolerance', tanto por spline como por
+    interpolación lineal. Devuelve un diccionario con los keyframes y las métricas
+    de compresión y desvío.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    if len(t) == 0:
+        print("La trayectoria no tiene muestras válidas")
+        return None
+    smoothed = smooth(positions, window, tolerance)
+    keyframes, deviation = fit(t, smoothed, tolerance, positions)
+    return {
+        "keyframe_index": keyframes,
+        "smoothed": smoothed,
+        "t": t[keyframes],
+        "positions": smoothed[keyframes],
+        "samples": len(t),
+        "keyframes": len(keyframes),
+        "compression_ratio": len(t) / len(keyframes),
+        "smoothing_deviation": float(np.linalg.norm(smoothed - positions, axis=1).max()),
+        "fit_deviation": deviation,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suavizar y simplificar una trayectoria a sus keyframes para reproducirla.")
+    parser.add_argument("input", help="Trayectoria .ptrj o CSV (point,x,y,z).")
+    parser.add_argument("output", help="Keyframes (.ptrj o .csv), o la trayectoria remuestreada con --rate.")
+    parser.add_argument("--smooth", type=int, default=SMOOTH_WINDOW,
+                        help="Ventana del promedio móvil en muestras (1 = sin suavizado).")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Desvío máximo permitido respecto de las muestras originales.")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Guardar la spline remuestreada a estas muestras por segundo en lugar de los keyframes.")
+    parser.add_argument("--input-rate", type=float, default=2.0,
+                        help="Muestras por segundo del CSV de entrada (no tiene tiempos).")
+    args = parser.parse_args()
+
+    points, t, positions = load_samples(args.input, args.input_rate)
+    result = process(t, positions, args.smooth, args.tolerance)
+    if result is None:
+        sys.exit(1)
+
+    if args.rate:
+        out_t, out_positions = resample(result["t"], result["positions"], args.rate)
+        with open_trajectory_writer(args.output, args.rate) as writer:
+            if args.output.endswith(TRAJECTORY_EXT):
+                writer.extend(np.arange(1, len(out_t) + 1), out_t, out_positions)
+            else:
+                for i in range(len(out_t)):
+                    writer.append(i + 1, out_t[i], list(out_positions[i]))
+        salida = f"{len(out_t)} muestras a {args.rate:g}/s"
+    else:
+        # Los keyframes conservan su número de muestra y su tiempo; la tasa de la
+        # entrada queda en la cabecera para que el sketch y la IK recorran la rutina
+        # con los mismos tiempos
+        rate = Trajectory(args.input).rate if args.input.endswith(TRAJECTORY_EXT) else args.input_rate
+        with open_trajectory_writer(args.output, rate) as writer:
+            for i in result["keyframe_index"]:
+                writer.append(int(points[i]), t[i], list(result["smoothed"][i]))
+        salida = "keyframes"
+
+    in_size = os.path.getsize(args.input)
+    out_size = os.path.getsize(args.output)
+    print(f"{result['samples']} muestras -> {result['keyframes']} keyframes "
+          f"(compresión {result['compression_ratio']:.1f}x), guardado: {salida}")
+    print(f"Desvío máximo respecto de las muestras originales: suavizado {result['smoothing_deviation']:.3f}, "
+          f"keyframes {result['fit_deviation']:.3f} (tolerancia {args.tolerance:g})")
+    print(f"Archivo: {in_size} -> {out_size} bytes")
+
+# example : python3 trajectory_filter.py ../utils/physical_red_results.csv ../utils/physical_red_keyframes.ptrj
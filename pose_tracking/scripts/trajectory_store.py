@@ -0,0 +1,357 @@
+import os
+import csv
+import struct
+import argparse
+import numpy as np
+
+# Formato binario columnar de trayectorias (.ptrj), little-endian:
+#   cabecera de 64 bytes: magic "PTRJ" | versión u32 | count u64 | capacity u64 |
+#                         rate f64 (muestras/s de la grilla de tiempos, 0 si el muestreo es
+#                                   irregular; puede guardarse solo parte de las muestras,
+#                                   por ejemplo los keyframes de trajectory_filter.py) |
+#                         kind u32 (0 = posiciones, 1 = ángulos articulares) | relleno
+#   columnas de 'capacity' elementos, una detrás de otra:
+#     t f64 (segundos) | point i32 | x f32 | y f32 | z f32 | valid u8
+# En las pistas de ángulos (kind 1) las columnas x, y, z guardan alpha, beta, gamma.
+# La columna valid es un campo de bits: VALID_SAMPLE si la muestra tiene posición y
+# VALID_CARRIED si esa posición se reutilizó de la muestra anterior sin volver a detectar.
+# Solo las primeras 'count' muestras son válidas. 'count' se actualiza después de
+# escribir los datos, así que un archivo cortado a mitad de un append sigue siendo legible.
+# Al cambiar la capacidad (crecer o ajustar al cerrar) el archivo nuevo se arma aparte
+# y reemplaza al anterior con os.replace, así que nunca queda a medio reubicar.
+TRAJECTORY_EXT = ".ptrj"
+MAGIC = b"PTRJ"
+VERSION = 1
+HEADER_FORMAT = "<4sIQQdI"
+HEADER_SIZE = 64
+COUNT_OFFSET = 8
+KIND_POSITIONS = 0
+VALID_SAMPLE = 0x01
+VALID_CARRIED = 0x02
+KIND_JOINTS = 1
+COLUMNS = (("t", "<f8"), ("point", "<i4"), ("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("valid", "u1"))
+
+def _layout(capacity):
+    """
+    Desplazamiento en bytes de cada columna para una capacidad dada, y el tamaño total.
+    """
+    offsets = {}
+    offset = HEADER_SIZE
+    for name, dtype in COLUMNS:
+        offsets[name] = offset
+        offset += np.dtype(dtype).itemsize * capacity
+    return offsets, offset
+
+def _read_header(f):
+    f.seek(0)
+    data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Archivo de trayectoria demasiado corto.")
+    magic, version, count, capacity, rate, kind = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC:
+        raise ValueError("El archivo no es una trayectoria .ptrj.")
+    if version != VERSION:
+        raise ValueError(f"Versión de trayectoria no soportada: {version}.")
+    return count, capacity, rate, kind
+
+def _columns(buffer, capacity):
+    offsets, _ = _layout(capacity)
+    return {name: buffer[offsets[name]:offsets[name] + np.dtype(dtype).itemsize * capacity].view(dtype)
+            for name, dtype in COLUMNS}
+
+class TrajectoryWriter:
+    """
+    Escritura append-only de un archivo .ptrj. Si el archivo existe se continúa al
+    final; si no, se crea con 'capacity' muestras reservadas, que se duplican cada
+    vez que se llenan. Al cerrar, el archivo se ajusta a las muestras escritas.
+    """
+
+    def __init__(self, path, capacity=1024, rate=0.0, kind=KIND_POSITIONS):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                self.count, self.capacity, self.rate, self.kind = _read_header(f)
+        else:
+            self.count, self.capacity, self.rate, self.kind = 0, max(1, int(capacity)), float(rate), kind
+            with open(path, "wb") as f:
+                f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0, self.capacity, self.rate, self.kind)
+                        .ljust(HEADER_SIZE, b"\0"))
+                f.truncate(_layout(self.capacity)[1])
+        self._map()
+
+    def _map(self):
+        self.buffer = np.memmap(self.path, dtype=np.uint8, mode="r+")
+        self.columns = _columns(self.buffer, self.capacity)
+
+    def _relayout(self, capacity):
+        """
+        Reescribe el archivo con otra capacidad: las 'count' muestras se copian a un
+        archivo temporal con la nueva disposición de columnas, que luego reemplaza al
+        original. Si el proceso se corta antes del reemplazo, el original queda intacto.
+        """
+        tmp_path = self.path + ".tmp"
+        offsets, size = _layout(capacity)
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.count, capacity, self.rate, self.kind)
+                    .ljust(HEADER_SIZE, b"\0"))
+            for name, _ in COLUMNS:
+                f.seek(offsets[name])
+                f.write(self.columns[name][:self.count].tobytes())
+            f.truncate(size)
+            f.flush()
+            os.fsync(f.fileno())
+        del self.columns, self.buffer
+        os.replace(tmp_path, self.path)
+        self.capacity = capacity
+
+    def _grow(self):
+        self._relayout(max(1, self.capacity * 2))
+        self._map()
+
+    def append(self, point, t, pose, carried=False):
+        """
+        Agrega una muestra; 'pose' es [x, y, z] o None si la detección falló.
+        'carried' indica que el resultado se reutilizó de la muestra anterior.
+        """
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        cols = self.columns
+        cols["t"][i] = t
+        cols["point"][i] = point
+        if pose is None:
+            cols["x"][i] = cols["y"][i] = cols["z"][i] = np.nan
+            cols["valid"][i] = 0
+        else:
+            cols["x"][i], cols["y"][i], cols["z"][i] = pose[0], pose[1], pose[2]
+            cols["valid"][i] = VALID_SAMPLE | (VALID_CARRIED if carried else 0)
+        self.count += 1
+        struct.pack_into("<Q", self.buffer, COUNT_OFFSET, self.count)
+
+    def extend(self, points, t, positions, valid=None):
+        """
+        Agrega un bloque de muestras de una vez: 'positions' es (N, 3) y 'valid' una
+        máscara opcional (por defecto, las filas sin NaN).
+        """
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        n = len(positions)
+        if valid is None:
+            valid = ~np.isnan(positions).any(axis=1)
+        while self.count + n > self.capacity:
+            self._grow()
+        i, j = self.count, self.count + n
+        cols = self.columns
+        cols["t"][i:j] = t
+        cols["point"][i:j] = points
+        cols["x"][i:j] = positions[:, 0]
+        cols["y"][i:j] = positions[:, 1]
+        cols["z"][i:j] = positions[:, 2]
+        cols["valid"][i:j] = valid
+        self.count = j
+        struct.pack_into("<Q", self.buffer, COUNT_OFFSET, self.count)
+
+    def flush(self):
+        self.buffer.flush()
+
+    def close(self):
+        """
+        Ajusta el archivo a las muestras escritas (capacity = count) y lo cierra.
+        """
+        if self.buffer is not None:
+            self.buffer.flush()
+            if self.capacity != self.count:
+                self._relayout(self.count)
+            else:
+                del self.columns, self.buffer
+            self.buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class Trajectory:
+    """
+    Lectura de un archivo .ptrj mapeado en memoria. Las columnas (t, point, x, y, z,
+    valid) son vistas de NumPy sobre el archivo, sin copias.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.buffer = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Vuelve a leer la cabecera para ver las muestras agregadas por un escritor.
+        """
+        with open(self.path, "rb") as f:
+            self.count, self.capacity, self.rate, self.kind = _read_header(f)
+        self.buffer = np.memmap(self.path, dtype=np.uint8, mode="r")
+        columns = _columns(self.buffer, self.capacity)
+        for name, _ in COLUMNS:
+            setattr(self, name, columns[name][:self.count])
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        """
+        Muestra 'i' como (point, t, [x, y, z] o None).
+        """
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("Índice de muestra fuera de rango.")
+        pose = [float(self.x[i]), float(self.y[i]), float(self.z[i])] if self.valid[i] else None
+        return int(self.point[i]), float(self.t[i]), pose
+
+    def carried(self):
+        """
+        Máscara de las muestras cuya posición se reutilizó de la anterior (MotionGate).
+        """
+        return (self.valid & VALID_CARRIED) != 0
+
+    def positions(self):
+        """
+        Copia (N, 3) con las posiciones; las muestras inválidas quedan en NaN.
+        """
+        return np.stack([self.x, self.y, self.z], axis=1)
+
+    def index_at(self, time):
+        """
+        Índice de la última muestra con t <= 'time' (0 si 'time' es anterior a la
+        primera). Con muestreo regular se calcula directamente; si no, por búsqueda binaria.
+        """
+        if self.count == 0:
+            raise IndexError("La trayectoria está vacía.")
+        if self.rate > 0:
+            i = int(np.clip(np.floor((time - self.t[0]) * self.rate + 1e-9), 0, self.count - 1))
+            # Corrección por redondeo o por muestras con un timestamp algo desplazado
+            if i > 0 and self.t[i] > time:
+                i -= 1
+            elif i + 1 < self.count and self.t[i + 1] <= time:
+                i += 1
+            if (i == 0 or self.t[i] <= time) and (i + 1 == self.count or self.t[i + 1] > time):
+                return i
+            # Faltan muestras de la grilla (keyframes): búsqueda binaria
+        return max(int(np.searchsorted(self.t, time, side="right")) - 1, 0)
+
+    def at_time(self, time):
+        return self[self.index_at(time)]
+
+class CsvTrajectoryWriter:
+    """
+    Misma interfaz que TrajectoryWriter sobre el CSV point,x,y,z de siempre: las
+    muestras inválidas y los tiempos no se guardan.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["point", "x", "y", "z"])
+        self.count = 0
+
+    def append(self, point, t, pose, carried=False):
+        if pose is None:
+            return
+        self.writer.writerow([point, pose[0], pose[1], pose[2]])
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def open_trajectory_writer(path, rate=0.0):
+    """
+    Escritor de trayectorias según la extensión de 'path': .ptrj (que se crea de
+    nuevo) o CSV en cualquier otro caso.
+    """
+    if path.endswith(TRAJECTORY_EXT):
+        if os.path.exists(path):
+            os.remove(path)
+        return TrajectoryWriter(path, rate=rate)
+    return CsvTrajectoryWriter(path)
+
+def csv_to_trajectory(csv_path, output_path, rate=2.0):
+    """
+    Convierte un CSV point,x,y,z en .ptrj. El CSV no tiene tiempos, así que la muestra
+    'point' se ubica en t = (point - 1) / rate (por defecto 2 muestras/s, el stepDelay
+    de 500 ms del sketch). Los puntos que faltan en el CSV se guardan como inválidos
+    para que el índice de cada muestra sea point - 1.
+    Devuelve la cantidad de muestras escritas.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = [(int(row["point"]), [float(row["x"]), float(row["y"]), float(row["z"])])
+                for row in csv.DictReader(f)]
+    rows.sort(key=lambda r: r[0])
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    with TrajectoryWriter(output_path, capacity=max(len(rows), 1), rate=rate) as writer:
+        expected = 1
+        for point, pose in rows:
+            while expected < point:
+                writer.append(expected, (expected - 1) / rate, None)
+                expected += 1
+            writer.append(point, (point - 1) / rate, pose)
+            expected = point + 1
+        return writer.count
+
+def load_samples(path, rate=2.0):
+    """
+    Lee las muestras válidas de un .ptrj o de un CSV point,x,y,z (al que se le asignan
+    tiempos como en csv_to_trajectory). Devuelve (points, t, positions (N, 3)).
+    """
+    if path.endswith(TRAJECTORY_EXT):
+        traj = Trajectory(path)
+        valid = traj.valid.astype(bool)
+        return (traj.point[valid].astype(np.int64), traj.t[valid].copy(),
+                traj.positions()[valid].astype(np.float64))
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    data = data[np.argsort(data[:, 0], kind="stable")]
+    points = data[:, 0].astype(np.int64)
+    return points, (points - 1) / rate, data[:, 1:4]
+
+def trajectory_to_csv(path, csv_path):
+    """
+    Exporta las muestras válidas de un .ptrj al CSV point,x,y,z de siempre.
+    Devuelve la cantidad de filas escritas.
+    """
+    traj = Trajectory(path)
+    rows = 0
+    with open(csv_path, "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["point", "x", "y", "z"])
+        for i in np.flatnonzero(traj.valid):
+            writer.writerow([int(traj.point[i]), float(traj.x[i]), float(traj.y[i]), float(traj.z[i])])
+            rows += 1
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convertir trayectorias entre CSV (point,x,y,z) y .ptrj.")
+    parser.add_argument("input", help="Archivo .csv o .ptrj.")
+    parser.add_argument("output", help="Archivo de salida (.ptrj o .csv).")
+    parser.add_argument("--rate", type=float, default=2.0,
+                        help="Muestras por segundo al convertir desde CSV.")
+    args = parser.parse_args()
+
+    if args.input.endswith(TRAJECTORY_EXT):
+        n = trajectory_to_csv(args.input, args.output)
+        print(f"{n} filas escritas en {args.output}")
+    else:
+        n = csv_to_trajectory(args.input, args.output, args.rate)
+        print(f"{n} muestras escritas en {args.output}")
+
+# example : python3 trajectory_store.py ../utils/physical_red_results.csv ../utils/physical_red_results.ptrj
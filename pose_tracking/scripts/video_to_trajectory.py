@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+import os
+import cv2
+import time
+import queue
+import argparse
+import threading
+
+import instrumentation
+from instrumentation import stage
+from color_labeling import COLOR_RANGES, MULTI_DETECTION_COLORS
+from generate_routine import detect_points, physical_red
+from marker_tracker import MarkerTracker
+from motion_gate import MotionGate
+from annotated_export import AnnotatedVideoWriter, POLICIES
+from trajectory_store import TRAJECTORY_EXT, Trajectory, TrajectoryWriter, open_trajectory_writer
+
+# Marca de fin de flujo entre etapas
+_FIN = object()
+
+# Cada cuántas filas se fuerza la escritura de la trayectoria a disco
+FLUSH_EVERY = 50
+
+def _tomar(cola, detener):
+    """
+    Desencola el próximo elemento; devuelve _FIN si se pidió detener el pipeline.
+    """
+    while not detener.is_set():
+        try:
+            return cola.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _FIN
+
+def _poner(cola, item, detener):
+    """
+    Encola 'item' esperando mientras la cola esté llena, salvo que otra etapa
+    haya pedido detener el pipeline (evita bloqueos si una etapa falla).
+    """
+    while not detener.is_set():
+        try:
+            cola.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def decodificar(video_path, paso, salida, detener, inicio=0):
+    """
+    Etapa de lectura: decodifica el video en una sola pasada hacia adelante y
+    encola (frame_idx, frame) cada 'paso' frames a partir de 'inicio'. Los frames
+    intermedios se saltan con grab() sin copiarlos.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Error al abrir el video '{video_path}'.")
+    try:
+        frame_idx = 0
+        while not detener.is_set() and cap.grab():
+            if frame_idx >= inicio and frame_idx % paso == 0:
+                ret, frame = cap.retrieve()
+                if ret and not _poner(salida, (frame_idx, frame), detener):
+                    break
+            frame_idx += 1
+    finally:
+        cap.release()
+        _poner(salida, _FIN, detener)
+
+def detectar(entrada, salida, color_ranges, multi_detection_colors, detener, tracker=None, piramide=1,
+             compuerta=None, exportar=None):
+    """
+    Etapa de detección: para cada frame calcula la posición física del punto rojo
+    y encola (frame_idx, [x, y, z] o None, reutilizado). Con 'tracker' solo se
+    analizan las ventanas alrededor de las últimas posiciones de los marcadores.
+    Con 'compuerta' (un MotionGate) los frames sin movimiento no se detectan: se
+    repite el resultado anterior marcado como reutilizado.
+    Con 'exportar' (un AnnotatedVideoWriter) cada frame se envía anotado al video
+    de revisión.
+    """
+    anterior = None
+    puntos = {}
+    hay_anterior = False
+    while True:
+        item = _tomar(entrada, detener)
+        if item is _FIN:
+            break
+        frame_idx, frame = item
+        if hay_anterior and compuerta is not None and not compuerta.check(frame):
+            red_phys, reutilizado = anterior, True
+        else:
+            if compuerta is not None and not hay_anterior:
+                compuerta.check(frame)  # primer frame: queda como referencia
+            if tracker is not None:
+                puntos = tracker.update(frame)
+            else:
+                puntos = detect_points(frame, color_ranges, multi_detection_colors, piramide)
+            red_phys = physical_red(puntos, f"frame {frame_idx}")
+            reutilizado = False
+            anterior, hay_anterior = red_phys, True
+        if exportar is not None:
+            exportar.submit(frame, puntos, red_phys, f"frame {frame_idx}" + (" (reutilizado)" if reutilizado else ""))
+        if not _poner(salida, (frame_idx, red_phys, reutilizado), detener):
+            return
+    _poner(salida, _FIN, detener)
+
+def _hilo(nombre, destino, errores, detener, *args):
+    def ejecutar():
+        try:
+            destino(*args)
+        except Exception as e:
+            errores.append((nombre, e))
+            detener.set()
+    return threading.Thread(target=ejecutar, name=nombre, daemon=True)
+
+def _ultimo_frame(path, fps):
+    """
+    Cantidad de muestras y índice del último frame guardado en el .ptrj 'path', o
+    (0, -1) si el archivo no existe, está vacío o no se puede leer.
+    """
+    try:
+        traj = Trajectory(path)
+    except Exception as e:
+        print(f"No se puede continuar '{path}' ({e}); se empieza de nuevo.")
+        return 0, -1
+    if len(traj) == 0:
+        return 0, -1
+    return len(traj), int(round(float(traj.t[-1]) * fps))
+
+def video_to_trajectory(video_path, output_csv, paso=1, tam_cola=8,
+                        color_ranges=None, multi_detection_colors=None, seguir=False, piramide=1,
+                        compuerta=None, reanudar=False, exportar=None):
+    """
+    Convierte un video directamente en una trayectoria (point, x, y, z) sin pasar
+    por imágenes intermedias. Las etapas de decodificación, detección y escritura
+    corren en paralelo unidas por colas acotadas de 'tam_cola' elementos, por lo que
+    la memoria usada no depende de la duración del video. Las filas se escriben a
+    medida que llegan. Con 'seguir' se usa un MarkerTracker para los marcadores
+    rojo y verde; si no, 'piramide' > 1 activa la detección de grueso a fino.
+    'compuerta' es un MotionGate opcional que evita detectar en frames sin movimiento;
+    esas muestras se marcan como reutilizadas en los archivos .ptrj.
+    Con 'reanudar' y una salida .ptrj existente (de una corrida interrumpida con los
+    mismos parámetros) se continúa después del último frame guardado.
+    'exportar' es un AnnotatedVideoWriter opcional que recibe cada frame procesado
+    con sus anotaciones; quien lo pasa se encarga de cerrarlo.
+    Devuelve un diccionario con estadísticas de la ejecución.
+    """
+    if color_ranges is None:
+        color_ranges = COLOR_RANGES
+    if multi_detection_colors is None:
+        multi_detection_colors = MULTI_DETECTION_COLORS
+
+    tracker = None
+    if seguir:
+        tracker = MarkerTracker(color_ranges, multi_detection_colors, colors=["red", "green"])
+
+    # Los tiempos de cada muestra salen del FPS del video (solo se guardan en .ptrj)
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0.0
+    cap.release()
+    fps = fps if fps and fps > 0 else 30.0
+
+    previas, ultimo = 0, -1
+    if reanudar and output_csv.endswith(TRAJECTORY_EXT) and os.path.exists(output_csv):
+        previas, ultimo = _ultimo_frame(output_csv, fps)
+        if previas == 0:
+            os.remove(output_csv)
+        else:
+            print(f"Continuando '{output_csv}' desde el frame {ultimo + 1} ({previas} muestras guardadas)")
+
+    detener = threading.Event()
+    errores = []
+    cola_frames = queue.Queue(maxsize=tam_cola)
+    cola_resultados = queue.Queue(maxsize=tam_cola)
+    hilos = [
+        _hilo("decodificacion", decodificar, errores, detener,
+              video_path, paso, cola_frames, detener, ultimo + 1),
+        _hilo("deteccion", detectar, errores, detener,
+              cola_frames, cola_resultados, color_ranges, multi_detection_colors, detener, tracker, piramide,
+              compuerta, exportar),
+    ]
+
+    inicio = time.perf_counter()
+    muestras = 0
+    escritas = 0
+    writer = TrajectoryWriter(output_csv) if previas else open_trajectory_writer(output_csv, fps / paso)
+    with writer:
+        for hilo in hilos:
+            hilo.start()
+        while True:
+            try:
+                item = cola_resultados.get(timeout=0.1)
+            except queue.Empty:
+                if detener.is_set():
+                    break
+                continue
+            if item is _FIN:
+                break
+            frame_idx, red_phys, reutilizado = item
+            muestras += 1
+            with stage("csv.write"):
+                writer.append(previas + muestras, frame_idx / fps, red_phys, reutilizado)
+            if red_phys is None:
+                print(f"Frame {frame_idx}: No se pudo obtener la posición física del rojo.")
+                continue
+            escritas += 1
+            if escritas % FLUSH_EVERY == 0:
+                writer.flush()
+                print(f"{muestras} muestras procesadas ({escritas} escritas)")
+
+    detener.set()
+    for hilo in hilos:
+        hilo.join()
+    if errores:
+        nombre, error = errores[0]
+        raise RuntimeError(f"Falló la etapa de {nombre}: {error}") from error
+
+    duracion = time.perf_counter() - inicio
+    stats = {
+        "muestras": muestras,
+        "escritas": escritas,
+        "segundos": duracion,
+        "muestras_por_segundo": muestras / duracion if duracion > 0 else 0.0,
+        "previas": previas,
+    }
+    if tracker is not None:
+        stats["tracker"] = tracker.stats()
+    if compuerta is not None:
+        stats["compuerta"] = compuerta.stats()
+    if exportar is not None:
+        stats["exportacion"] = exportar.stats()
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generar la trayectoria del punto rojo directamente desde un video.")
+    parser.add_argument("video", help="Ruta al archivo de video.")
+    parser.add_argument("--output", default="physical_red_results.csv", help="CSV de salida (point,x,y,z) o archivo .ptrj.")
+    parser.add_argument("--step", type=int, default=1, help="Procesar uno de cada N frames.")
+    parser.add_argument("--queue-size", type=int, default=8, help="Capacidad de las colas entre etapas.")
+    parser.add_argument("--track", action="store_true",
+                        help="Buscar los marcadores solo en ventanas alrededor de su última posición.")
+    parser.add_argument("--pyramid", type=int, choices=[1, 2, 4], default=1,
+                        help="Detectar sobre el frame reducido por N y refinar a resolución completa.")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="Reutilizar la detección anterior en los frames sin movimiento.")
+    parser.add_argument("--gate-threshold", type=int, default=15,
+                        help="Diferencia mínima (0-255) para que un píxel reducido cuente como movimiento.")
+    parser.add_argument("--gate-pixels", type=int, default=1,
+                        help="Cantidad de píxeles reducidos que deben cambiar para detectar de nuevo.")
+    parser.add_argument("--gate-scale", type=int, default=8, help="Factor de reducción para la comparación.")
+    parser.add_argument("--gate-max-carry", type=int, default=50,
+                        help="Máximo de frames seguidos reutilizados (0 = sin límite).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Si la salida .ptrj ya existe, continuar después del último frame guardado.")
+    parser.add_argument("--export", default=None, metavar="VIDEO",
+                        help="Guardar un video anotado (marcadores, posiciones relativas y físicas) para revisión.")
+    parser.add_argument("--export-policy", choices=POLICIES, default="block",
+                        help="Con la cola de exportación llena: esperar (block, el video queda completo) "
+                             "o descartar el frame (drop).")
+    parser.add_argument("--export-queue", type=int, default=32, help="Capacidad de la cola de exportación.")
+    parser.add_argument("--metrics", default=None, metavar="ARCHIVO",
+                        help="Medir latencias por etapa y guardarlas en ARCHIVO (.json o .prom).")
+    args = parser.parse_args()
+
+    if args.metrics:
+        instrumentation.enable(args.metrics)
+    compuerta = None
+    if args.motion_gate:
+        compuerta = MotionGate(args.gate_threshold, args.gate_pixels, max(1, args.gate_scale), args.gate_max_carry)
+    exportar = None
+    if args.export:
+        cap = cv2.VideoCapture(args.video)
+        fps = (cap.get(cv2.CAP_PROP_FPS) or 30.0) / max(1, args.step)
+        cap.release()
+        exportar = AnnotatedVideoWriter(args.export, fps, args.export_policy, args.export_queue)
+    try:
+        stats = video_to_trajectory(args.video, args.output, max(1, args.step), max(1, args.queue_size),
+                                    seguir=args.track, piramide=args.pyramid, compuerta=compuerta,
+                                    reanudar=args.resume, exportar=exportar)
+    finally:
+        if exportar is not None:
+            exportar.close()
+    print(f"Proceso completado: {stats['escritas']} de {stats['muestras']} muestras guardadas en {args.output} "
+          f"({stats['muestras_por_segundo']:.1f} frames/s)")
+    if "tracker" in stats:
+        print("Seguimiento por ventanas:", stats["tracker"])
+    if "compuerta" in stats:
+        gate = stats["compuerta"]
+        print(f"Compuerta de movimiento: {gate['reutilizados']} de {gate['frames']} frames reutilizados "
+              f"({gate['fraccion_reutilizada'] * 100:.1f}%)")
+    if exportar is not None:
+        export = exportar.stats()
+        print(f"Video anotado: {export['escritos']} frames en {args.export}, {export['descartados']} descartados "
+              f"(política {export['politica']})")
+        if export["descartados"]:
+            print(f"Aviso: el video anotado no tiene {export['descartados']} de {stats['muestras']} frames; "
+                  f"usar --export-policy block o una --export-queue mayor para exportarlos todos.")
+
+# example : python3 video_to_trajectory.py /home/rovestrada/pose_track_ws/pose_tracking/videos/square_drawing.webm --step 12 --output /home/rovestrada/pose_track_ws/pose_tracking/utils/physical_red_results.csv